@@ -0,0 +1,64 @@
+"""
+Cold-import benchmark: time `import ipyigv` in fresh interpreters, and the
+first public genome lookup.
+
+    python benchmarks/bench_import.py [--repeat N] [--json results.json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+IMPORT_SNIPPET = """
+import time
+t0 = time.perf_counter()
+import ipyigv
+t1 = time.perf_counter()
+ipyigv.PUBLIC_GENOMES['hg38']
+t2 = time.perf_counter()
+print(t1 - t0, t2 - t1)
+"""
+
+WARM_IPYWIDGETS_SNIPPET = """
+import time
+import ipywidgets
+t0 = time.perf_counter()
+import ipyigv
+print(time.perf_counter() - t0, 0.0)
+"""
+
+
+def run(snippet, repeat):
+    imports, lookups = [], []
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', snippet], text=True)
+        t_import, t_lookup = (float(v) for v in out.split())
+        imports.append(t_import)
+        lookups.append(t_lookup)
+    return imports, lookups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    imports, lookups = run(IMPORT_SNIPPET, args.repeat)
+    own, _ = run(WARM_IPYWIDGETS_SNIPPET, args.repeat)
+    results = {'import': {
+        'cold_ms': 1e3 * statistics.median(imports),
+        'first_genome_lookup_ms': 1e3 * statistics.median(lookups),
+        'ipywidgets_warm_ms': 1e3 * statistics.median(own),
+    }}
+    print('import ipyigv (cold):            %8.2f ms' % results['import']['cold_ms'])
+    print('first PUBLIC_GENOMES lookup:     %8.3f ms' % results['import']['first_genome_lookup_ms'])
+    print('import ipyigv (ipywidgets warm): %8.2f ms' % results['import']['ipywidgets_warm_ms'])
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+Headless benchmarks of widget construction and state serialization.
+
+Widgets are created without a frontend (ipywidgets falls back to a dummy
+comm outside of a kernel), and comm payloads are measured from the state
+ipywidgets would send.
+
+    python benchmarks/bench_widgets.py [--quick] [--json results.json]
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from ipywidgets import Widget
+
+import ipyigv
+from ipyigv import AnnotationTrack, BrowserPool, IgvBrowser, PUBLIC_GENOMES, ReferenceGenome, RoiSet, Track, TrackSpec
+
+
+URLS = ['sample.bam', 'calls.vcf.gz', 'peaks.bed', 'coverage.bigWig', 'copy.seg', 'unknown.xyz']
+
+
+def split_buffers(value, path, buffer_paths, buffers):
+    """Returns `value` with its binary parts taken out to `buffers`, as sent by ipywidgets."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        buffer_paths.append(path)
+        buffers.append(value)
+        return None
+    if isinstance(value, dict):
+        # binary values are left out of dicts, and replaced by None in lists
+        state = {}
+        for key, v in value.items():
+            if isinstance(v, (bytes, bytearray, memoryview)):
+                buffer_paths.append(path + [key])
+                buffers.append(v)
+            else:
+                state[key] = split_buffers(v, path + [key], buffer_paths, buffers)
+        return state
+    if isinstance(value, (list, tuple)):
+        return [split_buffers(v, path + [i], buffer_paths, buffers) for i, v in enumerate(value)]
+    return value
+
+
+def payload_size(widget):
+    """Size in bytes of the state message sent for a widget (JSON + buffers)."""
+    buffer_paths, buffers = [], []
+    state = split_buffers(widget.get_state(), [], buffer_paths, buffers)
+    message = json.dumps({'state': state, 'buffer_paths': buffer_paths})
+    return len(message) + sum(len(memoryview(b).cast('B')) for b in buffers)
+
+
+def timed(function, repeat=3):
+    """Returns the best time (s) over `repeat` runs, and the last result."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def close_all(widgets):
+    for widget in widgets:
+        widget.close()
+
+
+def bench_type_inference(n):
+    def infer():
+        return [Track.__new__(Track, url=URLS[i % len(URLS)]) for i in range(n)]
+    elapsed, _ = timed(infer)
+    return {'time_per_track_us': 1e6 * elapsed / n}
+
+
+def bench_tracks(n):
+    def build():
+        return [Track(name='sample%d' % i, url='sample%d.bam' % i) for i in range(n)]
+    elapsed, tracks = timed(lambda: build(), repeat=1)
+    sizes = [payload_size(t) for t in tracks[:100]]
+    close_all(tracks)
+    return {'time_s': elapsed, 'time_per_track_us': 1e6 * elapsed / n,
+            'open_payload_bytes': sum(sizes) / len(sizes)}
+
+
+def bench_specs(n):
+    def build():
+        return [TrackSpec(name='sample%d' % i, url='sample%d.bam' % i) for i in range(n)]
+    elapsed, specs = timed(build, repeat=1)
+    browser = IgvBrowser(genome=ReferenceGenome(id='hg38'))
+    elapsed_add, _ = timed(lambda: browser.add_tracks(specs), repeat=1)
+    result = {'time_s': elapsed, 'add_tracks_s': elapsed_add, 'browser_state_bytes': payload_size(browser)}
+    browser.close()
+    return result
+
+
+def bench_roi(n):
+    def build():
+        return [AnnotationTrack(name='roi%d' % i, url='roi%d.bed' % i) for i in range(n)]
+    elapsed, rois = timed(build, repeat=1)
+    close_all(rois)
+    return {'time_s': elapsed, 'time_per_roi_us': 1e6 * elapsed / n}
+
+
+def bench_roi_set(n):
+    starts = np.arange(n, dtype=np.int64) * 1000
+    elapsed, roi_set = timed(lambda: RoiSet.from_arrays(['chr1'] * n, starts, starts + 500), repeat=1)
+    result = {'time_s': elapsed, 'payload_bytes': payload_size(roi_set)}
+    roi_set.close()
+    return result
+
+
+def bench_browser(n):
+    tracks = [Track(name='sample%d' % i, url='sample%d.bam' % i) for i in range(n)]
+    browser = IgvBrowser(genome=ReferenceGenome(**PUBLIC_GENOMES['hg38']))
+    elapsed_add, _ = timed(lambda: browser.add_tracks(tracks), repeat=1)
+    elapsed_state, state = timed(browser.get_state)
+    result = {
+        'add_tracks_s': elapsed_add,
+        'get_state_s': elapsed_state,
+        'browser_state_bytes': payload_size(browser),
+        'total_open_payload_bytes': payload_size(browser) + sum(payload_size(t) for t in tracks),
+    }
+    close_all(tracks)
+    browser.close()
+    return result
+
+
+def bench_churn(n, rounds=10):
+    browser = IgvBrowser(genome=ReferenceGenome(id='hg38'))
+    tracks = [Track(name='sample%d' % i, url='sample%d.bam' % i) for i in range(n)]
+
+    def churn():
+        for _ in range(rounds):
+            browser.add_tracks(tracks)
+            browser.remove_tracks(tracks)
+
+    def churn_one_by_one():
+        for track in tracks[:100]:
+            browser.add_track(track)
+        for track in tracks[:100]:
+            browser.remove_track(track)
+
+    elapsed, _ = timed(churn, repeat=1)
+    elapsed_single, _ = timed(churn_one_by_one, repeat=1)
+    close_all(tracks)
+    browser.close()
+    return {'bulk_add_remove_s': elapsed / rounds, 'single_add_remove_100_s': elapsed_single}
+
+
+def bench_sites(n):
+    """Reviewing n sites with 3 tracks each: a new browser per site, or a pool."""
+    def site_tracks(i):
+        return [Track(name='sample%d' % j, url='site%d_sample%d.bam' % (i, j)) for j in range(3)]
+
+    open_widgets = len(Widget.widgets)
+
+    def new_browsers():
+        for i in range(n):
+            IgvBrowser(genome=ReferenceGenome(id='hg38'), tracks=site_tracks(i), locus='chr1:%d' % (i * 1000))
+    elapsed_new, _ = timed(new_browsers, repeat=1)
+    leaked = len(Widget.widgets) - open_widgets
+
+    pool = BrowserPool()
+
+    def pooled():
+        for i in range(n):
+            pool.release(pool.acquire({'id': 'hg38'}, tracks=site_tracks(i), locus='chr1:%d' % (i * 1000)))
+    open_widgets = len(Widget.widgets)
+    elapsed_pool, _ = timed(pooled, repeat=1)
+    result = {'new_browser_per_site_ms': 1e3 * elapsed_new / n, 'new_browser_open_widgets': leaked,
+              'pool_per_site_ms': 1e3 * elapsed_pool / n, 'pool_open_widgets': len(Widget.widgets) - open_widgets}
+    pool.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--quick', action='store_true', help='only run the 1k sizes')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    sizes = [1000] if args.quick else [1000, 10000]
+    results = {'ipyigv': ipyigv.__version__, 'python': sys.version.split()[0]}
+    results['type_inference'] = bench_type_inference(10000)
+    for n in sizes:
+        results['tracks_%d' % n] = bench_tracks(n)
+        results['specs_%d' % n] = bench_specs(n)
+        results['roi_%d' % n] = bench_roi(n)
+        results['roi_set_%d' % (n * 100)] = bench_roi_set(n * 100)
+        results['browser_%d' % n] = bench_browser(n)
+        results['churn_%d' % n] = bench_churn(n)
+    results['sites_100'] = bench_sites(100)
+
+    for name, values in results.items():
+        if isinstance(values, dict):
+            print(name)
+            for key, value in values.items():
+                print('    %-28s %14.3f' % (key, value))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
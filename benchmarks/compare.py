@@ -0,0 +1,69 @@
+"""
+Compares benchmark results to those of a base run on the same machine (in
+CI, the base branch benchmarked on the same runner right after the pull
+request), exiting with an error when a metric regressed beyond its
+tolerance (all metrics are lower is better): timings by more than
+`--tolerance` (relative, generous as CI runners are noisy), payload sizes
+and open widget counts, which are deterministic, by more than
+`--size-tolerance`.
+
+    python benchmarks/compare.py results.json [more.json ...] --base base.json [more.json ...]
+"""
+import argparse
+import json
+import sys
+
+# metrics that do not depend on the machine
+SIZE_SUFFIXES = ('_bytes', '_widgets')
+
+
+def metrics(results):
+    """Flattens results to {'benchmark.metric': value}, skipping versions."""
+    return {
+        '%s.%s' % (name, key): value
+        for name, values in results.items() if isinstance(values, dict)
+        for key, value in values.items()
+    }
+
+
+def load(paths):
+    """Merges the metrics of the result files at `paths`."""
+    results = {}
+    for path in paths:
+        with open(path) as f:
+            results.update(metrics(json.load(f)))
+    return results
+
+
+def compare(results, base, tolerance, size_tolerance):
+    """Returns the (metric, base value, value, limit) of the regressions."""
+    regressions = []
+    for metric, expected in sorted(base.items()):
+        value = results.get(metric)
+        if value is None:
+            continue
+        limit = expected * (1 + (size_tolerance if metric.endswith(SIZE_SUFFIXES) else tolerance))
+        if value > limit:
+            regressions.append((metric, expected, value, limit))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('results', nargs='+', help='JSON files written by the benchmarks')
+    parser.add_argument('--base', nargs='+', required=True, help='JSON files written by the base run')
+    parser.add_argument('--tolerance', type=float, default=1.0, help='allowed relative slowdown of timings')
+    parser.add_argument('--size-tolerance', type=float, default=0.05,
+                        help='allowed relative growth of payload sizes and widget counts')
+    args = parser.parse_args()
+
+    results, base = load(args.results), load(args.base)
+    regressions = compare(results, base, args.tolerance, args.size_tolerance)
+    for metric, expected, value, limit in regressions:
+        print('REGRESSION %-45s %14.3f > %14.3f (base %.3f)' % (metric, value, limit, expected))
+    print('%d metrics compared, %d regressions' % (len(set(base) & set(results)), len(regressions)))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,9 @@
 from ._version import version_info, __version__
 
 from .ipyigv import *
+from .group import BrowserGroup
+from .mirror import GenomeMirror
+from .pool import BrowserPool
 
 def _jupyter_nbextension_paths():
     """Called by Jupyter Notebook Server to detect if it is a valid nbextension and
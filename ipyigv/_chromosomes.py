@@ -0,0 +1,24 @@
+"""Chromosome naming helpers shared by the in-memory data types."""
+import numpy as np
+
+
+def alias(names, chr):
+    """
+    Returns the name among `names` of chromosome `chr`, tolerating 'chr1' vs
+    '1' naming differences between genome and data, else None.
+    """
+    if chr in names:
+        return chr
+    other = chr[3:] if chr.startswith('chr') else 'chr' + chr
+    return other if other in names else None
+
+
+def chromosome_codes(chr):
+    """
+    Returns the sorted chromosome names and the code of each row. Names are
+    compared by runs of equal values, data being usually grouped by chromosome.
+    """
+    chr = np.asarray(chr, dtype=str)
+    run_starts = np.flatnonzero(np.concatenate([[len(chr) > 0], chr[1:] != chr[:-1]]))
+    names, run_codes = np.unique(chr[run_starts], return_inverse=True)
+    return names, np.repeat(run_codes, np.diff(np.append(run_starts, len(chr))))
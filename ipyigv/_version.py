@@ -7,3 +7,8 @@ __version__ = '%s.%s.%s'%(version_info[0], version_info[1], version_info[2])
 
 # Frontend version
 EXTENSION_VERSION = '^0.1.7'
+
+# Version of the widget state schema (which values are left out of sparse
+# states as defaults): shipped with the frontend defaults tables in
+# js/src/defaults.json, regenerated by `python -m ipyigv.state`
+STATE_SCHEMA_VERSION = 1
@@ -0,0 +1,84 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache(object):
+    """
+    A thread-safe least-recently-used cache, bounded by the total size of its
+    values as given by `getsizeof` (by default, each value counts as 1).
+    `on_evict(key, value)` is called for the values evicted or replaced.
+    """
+
+    def __init__(self, maxsize, getsizeof=None, on_evict=None):
+        self.maxsize = maxsize
+        self.getsizeof = getsizeof or (lambda value: 1)
+        self.on_evict = on_evict
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self.getsizeof(value)
+        evicted = []
+        with self._lock:
+            if key in self._data:
+                old = self._data.pop(key)
+                self.size -= self.getsizeof(old)
+                if old is not value:
+                    evicted.append((key, old))
+            if size <= self.maxsize:
+                self._data[key] = value
+                self.size += size
+            while self.size > self.maxsize:
+                item = self._data.popitem(last=False)
+                self.size -= self.getsizeof(item[1])
+                evicted.append(item)
+        self._evicted(evicted)
+
+    def pop(self, key, default=None):
+        """Removes a value, returned (`default` if missing)."""
+        with self._lock:
+            if key not in self._data:
+                return default
+            value = self._data.pop(key)
+            self.size -= self.getsizeof(value)
+            return value
+
+    def _evicted(self, items):
+        # called out of the lock: callbacks may use the cache
+        if self.on_evict is not None:
+            for key, value in items:
+                self.on_evict(key, value)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
@@ -0,0 +1,256 @@
+import gzip
+
+import numpy as np
+
+from ._chromosomes import alias
+from .tiles import tile_cache
+
+
+STRAND_CODES = {'+': 1, '-': -1, '.': 0, '': 0, None: 0}
+
+
+def _column(data, name, default=None):
+    # works for dict of arrays and pandas DataFrames alike
+    if name in data:
+        return data[name]
+    return default
+
+
+def _encode_strings(values):
+    """Packs a sequence of strings as utf-8 bytes plus (n+1) uint32 offsets."""
+    encoded = [('' if v is None else str(v)).encode('utf-8') for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+class FeatureTable(object):
+    """
+    A columnar, in-memory set of features (chr, start, end, strand, score,
+    name and exons), sent to the frontend as packed binary buffers.
+
+    Positions are 0-based, end exclusive, as in BED files. Exons are given
+    either per feature as a list of (start, end) pairs, or in flat form by
+    `exon_offsets` (n+1 offsets into `exon_starts`/`exon_ends`).
+    """
+
+    def __init__(self, chr, start, end, strand=None, score=None, name=None,
+                 exons=None, exon_offsets=None, exon_starts=None, exon_ends=None):
+        self.chr_names, chr_codes = np.unique(np.asarray(chr, dtype=str), return_inverse=True)
+        self.chr = chr_codes.astype(np.uint32)
+        self.start = self._positions(start)
+        self.end = self._positions(end)
+        n = len(self.chr)
+        if len(self.start) != n or len(self.end) != n:
+            raise ValueError('chr, start and end must have the same length')
+
+        if strand is None:
+            self.strand = np.zeros(n, dtype=np.int8)
+        else:
+            strand = np.asarray(strand)
+            if strand.dtype.kind in 'iuf':
+                self.strand = np.sign(strand).astype(np.int8)
+            else:
+                self.strand = np.array([STRAND_CODES[s] for s in strand], dtype=np.int8)
+        if score is None:
+            self.score = np.full(n, np.nan, dtype=np.float32)
+        else:
+            self.score = np.asarray(score, dtype=np.float32)
+        self.name = None if name is None else list(name)
+
+        if exons is not None:
+            lengths = [0 if e is None else len(e) for e in exons]
+            exon_offsets = np.zeros(n + 1, dtype=np.uint32)
+            np.cumsum(lengths, out=exon_offsets[1:])
+            flat = [pair for e in exons if e is not None for pair in e]
+            flat = np.asarray(flat, dtype=np.int64).reshape(-1, 2)
+            exon_starts, exon_ends = flat[:, 0], flat[:, 1]
+        if exon_offsets is None:
+            self.exon_offsets = None
+        else:
+            self.exon_offsets = np.asarray(exon_offsets, dtype=np.uint32)
+            self.exon_starts = self._positions(exon_starts)
+            self.exon_ends = self._positions(exon_ends)
+            if len(self.exon_offsets) != n + 1:
+                raise ValueError('exon_offsets must have one more entry than features')
+
+    @staticmethod
+    def _positions(values):
+        values = np.asarray(values)
+        if len(values) and (values.min() < 0 or values.max() > np.iinfo(np.uint32).max):
+            raise ValueError('positions must fit in an unsigned 32 bits integer')
+        return values.astype(np.uint32)
+
+    @classmethod
+    def from_dataframe(cls, df, chr='chr', start='start', end='end', strand='strand',
+                       score='score', name='name', exons='exons'):
+        """
+        Builds a FeatureTable from a pandas DataFrame (or a dict of arrays).
+        Optional columns are ignored when missing.
+        """
+        return cls(
+            _column(df, chr), _column(df, start), _column(df, end),
+            strand=_column(df, strand), score=_column(df, score),
+            name=_column(df, name), exons=_column(df, exons),
+        )
+
+    @classmethod
+    def from_bed(cls, path):
+        """
+        Reads the chr, start, end and, when present, name, score and strand
+        columns of a (possibly gzipped) BED file.
+        """
+        chrs, starts, ends, names, scores, strands = [], [], [], [], [], []
+        columns = 0
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt') as f:
+            for line in f:
+                if not line.strip() or line.startswith(('#', 'track', 'browser')):
+                    continue
+                fields = line.rstrip('\n').split('\t' if '\t' in line else None)
+                columns = max(columns, len(fields))
+                fields += [''] * (6 - len(fields))
+                chrs.append(fields[0])
+                starts.append(int(fields[1]))
+                ends.append(int(fields[2]))
+                names.append(fields[3])
+                scores.append(float(fields[4]) if fields[4] not in ('', '.') else np.nan)
+                strands.append(fields[5])
+        return cls(
+            chrs, np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64),
+            strand=strands if columns > 5 else None, score=scores if columns > 4 else None,
+            name=names if columns > 3 else None,
+        )
+
+    @classmethod
+    def from_features(cls, features):
+        """Builds a FeatureTable from a sequence of `TrackFeature`."""
+        features = list(features)
+        return cls(
+            [f.chr for f in features], [f.start for f in features], [f.end for f in features],
+            strand=[f.strand for f in features], score=[f.score for f in features],
+            name=[f.name for f in features],
+            exons=[[(e.start, e.end) for e in f.exons] for f in features],
+        )
+
+    def __len__(self):
+        return len(self.chr)
+
+    def take(self, rows):
+        """Returns the features at the given row positions, as a new table."""
+        rows = np.asarray(rows, dtype=np.int64)
+        table = object.__new__(FeatureTable)
+        table.chr_names = self.chr_names
+        table.chr = self.chr[rows]
+        table.start = self.start[rows]
+        table.end = self.end[rows]
+        table.strand = self.strand[rows]
+        table.score = self.score[rows]
+        table.name = None if self.name is None else [self.name[i] for i in rows]
+        table.exon_offsets = None
+        if self.exon_offsets is not None:
+            begins = self.exon_offsets[rows].astype(np.int64)
+            lengths = self.exon_offsets[rows + 1] - begins
+            table.exon_offsets = np.zeros(len(rows) + 1, dtype=np.uint32)
+            np.cumsum(lengths, out=table.exon_offsets[1:])
+            positions = np.repeat(begins - table.exon_offsets[:-1], lengths) + np.arange(table.exon_offsets[-1])
+            table.exon_starts = self.exon_starts[positions]
+            table.exon_ends = self.exon_ends[positions]
+        return table
+
+    def to_buffers(self):
+        """Returns the packed representation, each column being a memoryview."""
+        packed = {
+            'length': len(self),
+            'chromosomes': [str(c) for c in self.chr_names],
+            'chr': memoryview(self.chr),
+            'start': memoryview(self.start),
+            'end': memoryview(self.end),
+            'strand': memoryview(self.strand),
+            'score': memoryview(self.score),
+        }
+        if self.name is not None:
+            names, name_offsets = _encode_strings(self.name)
+            packed['name'] = memoryview(names)
+            packed['name_offsets'] = memoryview(name_offsets)
+        if self.exon_offsets is not None:
+            packed['exon_offsets'] = memoryview(self.exon_offsets)
+            packed['exon_starts'] = memoryview(self.exon_starts)
+            packed['exon_ends'] = memoryview(self.exon_ends)
+        return packed
+
+
+class FeatureIndex(object):
+    """
+    An interval index over a FeatureTable, kept in the kernel and serving the
+    features of a track region by region: only those in view are sent to the
+    frontend, however many features the table holds.
+
+    Features are sorted by chromosome and start, with the running maximum of
+    their ends, so that a query is two binary searches. Queries are answered
+    by tiles of `tile_size` bp, cached on both sides so that panning to
+    adjacent regions reuses them. The default tile size holds about 1000
+    features on average, and the track visibility window about `max_features`.
+    """
+
+    def __init__(self, table, tile_size=None, max_features=50000, cache_size=64 * 2**20):
+        self.table = table
+        self.max_features = max_features
+        order = np.lexsort((table.start, table.chr))
+        codes = table.chr[order]
+        self.chromosomes = {}
+        span = 0
+        for code, chr in enumerate(table.chr_names):
+            lo, hi = np.searchsorted(codes, [code, code + 1])
+            rows = order[lo:hi]
+            max_ends = np.maximum.accumulate(table.end[rows]) if len(rows) else table.end[rows]
+            self.chromosomes[str(chr)] = (rows, table.start[rows], max_ends)
+            span += int(max_ends[-1]) if len(rows) else 0
+        density = max(len(table), 1) / max(span, 1)
+        if tile_size is None:
+            tile_size = 1024
+            while tile_size * density < 1000 and tile_size < 2**24:
+                tile_size *= 2
+        self.tile_size = tile_size
+        self.visibility_window = max(tile_size, int(max_features / density))
+        self.cache = tile_cache(cache_size)
+
+    def query(self, chr, start, end):
+        """Returns the rows of the features overlapping [start, end) on chr, sorted by start."""
+        chr = alias(self.chromosomes, chr)
+        if chr is None:
+            return np.empty(0, dtype=np.int64)
+        rows, starts, max_ends = self.chromosomes[chr]
+        # candidates start before end, and follow the last one ending before start
+        lo = np.searchsorted(max_ends, start, side='right')
+        hi = np.searchsorted(starts, end, side='left')
+        candidates = rows[lo:hi]
+        return candidates[self.table.end[candidates] > start]
+
+    def tile(self, chr, index):
+        """Returns the packed features of a tile, with their row numbers as `ids`."""
+        def compute():
+            start = index * self.tile_size
+            rows = self.query(chr, start, start + self.tile_size)
+            packed = self.table.take(rows).to_buffers()
+            packed['ids'] = memoryview(rows.astype(np.uint32))
+            return packed
+        return self.cache.get_or_compute((chr, index), compute)
+
+    def describe(self):
+        return {
+            'length': len(self.table),
+            'tile_size': self.tile_size,
+            'visibility_window': self.visibility_window,
+        }
+
+
+def features_to_json(value, widget):
+    if value is None:
+        return None
+    return value.to_buffers()
+
+
+feature_serialization = {
+    'to_json': features_to_json,
+}
@@ -0,0 +1,105 @@
+import mmap
+import os
+
+from threading import Lock
+
+from .cache import LRUCache
+
+
+BLOCK_SIZE = 256 * 2**10
+
+# Index files served along with their source (e.g. reads.bam.bai or reads.bai).
+INDEX_SUFFIXES = ('.bai', '.csi', '.tbi', '.fai', '.gzi', '.crai')
+
+# Maximum number of local files kept memory-mapped, the least recently read
+# ones being unmapped.
+MAX_OPEN_FILES = 64
+
+# Blocks of the mapped files (memoryviews on their mappings, not copies),
+# shared by all browsers of the kernel.
+BLOCK_CACHE = LRUCache(256 * 2**20, getsizeof=len)
+
+
+class _MappedFile(object):
+
+    def __init__(self, path):
+        stat = os.stat(path)
+        self.path = path
+        self.version = (stat.st_mtime_ns, stat.st_size)
+        self.size = stat.st_size
+        self.map = None
+        self.blocks = set()  # indexes of the blocks cached
+        if self.size > 0:
+            with open(path, 'rb') as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def block(self, index):
+        def read():
+            start = index * BLOCK_SIZE
+            self.blocks.add(index)
+            return memoryview(self.map)[start:start + BLOCK_SIZE]
+        return BLOCK_CACHE.get_or_compute((self.path, self.version, index), read)
+
+    def close(self):
+        # unmaps the file once its blocks are released: blocks still being sent
+        # keep the mapping open until they are garbage collected
+        for index in list(self.blocks):
+            BLOCK_CACHE.pop((self.path, self.version, index))
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                pass
+
+
+_files = LRUCache(MAX_OPEN_FILES, on_evict=lambda path, mapped: mapped.close())
+_files_lock = Lock()
+
+
+def _mapped(path):
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    with _files_lock:
+        mapped = _files.get(path)
+        if mapped is None or mapped.version != (stat.st_mtime_ns, stat.st_size):
+            # replaced versions are closed
+            mapped = _MappedFile(path)
+            _files.put(path, mapped)
+    return mapped
+
+
+def read_range(path, start=0, size=None):
+    """
+    Reads `size` bytes (to the end of the file if None) of a local file from
+    `start`, through the shared block cache.
+
+    Returns a list of memoryviews on the cached blocks, to be sent as is as
+    message buffers.
+    """
+    mapped = _mapped(path)
+    end = mapped.size if size is None else min(start + size, mapped.size)
+    views = []
+    position = start
+    while position < end:
+        index = position // BLOCK_SIZE
+        offset = position - index * BLOCK_SIZE
+        block = mapped.block(index)
+        view = memoryview(block)[offset:offset + end - position]
+        views.append(view)
+        position += len(view)
+    return views
+
+
+def is_served(path, sources):
+    """
+    Whether `path` may be read by the frontend, given the registered source
+    paths: the sources themselves and their indexes (the source path, or the
+    path without its extension, followed by an INDEX_SUFFIXES suffix).
+    """
+    path = os.path.abspath(path)
+    for source in sources:
+        source = os.path.abspath(source)
+        stems = (source, os.path.splitext(source)[0])
+        if path == source or any(path == stem + suffix for stem in stems for suffix in INDEX_SUFFIXES):
+            return True
+    return False
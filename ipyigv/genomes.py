@@ -0,0 +1,157 @@
+import json
+import re
+
+from collections.abc import Mapping
+
+
+# The fast scan only looks at braces and `"id": "..."` pairs, ignoring string
+# boundaries, which is right unless a string holds unbalanced braces or an
+# `"id":` literal. The exact scan also matches (escaped) strings.
+_ID = re.compile(r'"id"\s*:\s*("[^"\\]*(?:\\.[^"\\]*)*")')
+_EXACT_TOKENS = re.compile(r'[{}]|"[^"\\]*(?:\\.[^"\\]*)*"')
+
+
+def _positions(text, char):
+    positions = []
+    i = text.find(char)
+    while i != -1:
+        positions.append(i)
+        i = text.find(char, i + 1)
+    return positions
+
+
+def _fast_scan(text):
+    events = [(i, 1) for i in _positions(text, '{')]
+    events += [(i, -1) for i in _positions(text, '}')]
+    events += [(m.start(), m) for m in _ID.finditer(text)]
+    events.sort(key=lambda event: event[0])
+    offsets = {}
+    depth = 0
+    start = None
+    for position, event in events:
+        if event == 1:
+            if depth == 0:
+                start = position
+            depth += 1
+        elif event == -1:
+            depth -= 1
+            if depth < 0:
+                return None
+        elif depth == 1:
+            offsets[json.loads(event.group(1))] = start
+    return offsets if depth == 0 else None
+
+
+def _exact_scan(text):
+    offsets = {}
+    depth = 0
+    start = None
+    expect_id = False
+    for match in _EXACT_TOKENS.finditer(text):
+        token = match.group()
+        if token == '{':
+            if depth == 0:
+                start = match.start()
+            depth += 1
+        elif token == '}':
+            depth -= 1
+        elif depth == 1:
+            if expect_id:
+                offsets[json.loads(token)] = start
+                expect_id = False
+            elif token == '"id"':
+                expect_id = True
+    return offsets
+
+
+def _scan_registry(text, exact=False):
+    """
+    Returns a dict mapping each genome id of a registry file to the offset
+    of its JSON object in `text`.
+    """
+    offsets = None if exact else _fast_scan(text)
+    return _exact_scan(text) if offsets is None else offsets
+
+
+class GenomeRegistry(Mapping):
+    """
+    A read-only, lazily loaded mapping of genome id to genome definition,
+    built from one or several IGV genome list files (JSON array of genomes).
+
+    Nothing is read until first access; files are then only scanned for the
+    offset of each genome, and a genome is decoded when it is looked up.
+    Genomes from registries added later take precedence.
+    """
+
+    def __init__(self, *paths):
+        self._paths = list(paths)
+        self._texts = []
+        self._index = None
+        self._exact = False
+        self._cache = {}
+
+    def add_registry(self, path):
+        """Merges the genomes listed in the JSON file at `path`."""
+        self._paths.append(path)
+        if self._index is not None:
+            self._load(path)
+
+    def _load(self, path):
+        with open(path, 'r') as f:
+            text = f.read()
+        self._texts.append(text)
+        self._index_source(len(self._texts) - 1, self._exact)
+
+    def _index_source(self, source, exact=False):
+        for genome_id, offset in _scan_registry(self._texts[source], exact).items():
+            self._index[genome_id] = (source, offset)
+            self._cache.pop(genome_id, None)
+
+    def _reindex_exact(self):
+        self._exact = True
+        self._index = {}
+        for source in range(len(self._texts)):
+            self._index_source(source, exact=True)
+
+    def _ensure_index(self):
+        if self._index is None:
+            self._index = {}
+            for path in self._paths:
+                self._load(path)
+        return self._index
+
+    def __getitem__(self, genome_id):
+        if genome_id not in self._cache:
+            source, offset = self._ensure_index()[genome_id]
+            genome, _ = json.JSONDecoder().raw_decode(self._texts[source], offset)
+            if genome.get('id') != genome_id:
+                if self._exact:
+                    raise KeyError(genome_id)
+                # the fast scan was fooled by the content of a string
+                self._reindex_exact()
+                return self[genome_id]
+            self._cache[genome_id] = genome
+        return self._cache[genome_id]
+
+    def __getattr__(self, name):
+        # Attribute access is kept for backward compatibility with the former Bunch.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __contains__(self, genome_id):
+        return genome_id in self._ensure_index()
+
+    def __iter__(self):
+        return iter(self._ensure_index())
+
+    def __len__(self):
+        return len(self._ensure_index())
+
+    def __repr__(self):
+        if self._index is None:
+            return '%s(<not loaded>)' % type(self).__name__
+        return '%s(%s)' % (type(self).__name__, list(self._index))
@@ -0,0 +1,138 @@
+import numpy as np
+
+from ._chromosomes import alias
+from .features import _encode_strings
+from .tiles import tile_cache
+
+
+# genotype codes sent to the frontend, EMPTY for bins without any variant
+EMPTY, NO_CALL, HOM_REF, HET, HOM_VAR = -2, -1, 0, 1, 2
+
+# rows of the matrix read at once when aggregating large windows
+CHUNK_ROWS = 65536
+
+
+def _codes(calls):
+    # allele counts above 2 (polyploid or multi-allelic) are shown as hom var
+    return np.where(calls < 0, NO_CALL, np.minimum(calls, HOM_VAR)).astype(np.int8)
+
+
+class GenotypeMatrix(object):
+    """
+    Genotypes of a cohort held in the kernel, served to a VariantTrack for
+    the variants in view and a page of samples at a time.
+
+    `genotypes` is a (variants x samples) matrix of alternate allele counts
+    (0 hom ref, 1 het, 2 hom var, negative for no call): a numpy array, or
+    any array supporting 2D slicing (e.g. zarr), read window by window.
+    Variants are sorted by chromosome and 1-based position `pos`.
+
+    Windows of up to `max_variants` variants are sent call by call, larger
+    ones (or in SQUISHED mode) as the most severe genotype per pixel and
+    sample, with per-pixel genotype counts: payloads stay under about
+    max(max_variants, width) x page_size bytes. Bins without any variant
+    are EMPTY, distinct from no calls.
+    """
+
+    def __init__(self, genotypes, chr, pos, samples, ref=None, alt=None,
+                 page_size=100, max_variants=2000, cache_size=64 * 2**20):
+        self.genotypes = genotypes
+        self.samples = [str(s) for s in samples]
+        self.pos = np.asarray(pos, dtype=np.int64)
+        n_variants, n_samples = genotypes.shape
+        if len(self.pos) != n_variants or len(self.samples) != n_samples:
+            raise ValueError('genotypes must be a (variants x samples) matrix matching pos and samples')
+        self.ref = None if ref is None else [str(r) for r in ref]
+        self.alt = None if alt is None else [str(a) for a in alt]
+        self.page_size = page_size
+        self.max_variants = max_variants
+
+        chr = np.asarray(chr, dtype=str)
+        changes = np.flatnonzero(chr[1:] != chr[:-1]) + 1
+        bounds = np.concatenate([[0], changes, [n_variants]])
+        self.chromosomes = {}
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            name = str(chr[lo])
+            if name in self.chromosomes or np.any(np.diff(self.pos[lo:hi]) < 0):
+                raise ValueError('variants must be sorted by chromosome and position')
+            self.chromosomes[name] = (lo, hi)
+        self.cache = tile_cache(cache_size)
+
+    @property
+    def pages(self):
+        return -(-len(self.samples) // self.page_size)
+
+    def rows(self, chr, start, end):
+        """Returns the row range of the variants in [start, end) (0-based) on chr."""
+        chr = alias(self.chromosomes, chr)
+        if chr is None:
+            return 0, 0
+        lo, hi = self.chromosomes[chr]
+        positions = self.pos[lo:hi] - 1
+        return lo + np.searchsorted(positions, start), lo + np.searchsorted(positions, end)
+
+    def _page(self, page):
+        first = page * self.page_size
+        return first, min(first + self.page_size, len(self.samples))
+
+    def window(self, chr, start, end, page=0, width=1000, squished=False):
+        """
+        Returns the packed genotypes of the variants in [start, end) for a page
+        of samples: call by call, or aggregated over `width` pixels.
+        """
+        key = (chr, start, end, page, width, squished)
+        return self.cache.get_or_compute(key, lambda: self._window(chr, start, end, page, width, squished))
+
+    def _window(self, chr, start, end, page, width, squished):
+        lo, hi = self.rows(chr, start, end)
+        first, last = self._page(page)
+        packed = {'samples': self.samples[first:last]}
+        if hi - lo <= self.max_variants and not squished:
+            calls = np.asarray(self.genotypes[lo:hi, first:last])
+            packed.update({
+                'mode': 'calls',
+                'length': int(hi - lo),
+                'pos': memoryview(self.pos[lo:hi].astype(np.uint32)),
+                'genotypes': memoryview(_codes(calls)),
+            })
+            for name in ('ref', 'alt'):
+                values = getattr(self, name)
+                if values is not None:
+                    data, offsets = _encode_strings(values[lo:hi])
+                    packed[name] = memoryview(data)
+                    packed[name + '_offsets'] = memoryview(offsets)
+            return packed
+
+        bins = max(1, min(int(width), 4096))
+        bin_size = max(end - start, 1) / bins
+        severe = np.full((bins, last - first), EMPTY, dtype=np.int8)
+        counts = np.zeros((bins, 4), dtype=np.uint32)
+        for chunk in range(lo, hi, CHUNK_ROWS):
+            stop = min(chunk + CHUNK_ROWS, hi)
+            calls = np.asarray(self.genotypes[chunk:stop, first:last])
+            calls = _codes(calls)
+            variant_bins = np.minimum(((self.pos[chunk:stop] - 1 - start) / bin_size).astype(np.int64), bins - 1)
+            # variants are sorted: each bin is a contiguous run of rows
+            run_starts = np.flatnonzero(np.diff(variant_bins, prepend=-1))
+            run_bins = variant_bins[run_starts]
+            severe[run_bins] = np.maximum(severe[run_bins], np.maximum.reduceat(calls, run_starts, axis=0))
+            for code in (NO_CALL, HOM_REF, HET, HOM_VAR):
+                per_variant = (calls == code).sum(axis=1)
+                np.add.at(counts[:, code + 1], variant_bins, per_variant)
+        packed.update({
+            'mode': 'bins',
+            'length': bins,
+            'bin_size': bin_size,
+            'start': start,
+            'variants': int(hi - lo),
+            'genotypes': memoryview(severe),
+            'counts': memoryview(counts),
+        })
+        return packed
+
+    def describe(self):
+        return {
+            'samples': len(self.samples),
+            'page_size': self.page_size,
+            'pages': self.pages,
+        }
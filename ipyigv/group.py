@@ -0,0 +1,54 @@
+from IPython.display import display
+from ipywidgets import GridBox, Layout, Widget, register, widget_serialization
+from ipywidgets.widgets.trait_types import InstanceDict
+from traitlets import Bool, Int, List, Unicode
+
+from ._version import EXTENSION_VERSION
+from .ipyigv import IgvBrowser
+from .options import ReferenceGenome
+
+
+@register
+class BrowserGroup(Widget):
+    """
+    A group of linked browsers sharing a reference genome: reference files
+    are loaded once for all of them, and locus changes (navigation in any of
+    them, or setting `locus`) are applied to all the browsers in the frontend,
+    without a round trip through the kernel.
+
+    Displaying a group shows its browsers in a grid of `columns` columns.
+    """
+
+    _model_name = Unicode('BrowserGroupModel').tag(sync=True)
+    _model_module = Unicode('jupyter-igv').tag(sync=True)
+    _model_module_version = Unicode(EXTENSION_VERSION).tag(sync=True)
+
+    genome = InstanceDict(ReferenceGenome).tag(sync=True, **widget_serialization)
+    locus = (Unicode() | List(Unicode())).tag(sync=True)
+    syncLocus = Bool(default_value=True).tag(sync=True)
+    columns = Int(default_value=3)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.browsers = []
+
+    def add_browser(self, **kwargs):
+        """Creates a browser of the group, with the given browser options."""
+        kwargs.setdefault('locus', self.locus)
+        browser = IgvBrowser(genome=self.genome, group=self, **kwargs)
+        self.browsers.append(browser)
+        return browser
+
+    def remove_browser(self, browser):
+        self.browsers.remove(browser)
+        browser.close()
+
+    def grid(self, columns=None, height=None):
+        """Returns a GridBox laying out the browsers of the group."""
+        layout = Layout(grid_template_columns='repeat(%d, minmax(0, 1fr))' % (columns or self.columns))
+        if height is not None:
+            layout.grid_auto_rows = height
+        return GridBox(list(self.browsers), layout=layout)
+
+    def _ipython_display_(self, **kwargs):
+        display(self.grid())
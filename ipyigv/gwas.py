@@ -0,0 +1,125 @@
+import numpy as np
+
+from ._chromosomes import alias, chromosome_codes
+from .features import _column, _encode_strings
+from .tiles import ZoomLevels, tile_cache
+
+
+def _reduce_level(level, bin_size):
+    """Keeps the most significant point of each bin, and the number of SNPs it holds."""
+    bins = (level['pos'] - 1) // bin_size
+    starts = np.flatnonzero(np.diff(bins, prepend=-1))
+    if len(starts) == 0:
+        return level
+    best = np.maximum.reduceat(level['value'], starts)
+    lengths = np.diff(np.append(starts, len(bins)))
+    # first point of each bin reaching the best value
+    candidates = np.flatnonzero(level['value'] == np.repeat(best, lengths))
+    first = candidates[np.searchsorted(candidates, starts)]
+    return {
+        'pos': level['pos'][first],
+        'value': level['value'][first],
+        'ids': level['ids'][first],
+        'count': np.add.reduceat(level['count'], starts).astype(np.uint32),
+    }
+
+
+class GwasPyramid(ZoomLevels):
+    """
+    GWAS summary statistics held in memory (chromosome, 1-based position,
+    p-value and optional SNP names), served to a GwasTrack tile by tile.
+
+    Level 0 holds all the SNPs, higher levels k hold, per bin of `resolution
+    * factor**k` bp, its most significant SNP and the number of SNPs it
+    holds (density), until the longest chromosome fits in a tile of
+    `tile_bins` bins: views show at most one point per pixel.
+    """
+
+    def __init__(self, chr, pos, p, names=None, resolution=1000, factor=4, tile_bins=512,
+                 cache_size=64 * 2**20):
+        self.resolution = resolution
+        self.factor = factor
+        self.tile_bins = tile_bins
+        chr = np.asarray(chr, dtype=str)
+        pos = np.asarray(pos, dtype=np.int64)
+        p = np.asarray(p, dtype=np.float64)
+        if not len(chr) == len(pos) == len(p):
+            raise ValueError('chr, pos and p must have the same length')
+        if len(pos) and (pos.min() < 1 or pos.max() > np.iinfo(np.uint32).max):
+            raise ValueError('positions must be 1-based and fit in an unsigned 32 bits integer')
+        order = np.flatnonzero(~np.isnan(p))
+        chr, pos = chr[order], pos[order]
+        # a single integer sort, when not sorted already
+        chr_names, codes = chromosome_codes(chr)
+        key = (codes.astype(np.int64) << 32) | pos
+        if np.any(key[1:] < key[:-1]):
+            sort = np.argsort(key, kind='stable')
+            order, codes, pos = order[sort], codes[sort], pos[sort]
+        # -log10(p), p-values of 0 being clipped to the smallest double
+        value = -np.log10(np.clip(p[order], np.finfo(np.float64).tiny, 1)).astype(np.float32)
+        self.names = None if names is None else np.asarray(names, dtype=str)[order].tolist()
+
+        longest = max([int(pos.max()) if len(pos) else 1, 1])
+        depth = 1
+        while -(-longest // (resolution * factor**(depth - 1))) > tile_bins:
+            depth += 1
+        self.bin_sizes = [resolution * factor**level for level in range(depth)]
+
+        self.levels = {}
+        self.lengths = {}
+        bounds = np.searchsorted(codes, np.arange(len(chr_names) + 1))
+        for code, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])):
+            level = {
+                'pos': pos[lo:hi].astype(np.uint32),
+                'value': value[lo:hi],
+                'ids': np.arange(lo, hi, dtype=np.uint32),
+                'count': np.ones(hi - lo, dtype=np.uint32),
+            }
+            levels = [level]
+            for bin_size in self.bin_sizes[1:]:
+                levels.append(_reduce_level(levels[-1], bin_size))
+            self.levels[str(chr_names[code])] = levels
+            self.lengths[str(chr_names[code])] = int(pos[hi - 1])
+        self.cache = tile_cache(cache_size)
+
+    @classmethod
+    def from_dataframe(cls, df, chr='chr', pos='pos', p='p', name='name', **kwargs):
+        """Builds a GwasPyramid from a pandas DataFrame (or a dict of arrays)."""
+        return cls(_column(df, chr), _column(df, pos), _column(df, p), names=_column(df, name), **kwargs)
+
+    def snp_table(self):
+        """Returns the chr, pos and p-value arrays of all the SNPs, sorted by position."""
+        snps = [(chr, levels[0]) for chr, levels in self.levels.items()]
+        chr = np.repeat(np.array([chr for chr, _ in snps], dtype=str), [len(level['pos']) for _, level in snps])
+        pos = np.concatenate([level['pos'] for _, level in snps] + [np.empty(0, dtype=np.uint32)])
+        value = np.concatenate([level['value'] for _, level in snps] + [np.empty(0, dtype=np.float32)])
+        return chr, pos, 10 ** -value.astype(np.float64)
+
+    def tile(self, chr, level, index):
+        """
+        Returns the packed points of a tile (`tile_bins` bins of the level):
+        positions, -log10(p) values, SNP counts, ids and names if any.
+        """
+        chr = alias(self.levels, chr)
+        if chr is None:
+            return {'length': 0}
+
+        def compute():
+            points = self.levels[chr][level]
+            span = self.bin_sizes[level] * self.tile_bins
+            lo, hi = np.searchsorted(points['pos'], [index * span + 1, (index + 1) * span + 1])
+            tile = {name: memoryview(np.ascontiguousarray(values[lo:hi])) for name, values in points.items()}
+            tile['length'] = int(hi - lo)
+            if self.names is not None:
+                data, offsets = _encode_strings([self.names[i] for i in points['ids'][lo:hi]])
+                tile['name'], tile['name_offsets'] = memoryview(data), memoryview(offsets)
+            return tile
+
+        return self.cache.get_or_compute((chr, level, index), compute)
+
+    def describe(self):
+        return {
+            'chromosomes': self.lengths,
+            'bin_sizes': self.bin_sizes,
+            'tile_bins': self.tile_bins,
+        }
@@ -0,0 +1,421 @@
+"""
+Indexing of local track and genome files, so that igv.js reads only the
+regions in view instead of whole files.
+
+Tabix-able text formats (BED, VCF, GFF...) are compressed with bgzip and
+indexed with tabix, FASTA files get a .fai index. Both are built in a single
+streaming pass (after an external sort for unsorted files), and cached per
+source file until it is modified.
+
+Indexing runs in the kernel and can take a while for large files, so it is
+only done on request, by `Track.index()` or `ReferenceGenome.index()`.
+"""
+import gzip
+import hashlib
+import heapq
+import json
+import os
+import struct
+import tempfile
+import zlib
+
+from urllib.parse import urlparse
+
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ipyigv', 'indexes')
+
+# tabix formats: 0-based half-open (UCSC) coordinates or 1-based closed ones
+TBX_GENERIC, TBX_VCF, TBX_UCSC = 0, 2, 0x10000
+
+# extension: (format, sequence, begin and end columns (1-based, 0 for none))
+TABIX_PRESETS = {
+    '.bed': (TBX_UCSC, 1, 2, 3),
+    '.bedGraph': (TBX_UCSC, 1, 2, 3),
+    '.narrowPeak': (TBX_UCSC, 1, 2, 3),
+    '.broadPeak': (TBX_UCSC, 1, 2, 3),
+    '.vcf': (TBX_VCF, 1, 2, 0),
+    '.gff': (TBX_GENERIC, 1, 4, 5),
+    '.gff3': (TBX_GENERIC, 1, 4, 5),
+    '.gtf': (TBX_GENERIC, 1, 4, 5),
+}
+FASTA_EXTENSIONS = ('.fa', '.fasta', '.fna')
+
+BGZF_BLOCK_SIZE = 0xff00
+BGZF_EOF = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+LINEAR_SHIFT = 14
+SORT_CHUNK_LINES = 500000
+
+
+def local_path(url):
+    """Returns the path of a url that is an existing local file, else None."""
+    if not url:
+        return None
+    parsed = urlparse(url)
+    if parsed.scheme == 'file':
+        url = parsed.path
+    elif parsed.scheme and len(parsed.scheme) > 1:  # not a windows drive
+        return None
+    return url if os.path.isfile(url) else None
+
+
+def _extension(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    return os.path.splitext(name)[1]
+
+
+class BgzfWriter(object):
+    """Writes BGZF (blocked gzip) data, tracking virtual offsets."""
+
+    def __init__(self, f, level=6):
+        self.f = f
+        self.level = level
+        self.buffer = bytearray()
+        self.block_offset = 0
+
+    def tell(self):
+        # virtual offset: compressed offset of the block << 16 | offset in the block
+        return (self.block_offset << 16) | len(self.buffer)
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= BGZF_BLOCK_SIZE:
+            self.flush_blocks()
+
+    def flush_blocks(self):
+        # writes the full blocks of the buffer (modified in place)
+        while len(self.buffer) >= BGZF_BLOCK_SIZE:
+            self._write_block(bytes(self.buffer[:BGZF_BLOCK_SIZE]))
+            del self.buffer[:BGZF_BLOCK_SIZE]
+
+    def _write_block(self, data):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+        header = struct.pack('<4BI2BH2BHH', 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(compressed) + 25)
+        footer = struct.pack('<II', zlib.crc32(data), len(data))
+        self.f.write(header + compressed + footer)
+        self.block_offset += len(header) + len(compressed) + len(footer)
+
+    def close(self):
+        if self.buffer:
+            self._write_block(bytes(self.buffer))
+            self.buffer = bytearray()
+        self.f.write(BGZF_EOF)
+
+
+def reg2bin(beg, end):
+    """Bin of the UCSC binning scheme holding [beg, end), as in tabix."""
+    end -= 1
+    for shift, offset in ((14, 4681), (17, 585), (20, 73), (23, 9), (26, 1)):
+        if beg >> shift == end >> shift:
+            return offset + (beg >> shift)
+    return 0
+
+
+class _Reference(object):
+
+    def __init__(self):
+        self.bins = {}
+        self.intervals = []
+
+    def add(self, beg, end, start_offset, end_offset):
+        first, last = beg >> LINEAR_SHIFT, (end - 1) >> LINEAR_SHIFT
+        # most records fall in a single 16 kb window, i.e. in a leaf bin
+        bin = 4681 + first if first == last else reg2bin(beg, end)
+        chunks = self.bins.get(bin)
+        if chunks is None:
+            self.bins[bin] = [[start_offset, end_offset]]
+        elif chunks[-1][1] == start_offset:
+            chunks[-1][1] = end_offset
+        else:
+            chunks.append([start_offset, end_offset])
+        intervals = self.intervals
+        if len(intervals) <= last:
+            intervals.extend([None] * (last + 1 - len(intervals)))
+        for window in range(first, last + 1):
+            if intervals[window] is None:
+                intervals[window] = start_offset
+
+    def linear_index(self):
+        offsets, previous = [], 0
+        for offset in self.intervals:
+            previous = previous if offset is None else offset
+            offsets.append(previous)
+        return offsets
+
+
+class _Unsorted(Exception):
+    pass
+
+
+class _Parser(object):
+
+    def __init__(self, preset):
+        self.format, self.col_seq, self.col_beg, self.col_end = preset
+        # only the needed fields are split (int() ignores the trailing newline)
+        self.splits = max(self.col_seq, self.col_beg, self.col_end, 4 if self.format == TBX_VCF else 0)
+
+    def is_header(self, line):
+        return line.startswith((b'#', b'track', b'browser'))
+
+    def key(self, line):
+        fields = line.split(b'\t', self.splits)
+        return fields[self.col_seq - 1], int(fields[self.col_beg - 1])
+
+    def parse(self, line):
+        # returns the sequence name (bytes) and 0-based half-open range
+        fields = line.split(b'\t', self.splits)
+        beg = int(fields[self.col_beg - 1])
+        if self.format != TBX_UCSC:
+            beg -= 1
+        if self.format == TBX_VCF:
+            end = beg + len(fields[3])
+        elif self.col_end:
+            end = int(fields[self.col_end - 1])
+        else:
+            end = beg + 1
+        return fields[self.col_seq - 1], beg, end if end > beg else beg + 1
+
+
+def _index_lines(lines, output, parser):
+    """
+    Writes lines to `output` as BGZF and returns the tabix index of their
+    records, raising _Unsorted for records out of order.
+    """
+    writer = BgzfWriter(output)
+    buffer = writer.buffer
+    names, references = [], {}
+    skip = 0
+    current, reference, last_beg = None, None, -1
+    for line in lines:
+        if not line.strip():
+            continue
+        if not line.endswith(b'\n'):
+            line += b'\n'
+        if parser.is_header(line):
+            # not indexed; all the leading header lines are skipped by readers
+            writer.write(line)
+            skip += current is None
+            continue
+        chr, beg, end = parser.parse(line)
+        if chr != current:
+            if chr in references:
+                raise _Unsorted()
+            names.append(chr.decode())
+            reference = references[chr] = _Reference()
+            current, last_beg = chr, -1
+        if beg < last_beg:
+            raise _Unsorted()
+        last_beg = beg
+        # writer.tell() and writer.write(), inlined
+        start_offset = (writer.block_offset << 16) | len(buffer)
+        buffer += line
+        if len(buffer) >= BGZF_BLOCK_SIZE:
+            writer.flush_blocks()
+        reference.add(beg, end, start_offset, (writer.block_offset << 16) | len(buffer))
+    writer.close()
+    return names, list(references.values()), skip
+
+
+def _tabix_bytes(parser, names, references, skip):
+    names_data = b''.join(name.encode() + b'\0' for name in names)
+    parts = [b'TBI\1', struct.pack('<8i', len(names), parser.format, parser.col_seq, parser.col_beg,
+                                   parser.col_end, ord('#'), skip, len(names_data)), names_data]
+    for reference in references:
+        parts.append(struct.pack('<i', len(reference.bins)))
+        for bin, chunks in sorted(reference.bins.items()):
+            parts.append(struct.pack('<Ii', bin, len(chunks)))
+            parts.extend(struct.pack('<QQ', beg, end) for beg, end in chunks)
+        offsets = reference.linear_index()
+        parts.append(struct.pack('<i%dQ' % len(offsets), len(offsets), *offsets))
+    return b''.join(parts)
+
+
+def _open_lines(path):
+    return gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+
+
+def _sorted_lines(path, parser, directory):
+    """
+    Yields the lines of a file, headers first then records sorted by
+    chromosome and start, sorting chunks in memory and merging them from
+    temporary files.
+    """
+    headers, chunks, records = [], [], []
+
+    def flush():
+        records.sort()
+        chunk = tempfile.TemporaryFile(dir=directory)
+        chunk.writelines(line for _, line in records)
+        chunk.seek(0)
+        chunks.append(chunk)
+        del records[:]
+
+    with _open_lines(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            if not line.endswith(b'\n'):
+                line += b'\n'
+            if parser.is_header(line):
+                headers.append(line)
+                continue
+            records.append((parser.key(line), line))
+            if len(records) >= SORT_CHUNK_LINES:
+                flush()
+    flush()
+    try:
+        for line in headers:
+            yield line
+        for line in heapq.merge(*chunks, key=parser.key):
+            yield line
+    finally:
+        for chunk in chunks:
+            chunk.close()
+
+
+def _atomic_write(path, write):
+    temp = path + '.tmp%d' % os.getpid()
+    try:
+        with open(temp, 'wb') as f:
+            write(f)
+        os.replace(temp, path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+def bgzip_index(path, output, preset):
+    """
+    Compresses the text file (possibly gzipped) at `path` to `output` with
+    bgzip, and writes its tabix index to `output + '.tbi'`.
+    """
+    parser = _Parser(preset)
+    result = {}
+
+    def write_data(f):
+        try:
+            with _open_lines(path) as lines:
+                result['index'] = _index_lines(lines, f, parser)
+        except _Unsorted:
+            f.seek(0)
+            f.truncate()
+            result['index'] = _index_lines(_sorted_lines(path, parser, os.path.dirname(output)), f, parser)
+
+    def write_index(f):
+        writer = BgzfWriter(f)
+        writer.write(_tabix_bytes(parser, *result['index']))
+        writer.close()
+
+    _atomic_write(output, write_data)
+    _atomic_write(output + '.tbi', write_index)
+
+
+def fasta_index(path, output):
+    """Writes the .fai index of an uncompressed FASTA file to `output`."""
+    entries = []
+    name = None
+    offset = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.startswith(b'>'):
+                if name is not None:
+                    entries.append((name, length, start, line_bases, line_width))
+                name = line[1:].split()[0].decode()
+                start = offset + len(line)
+                length, line_bases, line_width = 0, 0, 0
+            elif name is not None:
+                bases = len(line.rstrip(b'\r\n'))
+                if line_bases == 0:
+                    line_bases, line_width = bases, len(line)
+                length += bases
+            offset += len(line)
+    if name is not None:
+        entries.append((name, length, start, line_bases, line_width))
+
+    def write(f):
+        f.write(''.join('%s\t%d\t%d\t%d\t%d\n' % entry for entry in entries).encode())
+
+    _atomic_write(output, write)
+
+
+def _cache_dir(path):
+    # one directory per source file, rebuilt when the file changes
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    directory = os.path.join(CACHE_DIR, hashlib.sha1(path.encode()).hexdigest()[:16])
+    stamp_path = os.path.join(directory, 'source.json')
+    stamp = {'path': path, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+    try:
+        with open(stamp_path) as f:
+            fresh = json.load(f) == stamp
+    except (OSError, ValueError):
+        fresh = False
+    os.makedirs(directory, exist_ok=True)
+    return directory, fresh, lambda: _atomic_write(stamp_path, lambda f: f.write(json.dumps(stamp).encode()))
+
+
+def _existing_index(path, extensions):
+    for extension in extensions:
+        if os.path.isfile(path + extension):
+            return path + extension
+    return None
+
+
+def index_file(path):
+    """
+    Returns (url, indexURL) of an indexed version of a local track file:
+    the file itself with its existing index, or a bgzipped copy and its tabix
+    index in the cache (built if needed). Returns None for formats which are
+    not tabix-able.
+    """
+    preset = TABIX_PRESETS.get(_extension(path))
+    if preset is None:
+        return None
+    if path.endswith('.gz'):
+        existing = _existing_index(path, ('.tbi', '.csi'))
+        if existing is not None:
+            return path, existing
+    directory, fresh, stamp = _cache_dir(path)
+    name = os.path.basename(path)
+    output = os.path.join(directory, name if name.endswith('.gz') else name + '.gz')
+    if not (fresh and os.path.isfile(output) and os.path.isfile(output + '.tbi')):
+        bgzip_index(path, output, preset)
+        stamp()
+    return output, output + '.tbi'
+
+
+def index_fasta(path):
+    """Returns the .fai index of a local, uncompressed FASTA file, built if needed."""
+    existing = _existing_index(path, ('.fai',))
+    if existing is not None:
+        return existing
+    directory, fresh, stamp = _cache_dir(path)
+    output = os.path.join(directory, os.path.basename(path) + '.fai')
+    if not (fresh and os.path.isfile(output)):
+        fasta_index(path, output)
+        stamp()
+    return output
+
+
+def track_index(url, index_url=None):
+    """
+    Returns the options reading the local, unindexed track file at `url`
+    through an index (see `index_file`), from the kernel; an empty dict when
+    there is nothing to index.
+    """
+    path = local_path(url)
+    if path is None or index_url:
+        return {}
+    indexed = index_file(path)
+    if indexed is None:
+        return {}
+    url, index_url = indexed
+    return dict(url=url, indexURL=index_url, indexed=True, sourceType='kernel')
+
+
+def genome_index(fasta_url, index_url=None):
+    """As `track_index`, for the FASTA file of a reference genome."""
+    path = local_path(fasta_url)
+    if path is None or index_url or not path.endswith(FASTA_EXTENSIONS):
+        return {}
+    return dict(indexURL=index_fasta(path), indexed=True, sourceType='kernel')
@@ -0,0 +1,164 @@
+import numpy as np
+
+from ._chromosomes import alias, chromosome_codes
+from .features import _column
+from .tiles import ZoomLevels
+
+
+def _bin_level(level, bin_size, n_chr):
+    """Sums the scores of the contacts joining the same pair of bins."""
+    c1, c2 = level['chr1'], level['chr2']
+    b1, b2 = level['start1'] // bin_size, level['start2'] // bin_size
+    pair = c1.astype(np.int64) * n_chr + c2
+    n_bins = max(int(b1.max()), int(b2.max())) + 1 if len(b1) else 1
+    bins = b1.astype(np.int64) * n_bins + b2
+    if n_chr**2 * n_bins**2 < 2**63:
+        key = pair * n_bins**2 + bins
+        order = np.argsort(key)
+        key = key[order]
+        starts = np.flatnonzero(np.diff(key, prepend=-1))
+    else:
+        order = np.lexsort((bins, pair))
+        pair, bins = pair[order], bins[order]
+        starts = np.flatnonzero((np.diff(pair, prepend=-1) != 0) | (np.diff(bins, prepend=-1) != 0))
+    first = order[starts]
+    start1 = (b1[first] * bin_size).astype(np.uint32)
+    start2 = (b2[first] * bin_size).astype(np.uint32)
+    return {
+        'chr1': c1[first],
+        'start1': start1,
+        'end1': start1 + np.uint32(bin_size),
+        'chr2': c2[first],
+        'start2': start2,
+        'end2': start2 + np.uint32(bin_size),
+        'score': np.add.reduceat(level['score'][order], starts).astype(np.float32) if len(order) else level['score'],
+        'count': np.add.reduceat(level['count'][order], starts).astype(np.uint32) if len(order) else level['count'],
+    }
+
+
+def _span_index(level, chr_names):
+    """
+    Per chromosome, the rows of the contacts with an anchor on it, sorted by
+    the start of their span (both anchors for intra-chromosomal contacts, the
+    anchor on the chromosome otherwise), with the running maximum of span ends.
+    """
+    intra = level['chr1'] == level['chr2']
+    inter = np.flatnonzero(~intra)
+    rows = np.concatenate([np.arange(len(intra)), inter])
+    codes = np.concatenate([level['chr1'], level['chr2'][inter]]).astype(np.int64)
+    starts = np.concatenate([level['start1'], level['start2'][inter]])
+    ends = np.concatenate([np.where(intra, level['end2'], level['end1']), level['end2'][inter]])
+    order = np.argsort((codes << 32) | starts)
+    rows, codes, starts, ends = rows[order], codes[order], starts[order], ends[order]
+    bounds = np.searchsorted(codes, np.arange(len(chr_names) + 1))
+    index = {}
+    for code, chr in enumerate(chr_names):
+        lo, hi = bounds[code], bounds[code + 1]
+        max_ends = np.maximum.accumulate(ends[lo:hi]) if hi > lo else ends[lo:hi]
+        index[str(chr)] = (rows[lo:hi], starts[lo:hi], max_ends)
+    return index
+
+
+class InteractionPyramid(ZoomLevels):
+    """
+    Contacts between pairs of anchors (e.g. from Hi-C or ChIA-PET) held in
+    memory, served to an InteractionTrack window by window.
+
+    Level 0 holds all the contacts, higher levels k the contacts binned by
+    `resolution * factor**k` bp, the scores of the contacts joining the same
+    pair of bins being summed (a missing score counts 1), until the longest
+    chromosome has at most `max_bins` bins. A window is served at the finest
+    level whose bins are at least one pixel wide, with the `max_arcs` highest
+    scoring arcs crossing it.
+
+    Positions are 0-based, end exclusive, as in BEDPE files.
+    """
+
+    def __init__(self, chr1, start1, end1, chr2, start2, end2, score=None, resolution=1000, factor=4,
+                 max_bins=2048):
+        self.resolution = resolution
+        self.factor = factor
+        self.max_bins = max_bins
+        n = len(chr1)
+        self.chr_names, codes = chromosome_codes(np.concatenate([np.asarray(chr1, dtype=str),
+                                                                  np.asarray(chr2, dtype=str)]))
+        level = {
+            'chr1': codes[:n].astype(np.uint32),
+            'start1': np.asarray(start1, dtype=np.uint32),
+            'end1': np.asarray(end1, dtype=np.uint32),
+            'chr2': codes[n:].astype(np.uint32),
+            'start2': np.asarray(start2, dtype=np.uint32),
+            'end2': np.asarray(end2, dtype=np.uint32),
+            'score': np.ones(n, dtype=np.float32) if score is None else np.asarray(score, dtype=np.float32),
+            'count': np.ones(n, dtype=np.uint32),
+        }
+        if not all(len(values) == n for values in level.values()):
+            raise ValueError('anchors and scores must have the same length')
+        # anchors are ordered, the first one on the lower chromosome or position
+        swap = (level['chr1'] > level['chr2']) | (
+            (level['chr1'] == level['chr2']) & (level['start1'] > level['start2']))
+        for a, b in (('chr1', 'chr2'), ('start1', 'start2'), ('end1', 'end2')):
+            level[a], level[b] = np.where(swap, level[b], level[a]), np.where(swap, level[a], level[b])
+
+        longest = max(int(level['end1'].max()) if n else 1, int(level['end2'].max()) if n else 1)
+        depth = 1
+        while -(-longest // (resolution * factor**(depth - 1))) > max_bins:
+            depth += 1
+        self.bin_sizes = [resolution * factor**k for k in range(depth)]
+        self.levels = [level]
+        for bin_size in self.bin_sizes[1:]:
+            self.levels.append(_bin_level(self.levels[-1], bin_size, len(self.chr_names)))
+        self.indexes = [_span_index(level, self.chr_names) for level in self.levels]
+
+    @classmethod
+    def from_dataframe(cls, df, score='score', **kwargs):
+        """Builds an InteractionPyramid from a BEDPE-like pandas DataFrame (or a dict of arrays)."""
+        columns = [_column(df, name) for name in ('chr1', 'start1', 'end1', 'chr2', 'start2', 'end2')]
+        return cls(*columns, score=_column(df, score), **kwargs)
+
+    def query(self, chr, start, end, level=0):
+        """Returns the rows of the level whose arcs cross [start, end) on chr."""
+        chr = alias(self.indexes[level], chr)
+        if chr is None:
+            return np.empty(0, dtype=np.int64)
+        rows, starts, max_ends = self.indexes[level][chr]
+        lo = np.searchsorted(max_ends, start, side='right')
+        hi = np.searchsorted(starts, end, side='left')
+        candidates = rows[lo:hi]
+        points = self.levels[level]
+        code = np.searchsorted(self.chr_names, chr)
+        intra = points['chr1'][candidates] == points['chr2'][candidates]
+        # the span end of the candidate on chr (see _span_index)
+        on2 = ~intra & (points['chr2'][candidates] == code)
+        ends = np.where(intra | on2, points['end2'][candidates], points['end1'][candidates])
+        return candidates[ends > start]
+
+    def window(self, chr, start, end, width=1000, max_arcs=5000):
+        """
+        Returns the packed arcs crossing [start, end) on chr, at the level
+        matching `width` pixels: the `max_arcs` highest scoring ones.
+        """
+        level = self.level_for((end - start) / max(width, 1))
+        rows = self.query(chr, start, end, level)
+        points = self.levels[level]
+        if len(rows) > max_arcs:
+            rows = rows[np.argpartition(-points['score'][rows], max_arcs - 1)[:max_arcs]]
+        rows = np.sort(rows)
+        packed = {name: memoryview(np.ascontiguousarray(values[rows])) for name, values in points.items()}
+        packed['length'] = len(rows)
+        packed['level'] = level
+        packed['chromosomes'] = [str(name) for name in self.chr_names]
+        return packed
+
+    def contacts(self):
+        """Returns the contacts of level 0 as BEDPE-like columns (anchors ordered)."""
+        points = self.levels[0]
+        columns = dict(points, chr1=self.chr_names[points['chr1']], chr2=self.chr_names[points['chr2']])
+        del columns['count']
+        return columns
+
+    def describe(self):
+        return {
+            'length': len(self.levels[0]['score']),
+            'bin_sizes': self.bin_sizes,
+        }
@@ -1,28 +1,42 @@
-import json
+from contextlib import contextmanager
 
-from ipywidgets import DOMWidget, Output, Widget, register, widget_serialization
+from ipywidgets import CallbackDispatcher, DOMWidget, Output, Widget, register, widget_serialization
 from ipywidgets.widgets.trait_types import InstanceDict
 
-from traitlets import Unicode, Int, List, Instance, Bool, validate, TraitError
-from traitlets.utils.bunch import Bunch
-
+from traitlets import Unicode, Int, List, Instance, Bool, observe, validate, TraitError
 from .options import *
+from .specs import TrackSpec, spec_serialization
+from .genomes import GenomeRegistry
+from .messaging import RequestHandler
+from .perf import PerfLog
+from .search import GeneIndex
+from .state import SparseStateMixin
+from .tiles import describe_serialization
+from . import fileserver, messaging, session
 
 from ._version import EXTENSION_VERSION
 
 PUBLIC_GENOMES_FILE = os.path.join(os.path.dirname(__file__), 'public_genomes.json')
-PUBLIC_GENOMES = Bunch({v['id']: v for v in json.load(open(PUBLIC_GENOMES_FILE, 'r')) } )
+PUBLIC_GENOMES = GenomeRegistry(PUBLIC_GENOMES_FILE)
 
 
 @register
-class IgvBrowser(DOMWidget):
+class IgvBrowser(SparseStateMixin, RequestHandler, DOMWidget):
     """An IGV browser widget."""
 
     def __init__(self, **kwargs):
+        self._batch_depth = 0
+        self._staged = {}
+        self._ops = []
         super().__init__(**kwargs)
+        self._tracks_loaded_handlers = CallbackDispatcher()
+        self._locus_change_handlers = CallbackDispatcher()
+        self._track_click_handlers = CallbackDispatcher()
+        self._track_drag_handlers = CallbackDispatcher()
+        self.out = Output()
+        self.perf = PerfLog()
         self.on_msg(self._custom_message_handler)
-
-    out = Output()
+        self.on_msg(self._handle_request)
 
     _view_name = Unicode('IgvBrowser').tag(sync=True)
     _model_name = Unicode('IgvModel').tag(sync=True)
@@ -37,13 +51,20 @@ class IgvBrowser(DOMWidget):
     # It is synced back to Python from the frontend *any* time the model is touched.
     genome = InstanceDict(ReferenceGenome).tag(sync=True, **widget_serialization)
     tracks = List(InstanceDict(Track)).tag(sync=True, **widget_serialization)
+    # lightweight tracks, serialized inline in the browser state
+    trackSpecs = List(Instance(TrackSpec)).tag(sync=True, **spec_serialization)
     doubleClickDelay = Int(default_value=500).tag(sync=True)
     flanking = Int(default_value=1000).tag(sync=True)
     genomeList = Unicode(allow_none=True).tag(sync=True, **widget_serialization)  # optional URL
     locus = (Unicode() | List(Unicode())).tag(sync=True, **widget_serialization)
+    # BrowserGroup the browser is linked to, if any
+    group = Instance('ipyigv.group.BrowserGroup', allow_none=True).tag(sync=True, **widget_serialization)
     minimumBases = Int(default_value=40).tag(sync=True)
     queryParametersSupported = Bool(default=False).tag(sync=True)
-    search = InstanceDict(SearchService, allow_none=True).tag(sync=True, **widget_serialization)
+    # igv.js `search` option: the remote service used by the search box
+    searchService = InstanceDict(SearchService, allow_none=True).tag(sync=True, **widget_serialization)
+    # kernel-side index resolving searches first, when set
+    geneIndex = Instance(GeneIndex, allow_none=True).tag(sync=True, **describe_serialization)
     showAllChromosomes = Bool(default_value=True).tag(sync=True)
     showAllChromosomeWidget = Bool(default_value=True).tag(sync=True)
     showNavigation = Bool(default_value=True).tag(sync=True)
@@ -52,44 +73,311 @@ class IgvBrowser(DOMWidget):
     showCenterGuide = Bool(default_value=False).tag(sync=True)
     # trackDefaults = # missing documentation
     roi = List(InstanceDict(AnnotationTrack)).tag(sync=True, **widget_serialization) # regions of interest
+    roiSets = List(Instance(RoiSet)).tag(sync=True, **widget_serialization)  # packed regions of interest
     oauthToken = Unicode(allow_none = True).tag(sync=True)
     apiKey = Unicode(allow_none = True).tag(sync=True)
     clientId = Unicode(allow_none = True).tag(sync=True)
+    # time window (ms) over which browser events are coalesced before being sent to the kernel
+    eventDebounce = Int(default_value=200).tag(sync=True)
+    # report load, redraw and fetch timings of the frontend to `perf`
+    telemetry = Bool(default_value=False).tag(sync=True)
 
-    def add_track(self, track):
-        # List subscript does not work for empty List, so handling this case manually.
-        if len(self.tracks) == 0:
-            self.tracks = [track]
+    @contextmanager
+    def batch(self):
+        """
+        Group any number of track and ROI changes into a single sync.
+
+        Inside the block, changes are applied to staged copies of the lists,
+        which are assigned, and their changes sent to the frontend, on exit.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                staged, self._staged = self._staged, {}
+                ops, self._ops = self._ops, []
+                if staged or ops:
+                    self._send_patch(staged, ops)
+
+    # Track and ROI lists are changed by patches: the new lists are assigned
+    # without a full sync, and only the operations are sent to the frontend,
+    # which applies them to its model and to igv.js. Operations refer to
+    # elements by id (model id of widgets, id of specs):
+    # - insert: {op, trait, id, value}, value being the serialized element
+    # - remove: {op, trait, id}
+    # - move: {op, trait, id, index}
+    # - update (specs): {op, trait, id, name, value}
+
+    def _current(self, name):
+        return self._staged.get(name, getattr(self, name))
+
+    def _element_json(self, name, element):
+        return self.trait_metadata(name, 'to_json')([element], self)[0]
+
+    @staticmethod
+    def _element_id(element):
+        return element.id if isinstance(element, TrackSpec) else element.model_id
+
+    def _change(self, name, value, ops):
+        if self._batch_depth > 0:
+            self._staged[name] = value
+            self._ops.extend(ops)
         else:
-            self.tracks = self.tracks[:] + [track]
+            self._send_patch({name: value}, ops)
+
+    def _send_patch(self, values, ops):
+        lock = {name: self.trait_metadata(name, 'to_json')(value, self) for name, value in values.items()}
+        with self._lock_property(**lock), self.hold_sync():
+            for name, value in values.items():
+                setattr(self, name, value)
+        if ops:
+            self.send({'type': 'patch', 'ops': ops})
+
+    def _insert(self, name, elements):
+        if elements:
+            ops = [{'op': 'insert', 'trait': name, 'id': self._element_id(e), 'value': self._element_json(name, e)}
+                   for e in elements]
+            self._change(name, self._current(name) + elements, ops)
+
+    def _remove(self, name, elements):
+        removed = set(id(e) for e in elements)
+        current = self._current(name)
+        kept = [e for e in current if id(e) not in removed]
+        if len(kept) < len(current):
+            ops = [{'op': 'remove', 'trait': name, 'id': self._element_id(e)}
+                   for e in current if id(e) in removed]
+            self._change(name, kept, ops)
+
+    def add_track(self, track):
+        self.add_tracks([track])
+
+    def add_tracks(self, tracks):
+        """Adds Track widgets and/or TrackSpec records."""
+        tracks = list(tracks)
+        with self.batch():
+            self._insert('tracks', [t for t in tracks if not isinstance(t, TrackSpec)])
+            self._insert('trackSpecs', [t for t in tracks if isinstance(t, TrackSpec)])
 
     def remove_track(self, track):
-        self.tracks = [t for t in self.tracks if t != track]
+        self.remove_tracks([track])
 
-    def add_roi(self, roi):
-        # List subscript does not work for empty List, so handling this case manually.
-        if len(self.roi) == 0:
-            self.roi = [roi]
+    def remove_tracks(self, tracks):
+        tracks = list(tracks)
+        with self.batch():
+            self._remove('tracks', tracks)
+            self._remove('trackSpecs', tracks)
+
+    def move_track(self, track, index):
+        """Moves a Track or TrackSpec to `index` in its list."""
+        name = 'trackSpecs' if isinstance(track, TrackSpec) else 'tracks'
+        values = [t for t in self._current(name) if t is not track]
+        if len(values) == len(self._current(name)):
+            raise ValueError('track not in browser.%s' % name)
+        values.insert(index, track)
+        index = values.index(track)
+        self._change(name, values, [{'op': 'move', 'trait': name, 'id': self._element_id(track), 'index': index}])
+
+    @observe('trackSpecs')
+    def _track_specs_changed(self, change):
+        # specs notify the browsers they belong to when edited
+        old = change['old'] if isinstance(change['old'], list) else []
+        for spec in old:
+            spec._browsers.discard(self)
+        for spec in change['new']:
+            spec._browsers.add(self)
+
+    def _spec_changed(self, spec, name, value):
+        op = {'op': 'update', 'trait': 'trackSpecs', 'id': spec.id, 'name': name, 'value': value}
+        if self._batch_depth > 0:
+            self._ops.append(op)
         else:
-            self.roi = self.roi[:] + [roi]
+            self._send_patch({}, [op])
+
+    def add_roi(self, roi):
+        self._insert('roi', [roi])
+
+    def remove_roi(self, roi):
+        self._remove('roi', [roi])
 
     def remove_all_roi(self):
-        self.roi = []
+        self._remove('roi', list(self._current('roi')))
+
+    def add_roi_set(self, roi_set):
+        self._insert('roiSets', [roi_set])
+
+    def remove_roi_set(self, roi_set):
+        """Removes a RoiSet, or the sets with the given name."""
+        if isinstance(roi_set, str):
+            self._remove('roiSets', [s for s in self._current('roiSets') if s.name == roi_set])
+        else:
+            self._remove('roiSets', [roi_set])
+
+    def on_tracks_loaded(self, callback, remove=False):
+        """
+        Register a callback executed once the frontend has loaded a new set of tracks.
+        The callback receives the browser and the list of loaded track names.
+        """
+        self._tracks_loaded_handlers.register_callback(callback, remove=remove)
+
+    def on_locus_change(self, callback, remove=False):
+        """
+        Register a callback executed when the user navigates in the browser.
+        The callback receives the browser and the new locus (a list for multiple loci).
+        """
+        self._locus_change_handlers.register_callback(callback, remove=remove)
+
+    def on_track_click(self, callback, remove=False):
+        """
+        Register a callback executed when the user clicks on a track.
+        The callback receives the browser, the clicked Track (None if it is not a widget
+        of this browser, e.g. a genome track) and the popover data of the click.
+        """
+        self._track_click_handlers.register_callback(callback, remove=remove)
+
+    def on_track_drag(self, callback, remove=False):
+        """
+        Register a callback executed when the user reorders tracks.
+        The callback receives the browser and the names of the tracks in display order.
+        """
+        self._track_drag_handlers.register_callback(callback, remove=remove)
+
+    def _events_handler(self, events):
+        for event in events:
+            if event['type'] == 'locus':
+                self._locus_change_handlers(self, event['locus'])
+            elif event['type'] == 'track_click':
+                track = next((t for t in self.tracks if t.model_id == event['track']), None)
+                self._track_click_handlers(self, track, event['data'])
+            elif event['type'] == 'track_drag':
+                self._track_drag_handlers(self, event['tracks'])
+
+    def _served_files(self):
+        # local files referenced by the browser with sourceType 'kernel'
+        sources = []
+        items = list(self.tracks) + list(self.trackSpecs) + list(self.roi)
+        if self.genome is not None:
+            items += [self.genome] + list(self.genome.tracks)
+        for item in items:
+            if item.sourceType == 'kernel':
+                for name in ('url', 'indexURL', 'fastaURL', 'cytobandURL', 'aliasURL'):
+                    value = getattr(item, name, None)
+                    if value:
+                        sources.append(value)
+        return sources
+
+    def _request_read(self, content, buffers):
+        path = content['path']
+        if not fileserver.is_served(path, self._served_files()):
+            raise ValueError('%s is not a kernel source of this browser' % path)
+        views = fileserver.read_range(path, content.get('start') or 0, content.get('size'))
+        return {'size': sum(len(v) for v in views)}, views
+
+    def _resolve(self, symbol):
+        # locus of a symbol in the gene index (several loci for space separated symbols)
+        if self.geneIndex is None:
+            return None
+        loci = self.geneIndex.resolve_loci(symbol.split(), self.flanking)
+        if not loci or None in loci:
+            return None
+        return loci[0] if len(loci) == 1 else loci
 
     def search(self, symbol):
-        self.send({"type": "search", "symbol": symbol})
-        print("Search completed. Check the widget instance for results.")
+        """
+        Moves to a locus or feature name: resolved in the kernel by the gene
+        index if any (the locus is returned), else searched by the frontend
+        (a future resolved with the locus is returned, see `search_async`).
+        """
+        locus = self._resolve(symbol)
+        if locus is not None:
+            self.locus = locus
+            return locus
+        return self.search_async(symbol)
+
+    def search_async(self, symbol, timeout=30):
+        """
+        Searches for a locus or feature name in the displayed browser.
+        Returns a future resolved with the resulting locus (a list for multiple
+        loci), or None when nothing is found: names are resolved by `geneIndex`
+        if any, else by the frontend. The future may be awaited in the calling
+        cell, e.g. in a loop over many names.
+        """
+        locus = self._resolve(symbol)
+        if locus is not None:
+            self.locus = locus
+            future = messaging._loop().create_future()
+            future.set_result(locus)
+            return future
+        future = self._request('search', timeout, symbol=symbol)
+        return _chain(future, lambda reply: reply['locus'] if reply['found'] else None)
+
+    def _request_locate(self, content, buffers):
+        # searches of the frontend (e.g. of the search box) are resolved here first
+        return {'loci': self.geneIndex.resolve_loci(content['symbols'], self.flanking)}, []
+
+    def get_browser_state(self, timeout=30):
+        """
+        Returns a future resolved with the igv.js session of the displayed
+        browser (as given by browser.toJSON()), which may be awaited in the
+        calling cell.
+        """
+        return _chain(self._request('state', timeout), lambda reply: reply['state'])
+
+    def save_session(self, path):
+        """
+        Saves the browser with its genome, tracks and ROI to a compressed
+        snapshot, holding only non-default option values.
+        """
+        session.save_session(self, path)
+
+    @classmethod
+    def load_session(cls, path):
+        """
+        Recreates a browser saved with `save_session`: its tracks, ROI and
+        genome widgets first, then the browser with its whole state.
+        """
+        return session.load_session(path, cls)
 
     def dump_json(self):
         print("Dumping browser configuration to browser.out")
         self.send({"type": "dump_json"})
 
-    @out.capture()
     def _custom_message_handler(self, _, content, buffers):
         if content.get('event', '') == 'return_json':
             self._return_json_handler(content)
+        elif content.get('event', '') == 'tracks_loaded':
+            self._tracks_loaded_handlers(self, content.get('tracks', []))
+        elif content.get('event', '') == 'events':
+            self._events_handler(content['events'])
+        elif content.get('event', '') == 'perf':
+            self.perf.add(content['records'])
 
-    @out.capture()
     def _return_json_handler(self, content):
-        print (content['json'])
+        # only the last configuration is kept in the output
+        self.out.clear_output()
+        with self.out:
+            print(content['json'])
+
+
+def _chain(future, transform):
+    # Returns a future resolved with transform(result) of `future`
+    chained = future.get_loop().create_future()
+
+    def done(_):
+        if chained.cancelled():
+            return
+        if future.cancelled():
+            chained.cancel()
+        elif future.exception() is not None:
+            chained.set_exception(future.exception())
+        else:
+            try:
+                result = transform(future.result())
+            except Exception as e:
+                chained.set_exception(e)
+            else:
+                chained.set_result(result)
 
+    future.add_done_callback(done)
+    return chained
@@ -0,0 +1,146 @@
+import asyncio
+import inspect
+import sys
+
+from itertools import count
+
+
+COMM_MESSAGES = ('comm_open', 'comm_msg', 'comm_close')
+
+# seconds between two passes over the kernel messages while awaiting a reply
+POLL_INTERVAL = 0.01
+
+
+def _kernel():
+    # the running IPython kernel, None outside of one (ipykernel is not imported
+    # here: importing it replaces the comm implementation of new widgets)
+    kernelapp = sys.modules.get('ipykernel.kernelapp')
+    if kernelapp is None or not kernelapp.IPKernelApp.initialized():
+        return None
+    return kernelapp.IPKernelApp.instance().kernel
+
+
+def _loop():
+    # the running event loop, else the loop of the kernel
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        kernel = _kernel()
+        if kernel is None:
+            raise RuntimeError('frontend requests need a running event loop or kernel')
+        return kernel.io_loop.asyncio_loop
+
+
+async def _dispatch_comm_messages(kernel):
+    """
+    Dispatches the comm messages queued on the shell channel of a kernel
+    processing its messages one at a time (ipykernel < 7), where the replies
+    of the frontend would wait for the running cell to complete (ipykernel 6;
+    later kernels dispatch comm messages during awaits themselves). Other
+    messages (e.g. the next cells to run) stay queued, in order.
+    """
+    kernel.shell_stream.flush()
+    queue, kept = kernel.msg_queue, []
+    parent, ident = kernel.get_parent('shell'), kernel._parent_ident['shell']
+    try:
+        while not queue.empty():
+            item = queue.get_nowait()
+            dispatch, args = item[-2], item[-1]
+            try:
+                frames = kernel.session.feed_identities(args[-1], copy=False)[1]
+                msg_type = kernel.session.deserialize(frames, content=False, copy=False)['header']['msg_type']
+            except Exception:
+                msg_type = None
+            if msg_type not in COMM_MESSAGES:
+                kept.append(item)
+                continue
+            result = dispatch(*args)
+            if inspect.isawaitable(result):
+                await result
+    finally:
+        for item in kept:
+            queue.put_nowait(item)
+        # outputs of the running cell go on to its own parent message
+        kernel.set_parent(ident, parent, 'shell')
+
+
+async def _wait_reply(future):
+    # awaits a reply from the frontend, dispatching the comm messages of kernels
+    # which would only process it once the running cell completes
+    kernel = _kernel()
+    if kernel is not None and hasattr(kernel, 'msg_queue') and hasattr(kernel, 'get_parent'):
+        while not future.done():
+            await _dispatch_comm_messages(kernel)
+            if not future.done():
+                await asyncio.wait([future], timeout=POLL_INTERVAL)
+    return await future
+
+
+class RequestHandler(object):
+    """
+    Mixin for widgets exchanging requests with the frontend.
+
+    Requests carry a `request` name and an `id`, and are answered by a
+    message with the same id as `response` (or an `error` message).
+
+    Requests from the frontend are answered by the `_request_<name>` method,
+    which returns the reply content and buffers. Requests to the frontend are
+    sent with `_request`, which returns a future resolved with the reply: it
+    may be awaited in the cell sending the request.
+    """
+
+    max_pending_requests = 256
+
+    def _handle_request(self, _, content, buffers):
+        if 'response' in content:
+            self._handle_response(content)
+            return
+        request = content.get('request')
+        if request is None:
+            return
+        handler = getattr(self, '_request_' + request, None)
+        try:
+            if handler is None:
+                raise ValueError('unknown request: %s' % request)
+            reply, reply_buffers = handler(content, buffers)
+        except Exception as e:
+            self.send({'response': content.get('id'), 'error': str(e)})
+        else:
+            reply['response'] = content.get('id')
+            self.send(reply, reply_buffers)
+
+    def _request(self, request, timeout=None, **content):
+        """
+        Sends a request to the frontend, returns an asyncio future resolved with
+        the reply content, or failing with TimeoutError after `timeout` seconds.
+        Comm messages are dispatched while the reply is pending, so that the
+        future may be awaited in the cell sending the request.
+        """
+        if not hasattr(self, '_pending_requests'):
+            self._pending_requests = {}
+            self._request_ids = count()
+        if len(self._pending_requests) >= self.max_pending_requests:
+            raise RuntimeError('too many pending requests (%d)' % len(self._pending_requests))
+        loop = _loop()
+        future = loop.create_future()
+        request_id = 'kernel-%d' % next(self._request_ids)
+        self._pending_requests[request_id] = future
+        future.add_done_callback(lambda _: self._pending_requests.pop(request_id, None))
+        if timeout is not None:
+            def expire():
+                if not future.done():
+                    future.set_exception(TimeoutError('%s request timed out' % request))
+            handle = loop.call_later(timeout, expire)
+            future.add_done_callback(lambda _: handle.cancel())
+        self.send(dict(content, request=request, id=request_id))
+        return loop.create_task(_wait_reply(future))
+
+    def _handle_response(self, content):
+        future = getattr(self, '_pending_requests', {}).get(content['response'])
+        if future is None or future.done():
+            # expired, or already answered by another view
+            return
+        if 'error' in content:
+            future.set_exception(RuntimeError(content['error']))
+        else:
+            future.set_result({k: v for k, v in content.items() if k != 'response'})
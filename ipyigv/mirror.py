@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+
+from urllib.error import HTTPError
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+
+from .ipyigv import PUBLIC_GENOMES
+from .options import ReferenceGenome
+
+
+MIRROR_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ipyigv', 'genomes')
+MIRROR_MAX_SIZE = 50 * 2**30
+
+GENOME_URL_FIELDS = ('fastaURL', 'indexURL', 'cytobandURL', 'aliasURL')
+TRACK_URL_FIELDS = ('url', 'indexURL')
+
+CHUNK_SIZE = 2**20
+
+
+def _genome_urls(genome):
+    """Yields the (remote) asset URLs of a genome definition and of its tracks."""
+    items = [(genome, GENOME_URL_FIELDS)] + [(track, TRACK_URL_FIELDS) for track in genome.get('tracks', [])]
+    for item, fields in items:
+        for field in fields:
+            url = item.get(field)
+            if url and urlparse(url).scheme:
+                yield url
+
+
+def _atomic_json(path, value):
+    temp = path + '.tmp%d' % os.getpid()
+    with open(temp, 'w') as f:
+        json.dump(value, f)
+    os.replace(temp, path)
+
+
+class GenomeMirror(object):
+    """
+    A local mirror of reference genomes: their FASTA, index, cytoband, alias
+    and annotation files are fetched once into a content-addressed cache
+    (blobs/<sha256>/<file name>, shared by genomes with identical files), and
+    `genome` returns a ReferenceGenome reading them through the kernel, or
+    from the URL the mirror directory is served at.
+
+    A mirror directory filled on a connected machine can be copied to
+    air-gapped ones. Interrupted downloads are resumed with range requests.
+    Beyond `max_size` bytes, the least recently used genomes are evicted.
+    """
+
+    def __init__(self, path=MIRROR_DIR, max_size=MIRROR_MAX_SIZE, registry=PUBLIC_GENOMES, timeout=60):
+        self.path = path
+        self.max_size = max_size
+        self.registry = registry
+        self.timeout = timeout
+
+    def _definition(self, genome):
+        # genome id in the registry, or genome definition
+        if isinstance(genome, str):
+            return genome, self.registry[genome]
+        key = genome.get('id') or hashlib.sha1(json.dumps(genome, sort_keys=True).encode()).hexdigest()[:16]
+        return key, genome
+
+    def _manifest_path(self, key):
+        return os.path.join(self.path, 'manifests', re.sub(r'[^\w.-]', '_', key) + '.json')
+
+    def manifests(self):
+        """Returns the manifests of the mirrored genomes, by genome key."""
+        directory = os.path.join(self.path, 'manifests')
+        manifests = {}
+        for name in os.listdir(directory) if os.path.isdir(directory) else []:
+            if name.endswith('.json'):
+                with open(os.path.join(directory, name)) as f:
+                    manifest = json.load(f)
+                manifests[manifest['key']] = manifest
+        return manifests
+
+    def _read_manifest(self, key):
+        try:
+            with open(self._manifest_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def manifest(self, genome):
+        """Returns the manifest of a mirrored genome, None if not mirrored."""
+        return self._read_manifest(self._definition(genome)[0])
+
+    def _complete(self, manifest, definition):
+        return manifest is not None and all(
+            url in manifest['assets'] and os.path.exists(os.path.join(self.path, manifest['assets'][url]['path']))
+            for url in _genome_urls(definition))
+
+    def fetch(self, genome, force=False):
+        """
+        Mirrors the assets of a genome (id in the registry, or definition),
+        downloading the ones missing from the cache. Returns its manifest.
+        """
+        key, definition = self._definition(genome)
+        manifest = None if force else self._read_manifest(key)
+        if self._complete(manifest, definition):
+            return manifest
+        assets = dict(manifest['assets']) if manifest else {}
+        for url in _genome_urls(definition):
+            if force or url not in assets or not os.path.exists(os.path.join(self.path, assets[url]['path'])):
+                assets[url] = self._download(url)
+        manifest = {'key': key, 'genome': definition, 'assets': assets, 'last_used': time.time()}
+        os.makedirs(os.path.dirname(self._manifest_path(key)), exist_ok=True)
+        _atomic_json(self._manifest_path(key), manifest)
+        self.evict(keep=[key])
+        return manifest
+
+    def _download(self, url):
+        name = os.path.basename(urlparse(url).path) or 'data'
+        partial_dir = os.path.join(self.path, 'partial')
+        os.makedirs(partial_dir, exist_ok=True)
+        partial = os.path.join(partial_dir, hashlib.sha1(url.encode()).hexdigest())
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        digest = hashlib.sha256()
+        headers = {'Range': 'bytes=%d-' % offset} if offset else {}
+        try:
+            response = urlopen(Request(url, headers=headers), timeout=self.timeout)
+        except HTTPError as error:
+            if error.code != 416:
+                raise
+            response = None  # the partial download is complete
+        if response is not None:
+            with response:
+                if offset and response.status != 206:
+                    offset = 0  # range not supported: downloaded again
+                if offset:
+                    with open(partial, 'rb') as f:
+                        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                            digest.update(chunk)
+                with open(partial, 'ab' if offset else 'wb') as f:
+                    for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                        f.write(chunk)
+                        digest.update(chunk)
+        else:
+            with open(partial, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+        sha256 = digest.hexdigest()
+        # blobs keep the file name of their URL: igv.js infers formats from it
+        path = os.path.join('blobs', sha256, name)
+        target = os.path.join(self.path, path)
+        size = os.path.getsize(partial)
+        if os.path.exists(target):
+            os.remove(partial)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(partial, target)
+        return {'sha256': sha256, 'path': path, 'size': size}
+
+    def genome(self, genome, fetch=True, url_prefix=None):
+        """
+        Returns a ReferenceGenome reading the mirrored assets of `genome`
+        through the kernel, or from `url_prefix` followed by their path in
+        the mirror if given. Missing assets are fetched, unless `fetch` is
+        False (then a KeyError is raised).
+        """
+        key, definition = self._definition(genome)
+        manifest = self._read_manifest(key)
+        if not self._complete(manifest, definition):
+            if not fetch:
+                raise KeyError('genome %s is not mirrored in %s' % (key, self.path))
+            manifest = self.fetch(genome)
+        manifest['last_used'] = time.time()
+        _atomic_json(self._manifest_path(key), manifest)
+
+        def local(item, fields):
+            item = dict(item)
+            for field in fields:
+                asset = manifest['assets'].get(item.get(field))
+                if asset is not None:
+                    if url_prefix is None:
+                        item[field] = os.path.join(os.path.abspath(self.path), asset['path'])
+                        item['sourceType'] = 'kernel'
+                    else:
+                        item[field] = url_prefix.rstrip('/') + '/' + asset['path'].replace(os.sep, '/')
+            return item
+
+        config = local(manifest['genome'], GENOME_URL_FIELDS)
+        config['tracks'] = [local(track, TRACK_URL_FIELDS) for track in config.get('tracks', [])]
+        return ReferenceGenome(**config)
+
+    @property
+    def size(self):
+        """Total size in bytes of the mirrored files."""
+        blobs = {}
+        for manifest in self.manifests().values():
+            for asset in manifest['assets'].values():
+                blobs[asset['sha256']] = asset['size']
+        return sum(blobs.values())
+
+    def remove(self, genome):
+        """Removes a genome from the mirror, with the files no other genome uses."""
+        key, _ = self._definition(genome)
+        os.remove(self._manifest_path(key))
+        self._remove_unused()
+
+    def evict(self, keep=()):
+        """Removes the least recently used genomes (but `keep`) beyond `max_size`."""
+        manifests = sorted(self.manifests().values(), key=lambda m: m['last_used'])
+        size = self.size
+        for manifest in manifests:
+            if size <= self.max_size:
+                break
+            if manifest['key'] not in keep:
+                os.remove(self._manifest_path(manifest['key']))
+                size = self._remove_unused()
+
+    def _remove_unused(self):
+        used = {asset['sha256'] for manifest in self.manifests().values() for asset in manifest['assets'].values()}
+        blobs = os.path.join(self.path, 'blobs')
+        for sha256 in os.listdir(blobs) if os.path.isdir(blobs) else []:
+            if sha256 not in used:
+                shutil.rmtree(os.path.join(blobs, sha256))
+        return self.size
@@ -7,15 +7,25 @@ from traitlets import Float, Unicode, Int, List, Instance, Bool, Dict, HasTraits
 from ipywidgets import Widget, register, widget_serialization
 from ipywidgets.widgets.trait_types import Color, InstanceDict
 from ipywidgets.widgets import widget
+from ipywidgets.widgets.widget import _remove_buffers
 
 from ._version import EXTENSION_VERSION
+from .features import FeatureIndex, FeatureTable, feature_serialization
+from .genotypes import GenotypeMatrix
+from .gwas import GwasPyramid
+from .interactions import InteractionPyramid
+from .tiles import describe_serialization
+from .wig import SignalPyramid
+from .messaging import RequestHandler
+from .state import SparseStateMixin
+from .indexing import genome_index, track_index
 
 
 # NB '.txt' considered annotation as it is used in the public genomes. But not as per the doc.
 TRACK_FILE_TYPES = {
   'annotation': [
     '.txt', '.bed', '.gff', '.gff3', '.gtf', '.genePred', '.genePredExt',
-    '.peaks', '.narrowPeak', '.broadPeak', '.bigBed', '.bedpe'
+    '.peaks', '.narrowPeak', '.broadPeak', '.bigBed'
   ],
   'wig': ['.wig', '.bigWig', '.bedGraph'],
   'alignment': ['.bam'],
@@ -27,6 +37,54 @@ TRACK_FILE_TYPES = {
 }
 
 
+def infer_track_class(kwargs):
+    """
+    Returns the Track class matching the given track options: from the `type`
+    option if any, else from in-memory data or from the file extension of the url.
+    """
+    trackType = kwargs.get('type', None)
+    if trackType is None and (kwargs.get('features') is not None or kwargs.get('featureIndex') is not None):
+        trackType = 'annotation'
+    if trackType is None and kwargs.get('signal') is not None:
+        trackType = 'wig'
+    if trackType is None and kwargs.get('genotypes') is not None:
+        trackType = 'variant'
+    if trackType is None and kwargs.get('snps') is not None:
+        trackType = 'gwas'
+    if trackType is None and kwargs.get('interactions') is not None:
+        trackType = 'interaction'
+    if trackType is None:
+        # then type is inferred from the file extension
+        url = kwargs.get('url')
+        path = urlparse(url).path
+        filename, filetype = os.path.splitext(path)
+        if filetype == '.gz':  # some files might be compressed
+            innerfilename, innerfiletype = os.path.splitext(filename)
+            filetype = innerfiletype
+        for k, v in TRACK_FILE_TYPES.items():
+            if filetype in v:
+                trackType = k
+                break
+    if trackType == 'annotation':
+        return AnnotationTrack
+    elif trackType == 'alignment':
+        return AlignmentTrack
+    elif trackType == 'variant':
+        return VariantTrack
+    elif trackType == 'wig':
+        return WigTrack
+    elif trackType == 'seg':
+        return SegTrack
+    elif trackType == 'spliceJunctions':
+        return SpliceJunctionsTrack
+    elif trackType == 'gwas':
+        return GwasTrack
+    elif trackType == 'interaction':
+        return InteractionTrack
+    else:
+        return Track
+
+
 class FieldColors(HasTraits):
     field = Unicode()
     palette = Dict(key_trait=Unicode, value_trait=Instance(Color))
@@ -48,7 +106,7 @@ class SortOrder(HasTraits):
 
 
 @register
-class Track(Widget):
+class Track(SparseStateMixin, RequestHandler, Widget):
     """
     A class reflecting the common fields of a track as per igv documentation.
     https://github.com/igvteam/igv.js/wiki/Tracks-2.0
@@ -66,49 +124,34 @@ class Track(Widget):
     def __new__(cls, **kwargs):
         if cls is Track:
             # we must infer the type to instantiate the right Track type
-            trackType = kwargs.get('type', None)
-            if trackType is None:
-                # then type is inferred from the file extension
-                url = kwargs.get('url')
-                path = urlparse(url).path
-                filename, filetype = os.path.splitext(path)
-                if filetype == '.gz':  # some files might be compressed
-                    innerfilename, innerfiletype = os.path.splitext(filename)
-                    filetype = innerfiletype
-                for k, v in TRACK_FILE_TYPES.items():
-                    if filetype in v:
-                        trackType = k
-                        break
-            if trackType == 'annotation':
-                return super(Track, cls).__new__(AnnotationTrack)
-            elif trackType == 'alignment':
-                return super(Track, cls).__new__(AlignmentTrack)
-            elif trackType == 'variant':
-                return super(Track, cls).__new__(VariantTrack)
-            elif trackType == 'wig':
-                return super(Track, cls).__new__(WigTrack)
-            elif trackType == 'seg':
-                return super(Track, cls).__new__(SegTrack)
-            elif trackType == 'spliceJunctions':
-                return super(Track, cls).__new__(SpliceJunctionsTrack)
-            elif trackType == 'gwas':
-                return super(Track, cls).__new__(GwassTrack)
-            elif trackType == 'interation':
-                return super(Track, cls).__new__(InteractionTrack)
-            else:
-                return super(Track, cls).__new__(cls)
-        else:
-            return super(Track, cls).__new__(cls)
+            cls = infer_track_class(kwargs)
+        return super(Track, cls).__new__(cls)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.on_msg(self._handle_request)
+
+    def index(self):
+        """
+        Indexes the local file of the track, so that igv.js reads only the
+        regions in view, through the kernel (see `indexing.track_index`).
+        Returns the track.
+        """
+        options = track_index(self.url, self.indexURL)
+        with self.hold_sync():
+            for name, value in options.items():
+                setattr(self, name, value)
+        return self
 
     # These fields are common to all Track types
-    sourceType = Unicode(default_value='file').tag(sync=True)  #
+    sourceType = Unicode(default_value='file').tag(sync=True)  # 'kernel' to read local files through the kernel
     format = Unicode().tag(sync=True)  # missing documentation
     name = Unicode().tag(sync=True)
     url = Unicode().tag(sync=True)
     indexURL = Unicode().tag(sync=True)
     indexed = Bool(default_value=False).tag(sync=True)
     order = Int().tag(sync=True)
-    color = Color().tag(sync=True).tag(sync=True)
+    color = Color(None, allow_none=True).tag(sync=True)
     height = Int(default_value=50).tag(sync=True)
     autoHeight = Bool(default_value=False).tag(sync=True)
     minHeight = Int(default_value=50).tag(sync=True)
@@ -137,8 +180,18 @@ class AnnotationTrack(Track):
     color = Color("rgb(0,0,150)").tag(sync=True)
     altColor = Color("rgb(0,0,150)").tag(sync=True)
     colorBy = Instance(FieldColors, allow_none=True).tag(sync=True, **widget_serialization)
+    # in-memory features, used in place of `url` - sent as binary buffers
+    features = Instance(FeatureTable, allow_none=True).tag(sync=True, **feature_serialization)
+    # kernel-side features, sent region by region as the view requires them
+    featureIndex = Instance(FeatureIndex, allow_none=True).tag(sync=True, **describe_serialization)
     roi = List(InstanceDict(Track)).tag(sync=True, **widget_serialization)  # regions of interest
 
+    def _request_features(self, content, buffers):
+        tiles = [self.featureIndex.tile(content['chr'], index) for index in content['tiles']]
+        reply, buffer_paths, reply_buffers = _remove_buffers({'tiles': content['tiles'], 'features': tiles})
+        reply['buffer_paths'] = buffer_paths
+        return reply, reply_buffers
+
 
 @register
 class AlignmentTrack(Track):
@@ -192,9 +245,19 @@ class VariantTrack(Track):
     homrefColor = Color("rgb(200, 200, 200)").tag(sync=True)
     squishedCallHeight = Int(1).tag(sync=True)
     expandedCallHeight = Int(10).tag(sync=True)
+    # kernel-side genotype matrix, served for the variants in view and a page of samples
+    genotypes = Instance(GenotypeMatrix, allow_none=True).tag(sync=True, **describe_serialization)
+    samplePage = Int(0).tag(sync=True)
 
     roi = List(InstanceDict(Track)).tag(sync=True, **widget_serialization)  # regions of interest
 
+    def _request_genotypes(self, content, buffers):
+        packed = self.genotypes.window(content['chr'], content['start'], content['end'], self.samplePage,
+                                       content['width'], self.displayMode == 'SQUISHED')
+        reply, buffer_paths, reply_buffers = _remove_buffers({'genotypes': packed})
+        reply['buffer_paths'] = buffer_paths
+        return reply, reply_buffers
+
 
 class Guideline(HasTraits):
     color = Color().tag(sync=True)
@@ -215,8 +278,16 @@ class WigTrack(Track):
     min = Int(0).tag(sync=True)
     max = Int(allow_none=True).tag(sync=True, **widget_serialization)
     color = Color(default_value="rgb(150, 150, 150)").tag(sync=True)
-    altColor = Color(allow_none=True).tag(sync=True, **widget_serialization)
+    altColor = Color(None, allow_none=True).tag(sync=True, **widget_serialization)
     guideLines = List(trait=Instance(Guideline), allow_none=True).tag(sync=True, **widget_serialization)
+    windowFunction = Unicode('mean').tag(sync=True)  # 'mean', 'min' or 'max'
+    # in-memory signal, used in place of `url` - served tile by tile on request
+    signal = Instance(SignalPyramid, allow_none=True).tag(sync=True, **describe_serialization)
+
+    def _request_tiles(self, content, buffers):
+        tiles = [self.signal.tile(content['chr'], content['level'], index, self.windowFunction)
+                 for index in content['tiles']]
+        return {'tiles': content['tiles']}, [memoryview(tile) for tile in tiles]
 
     roi = List(InstanceDict(Track)).tag(sync=True, **widget_serialization)  # regions of interest
 
@@ -282,9 +353,17 @@ class GwasTrack (Track):
     posteriorProbability = Bool(False).tag(sync=True)
     dotSize = Int(3).tag(sync=True)
     columns = Dict(key_trait=Unicode, value_trait=Int, allow_none=True).tag(sync=True, **widget_serialization)
+    # in-memory summary statistics, used in place of `url` - served tile by tile per zoom level
+    snps = Instance(GwasPyramid, allow_none=True).tag(sync=True, **describe_serialization)
 
     roi = List(InstanceDict(Track)).tag(sync=True, **widget_serialization)  # regions of interest
 
+    def _request_snps(self, content, buffers):
+        tiles = [self.snps.tile(content['chr'], content['level'], index) for index in content['tiles']]
+        reply, buffer_paths, reply_buffers = _remove_buffers({'tiles': content['tiles'], 'snps': tiles})
+        reply['buffer_paths'] = buffer_paths
+        return reply, reply_buffers
+
 
 @register
 class InteractionTrack (Track):
@@ -296,9 +375,19 @@ class InteractionTrack (Track):
     type = Unicode('interaction', read_only=True).tag(sync=True)
     arcOrientation = Bool(True).tag(sync=True)
     thickness = Int(2).tag(sync=True)
+    # in-memory contacts, used in place of `url` - served window by window
+    interactions = Instance(InteractionPyramid, allow_none=True).tag(sync=True, **describe_serialization)
+    maxArcs = Int(5000).tag(sync=True)  # highest scoring arcs drawn per window
 
     roi = List(InstanceDict(Track)).tag(sync=True, **widget_serialization)  # regions of interest
 
+    def _request_interactions(self, content, buffers):
+        packed = self.interactions.window(content['chr'], content['start'], content['end'], content['width'],
+                                          self.maxArcs)
+        reply, buffer_paths, reply_buffers = _remove_buffers({'interactions': packed})
+        reply['buffer_paths'] = buffer_paths
+        return reply, reply_buffers
+
 
 class Exon(HasTraits):
     start = Int()
@@ -322,7 +411,7 @@ class TrackFeature(HasTraits):
 
 
 @register
-class ReferenceGenome(Widget):
+class ReferenceGenome(SparseStateMixin, Widget):
     """
     A class reflecting a reference genome as per IGV documentation.
     https://github.com/igvteam/igv.js/wiki/Reference-Genome
@@ -337,6 +426,7 @@ class ReferenceGenome(Widget):
 
     id = Unicode(allow_none=True).tag(sync=True)
     name = Unicode(allow_none=True).tag(sync=True)
+    sourceType = Unicode(default_value='file').tag(sync=True)  # 'kernel' to read local files through the kernel
     fastaURL = Unicode().tag(sync=True)
     indexURL = Unicode(allow_none=True).tag(sync=True)
     cytobandURL = Unicode(allow_none=True).tag(sync=True)
@@ -347,6 +437,14 @@ class ReferenceGenome(Widget):
     headers = Dict().tag(sync=True)
     wholeGenomeView = Bool(default_value=True).tag(sync=True)
 
+    def index(self):
+        """Indexes the local FASTA file of the genome, as `Track.index`. Returns the genome."""
+        options = genome_index(self.fastaURL, self.indexURL)
+        with self.hold_sync():
+            for name, value in options.items():
+                setattr(self, name, value)
+        return self
+
 
 @register
 class SearchService(Widget):
@@ -356,3 +454,38 @@ class SearchService(Widget):
     chromosomeField = Unicode(default_value='chromosome')
     startField = Unicode(default_value='start')
     endField = Unicode(default_value='end', allow_none=True)
+
+
+@register
+class RoiSet(SparseStateMixin, Widget):
+    """
+    A set of regions of interest, e.g. all the CNV calls of a sample, sent as
+    packed intervals: it costs a single widget however many regions it has,
+    and the frontend only draws those in view.
+    Sets are identified by their name in a browser.
+    """
+
+    _view_name = Unicode('RoiSetView').tag(sync=True)
+    _model_name = Unicode('RoiSetModel').tag(sync=True)
+    _view_module = Unicode('jupyter-igv').tag(sync=True)
+    _model_module = Unicode('jupyter-igv').tag(sync=True)
+    _view_module_version = Unicode(EXTENSION_VERSION).tag(sync=True)
+    _model_module_version = Unicode(EXTENSION_VERSION).tag(sync=True)
+
+    name = Unicode(default_value='').tag(sync=True)
+    color = Color(None, allow_none=True).tag(sync=True)
+    intervals = Instance(FeatureTable).tag(sync=True, **feature_serialization)
+
+    @classmethod
+    def from_arrays(cls, chr, start, end, labels=None, **kwargs):
+        return cls(intervals=FeatureTable(chr, start, end, name=labels), **kwargs)
+
+    @classmethod
+    def from_dataframe(cls, df, **kwargs):
+        """From the chr, start, end and (optional) name columns of a DataFrame."""
+        return cls(intervals=FeatureTable.from_dataframe(df), **kwargs)
+
+    @classmethod
+    def from_bed(cls, path, **kwargs):
+        kwargs.setdefault('name', os.path.basename(path))
+        return cls(intervals=FeatureTable.from_bed(path), **kwargs)
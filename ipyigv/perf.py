@@ -0,0 +1,100 @@
+import json
+
+from collections import deque
+
+import numpy as np
+
+
+# Upper bounds (ms) of the default latency histogram bins
+LATENCY_BINS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, np.inf]
+
+
+class PerfLog(object):
+    """
+    Performance records reported by the frontend of a browser (with
+    `telemetry=True`), each a dict with:
+
+    - kind: 'genome', 'track', 'roi', 'redraw' or 'fetch'
+    - name: genome or track name
+    - start: epoch time in ms, duration: ms
+    - for fetches: url, bytes and range
+    - error: the error message of failed loads
+
+    Only the last `maxlen` records are kept.
+    """
+
+    def __init__(self, maxlen=100000):
+        self.records = deque(maxlen=maxlen)
+
+    def add(self, records):
+        self.records.extend(records)
+
+    def clear(self):
+        self.records.clear()
+
+    def select(self, kind=None, name=None):
+        return [r for r in self.records
+                if (kind is None or r['kind'] == kind) and (name is None or r['name'] == name)]
+
+    def histograms(self, kind='track', bins=LATENCY_BINS):
+        """
+        Returns, per name, the counts of durations (ms) of the records of `kind`
+        in each bin: bins are given by their upper bounds.
+        """
+        edges = np.concatenate([[0], bins])
+        durations = {}
+        for record in self.select(kind):
+            durations.setdefault(record['name'], []).append(record['duration'])
+        return {name: np.histogram(values, edges)[0] for name, values in durations.items()}
+
+    def summary(self):
+        """
+        Returns per (kind, name): count, total/median/p95/max duration (ms) and
+        fetched bytes.
+        """
+        groups = {}
+        for record in self.records:
+            groups.setdefault((record['kind'], record['name']), []).append(record)
+        summary = {}
+        for key, records in groups.items():
+            durations = np.array([r['duration'] for r in records])
+            summary[key] = {
+                'count': len(records),
+                'total': float(durations.sum()),
+                'median': float(np.median(durations)),
+                'p95': float(np.percentile(durations, 95)),
+                'max': float(durations.max()),
+                'bytes': sum(r.get('bytes', 0) for r in records),
+            }
+        return summary
+
+    def bytes_per_track(self):
+        fetched = {}
+        for record in self.select('fetch'):
+            fetched[record['name']] = fetched.get(record['name'], 0) + record['bytes']
+        return fetched
+
+    def timeline(self):
+        """Returns the records sorted by start time."""
+        return sorted(self.records, key=lambda r: r['start'])
+
+    def export(self, path):
+        """
+        Writes the timeline as a Chrome trace (trace event format), which can
+        be opened in chrome://tracing or https://ui.perfetto.dev
+        """
+        events = []
+        for record in self.timeline():
+            args = {k: v for k, v in record.items() if k not in ('kind', 'name', 'start', 'duration')}
+            events.append({
+                'name': record['name'], 'cat': record['kind'], 'ph': 'X', 'pid': 0, 'tid': record['kind'],
+                'ts': record['start'] * 1000, 'dur': record['duration'] * 1000, 'args': args,
+            })
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __repr__(self):
+        return '%s(%d records)' % (type(self).__name__, len(self))
@@ -0,0 +1,129 @@
+import json
+from collections import OrderedDict
+
+from ipywidgets import Widget
+
+from .ipyigv import IgvBrowser
+from .options import RoiSet
+from .specs import TrackSpec
+
+
+# lists of the browser holding widgets owned by the pool: trackSpecs hold
+# TrackSpec records, which need no closing
+OWNED_TRAITS = ('tracks', 'roi', 'roiSets')
+
+
+def _json_key(value):
+    return json.dumps(value, sort_keys=True, default=lambda v: getattr(v, 'model_id', repr(v)))
+
+
+class BrowserPool(object):
+    """
+    Recycles browsers when viewing many sites in turn (e.g. in review
+    notebooks): a browser released to the pool is reused by the next
+    `acquire` with the same genome and options, its tracks, ROI and locus
+    being swapped in a single patch. The frontend keeps its igv.js browser and
+    loaded reference: showing a site costs a locus jump and the track loads.
+
+    The pool owns the Track, AnnotationTrack and RoiSet widgets passed to
+    `acquire` and `recycle`: they are closed once removed from its browsers,
+    unless another browser of the pool shows them. They must not be shared
+    with browsers outside the pool, which would lose them. The pool also
+    closes the browsers it creates, with their layout and the genomes it
+    created from options; ReferenceGenome widgets passed in are left open.
+    At most `max_idle` released browsers are kept, the least recently
+    released ones are closed.
+    """
+
+    def __init__(self, max_idle=4):
+        self.max_idle = max_idle
+        self.browsers = {}  # browser -> key
+        self._idle = OrderedDict()  # released browsers, least recent first
+        self._own_genome = set()  # browsers whose genome was created from options
+
+    @staticmethod
+    def _key(genome, options):
+        genome = genome.model_id if isinstance(genome, Widget) else genome
+        return _json_key([genome, options])
+
+    def acquire(self, genome, tracks=(), roi=(), locus='', **options):
+        """
+        Returns a browser of `genome` (a ReferenceGenome, or its options as a
+        dict) showing `tracks` (Track widgets and/or TrackSpec records) and
+        `roi` (AnnotationTrack and/or RoiSet widgets) at `locus`. The pool
+        owns the widgets passed, closing them once no longer shown.
+        """
+        key = self._key(genome, options)
+        for browser, browser_key in self._idle.items():
+            if browser_key == key:
+                del self._idle[browser]
+                self.recycle(browser, tracks, roi, locus)
+                return browser
+        browser = IgvBrowser(genome=genome, locus=locus, **options)
+        self.browsers[browser] = key
+        if not isinstance(genome, Widget):
+            self._own_genome.add(browser)
+        self.recycle(browser, tracks, roi)
+        return browser
+
+    def recycle(self, browser, tracks=(), roi=(), locus=None):
+        """Replaces the tracks and ROI of a browser, and moves it to `locus`."""
+        tracks, roi = list(tracks), list(roi)
+        wanted = {
+            'tracks': [t for t in tracks if not isinstance(t, TrackSpec)],
+            'trackSpecs': [t for t in tracks if isinstance(t, TrackSpec)],
+            'roi': [r for r in roi if not isinstance(r, RoiSet)],
+            'roiSets': [r for r in roi if isinstance(r, RoiSet)],
+        }
+        removed = []
+        with browser.batch():
+            for name, values in wanted.items():
+                keep = set(map(id, values))
+                current = browser._current(name)
+                old = [e for e in current if id(e) not in keep]
+                browser._remove(name, old)
+                removed.extend(old)
+                present = set(map(id, current))
+                browser._insert(name, [e for e in values if id(e) not in present])
+                # kept elements are moved to their new position
+                for index, element in enumerate(values):
+                    if browser._current(name)[index] is not element:
+                        values_now = [e for e in browser._current(name) if e is not element]
+                        values_now.insert(index, element)
+                        browser._change(name, values_now, [{'op': 'move', 'trait': name, 'index': index,
+                                                            'id': browser._element_id(element)}])
+        if locus is not None:
+            browser.locus = locus
+        self._close_unused(removed)
+
+    def _close_unused(self, elements):
+        in_use = set()
+        for browser in self.browsers:
+            for name in OWNED_TRAITS:
+                in_use.update(id(e) for e in getattr(browser, name))
+        for element in elements:
+            if isinstance(element, Widget) and id(element) not in in_use:
+                element.close()
+
+    def release(self, browser):
+        """Gives a browser back to the pool, for reuse by `acquire`."""
+        if browser not in self.browsers:
+            raise ValueError('browser not acquired from this pool')
+        self._idle[browser] = self.browsers[browser]
+        while len(self._idle) > self.max_idle:
+            self._discard(self._idle.popitem(last=False)[0])
+
+    def _discard(self, browser):
+        del self.browsers[browser]
+        self._idle.pop(browser, None)
+        elements = [e for name in OWNED_TRAITS for e in getattr(browser, name)] + [browser.layout]
+        if browser in self._own_genome:
+            self._own_genome.discard(browser)
+            elements.append(browser.genome)
+        browser.close()
+        self._close_unused(elements)
+
+    def close(self):
+        """Closes all the browsers of the pool, with their tracks and ROI."""
+        for browser in list(self.browsers):
+            self._discard(browser)
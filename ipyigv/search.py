@@ -0,0 +1,296 @@
+import difflib
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+
+from contextlib import contextmanager
+from urllib.error import URLError
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+
+import numpy as np
+
+from .features import _column
+from .indexing import local_path
+
+
+SEARCH_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ipyigv', 'search')
+
+# chr:start-end or chr:position, passed through as is
+LOCUS_RE = re.compile(r'^[^\s:]+:[\d,]+(-[\d,]+)?$')
+GFF_NAME_ATTRIBUTES = ('gene_name', 'Name', 'gene', 'gene_id', 'ID')
+
+
+@contextmanager
+def _open_text(url):
+    # local file or remote url, gzip compressed or not, read line by line
+    path = local_path(url)
+    with (open(path, 'rb') if path else io.BufferedReader(urlopen(url))) as f:
+        data = gzip.GzipFile(fileobj=f) if f.peek(2)[:2] == b'\x1f\x8b' else f
+        yield io.TextIOWrapper(data, encoding='utf-8')
+
+
+def _source_version(url):
+    """
+    Returns what identifies the version of an annotation file: the size and
+    modification time of a local file, the ETag and Last-Modified headers of
+    a remote one (None if the server cannot be reached).
+    """
+    path = local_path(url)
+    if path:
+        stat = os.stat(path)
+        return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+    try:
+        with urlopen(Request(url, method='HEAD'), timeout=10) as response:
+            return {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+    except (URLError, OSError):
+        return None
+
+
+def _annotation_format(url, format=None):
+    if format:
+        return format.lower()
+    path = urlparse(url).path.lower()
+    if path.endswith('.gz'):
+        path = path[:-3]
+    extension = os.path.splitext(path)[1].lstrip('.')
+    return extension if extension in ('bed', 'gff', 'gff3', 'gtf') else 'refgene'
+
+
+def _parse_annotation(lines, format):
+    """
+    Yields the (gene symbol, transcript name, chr, start, end) of the records
+    of a refGene/genePred, BED or GFF/GTF file, positions being 0-based.
+    """
+    for line in lines:
+        if line.startswith(('#', 'track', 'browser')) or not line.strip():
+            continue
+        fields = line.rstrip('\n').split('\t')
+        if format in ('gff', 'gff3', 'gtf'):
+            if len(fields) < 9 or fields[2] not in ('gene', 'transcript', 'mRNA'):
+                continue
+            attributes = dict(re.findall(r'(\w+)[= ]"?([^";]+)"?', fields[8]))
+            names = [attributes[a] for a in GFF_NAME_ATTRIBUTES if a in attributes]
+            if names:
+                yield names[0], names[-1], fields[0], int(fields[3]) - 1, int(fields[4])
+        elif format == 'bed':
+            if len(fields) >= 4:
+                yield fields[3], fields[3], fields[0], int(fields[1]), int(fields[2])
+        else:
+            # refGene and ensGene files have a leading bin column, genePred ones do not
+            offset = 1 if fields[0].isdigit() else 0
+            if len(fields) < offset + 5:
+                continue
+            name = fields[offset]
+            symbol = fields[offset + 11] if len(fields) > offset + 11 and fields[offset + 11] else name
+            yield symbol, name, fields[offset + 1], int(fields[offset + 3]), int(fields[offset + 4])
+
+
+def _extents(names, chr, start, end):
+    """
+    Returns the upper case keys, names and loci of the distinct names: the
+    extent of their records on their first chromosome, primary chromosomes
+    (without '_' in their name) first.
+    """
+    keys = np.char.upper(names)
+    order = np.lexsort((chr, np.char.find(chr, '_') >= 0, keys))
+    keys, names, chr = keys[order], names[order], chr[order]
+    if len(order) == 0:
+        return keys, names, chr, start[:0], end[:0]
+    groups = np.flatnonzero(np.concatenate([[True], (keys[1:] != keys[:-1]) | (chr[1:] != chr[:-1])]))
+    starts = np.minimum.reduceat(start[order], groups)
+    ends = np.maximum.reduceat(end[order], groups)
+    first = np.concatenate([[True], keys[groups][1:] != keys[groups][:-1]])
+    keep = groups[first]
+    return keys[keep], names[keep], chr[keep], starts[first], ends[first]
+
+
+class GeneIndex(object):
+    """
+    An in-kernel index of gene symbols, transcript names and aliases to their
+    loci, resolving searches without the frontend or a remote search service.
+    Names are held in a sorted array and matched case-insensitively: lookups
+    and prefix completions are binary searches, and `resolve_loci` resolves
+    a whole list of names at once. Misses fall back to the closest name
+    (e.g. without its version suffix, or with a typo).
+
+    A gene spans all its transcripts. A name found on several chromosomes is
+    located on the first primary one (without '_' in its name).
+    """
+
+    def __init__(self, name, chr, start, end, transcript=None, aliases=None):
+        columns = [np.asarray(chr, dtype=str), np.asarray(start, dtype=np.int64), np.asarray(end, dtype=np.int64)]
+        parts = [_extents(np.asarray(name, dtype=str), *columns)]
+        if transcript is not None:
+            parts.append(_extents(np.asarray(transcript, dtype=str), *columns))
+        keys, names, chrs, starts, ends = [np.concatenate(values) for values in zip(*parts)]
+        # gene symbols take precedence over transcript names
+        order = np.argsort(keys, kind='stable')
+        keep = order[np.concatenate([[True], keys[order][1:] != keys[order][:-1]])] if len(order) else order
+        self.keys, self.names, self.chr = keys[keep], names[keep], chrs[keep]
+        self.start, self.end = starts[keep], ends[keep]
+        if aliases:
+            self.add_aliases(aliases)
+
+    @classmethod
+    def from_dataframe(cls, df, name='name', chr='chr', start='start', end='end', transcript='transcript',
+                       aliases=None):
+        """Builds a GeneIndex from a pandas DataFrame (or a dict of arrays)."""
+        return cls(_column(df, name), _column(df, chr), _column(df, start), _column(df, end),
+                   transcript=_column(df, transcript), aliases=aliases)
+
+    @classmethod
+    def from_features(cls, table, aliases=None):
+        """Builds a GeneIndex from the named features of a FeatureTable."""
+        return cls(table.name, table.chr_names[table.chr], table.start, table.end, aliases=aliases)
+
+    @classmethod
+    def from_annotation(cls, url, format=None, aliases=None):
+        """
+        Builds a GeneIndex from a refGene/genePred, BED or GFF/GTF file (local
+        or remote, gzip compressed or not), e.g. the annotation of a genome.
+        """
+        with _open_text(url) as lines:
+            records = list(_parse_annotation(lines, _annotation_format(url, format)))
+        columns = list(zip(*records)) if records else [(), (), (), (), ()]
+        return cls(columns[0], columns[2], columns[3], columns[4], transcript=columns[1], aliases=aliases)
+
+    @classmethod
+    def for_genome(cls, genome, path=SEARCH_DIR, registry=None):
+        """
+        Returns the GeneIndex of the first annotation track of a genome (id in
+        `registry`, by default the public genomes, or a genome definition or
+        ReferenceGenome), cached in `path` and built again when the
+        annotation file changes (or used as is when it cannot be checked).
+        """
+        if isinstance(genome, str):
+            if registry is None:
+                from .ipyigv import PUBLIC_GENOMES as registry
+            genome = registry[genome]
+        tracks = genome.get('tracks') if isinstance(genome, dict) else [
+            {'url': t.url, 'format': getattr(t, 'format', None)} for t in genome.tracks]
+        tracks = [t for t in tracks or [] if t.get('url')]
+        if not tracks:
+            raise ValueError('genome has no annotation track to index')
+        url, format = tracks[0]['url'], tracks[0].get('format')
+        key = os.path.join(path, hashlib.sha1(url.encode()).hexdigest())
+        cache, stamp_path = key + '.npz', key + '.json'
+        version = _source_version(url)
+        stamp = {'url': url, 'version': version}
+        try:
+            with open(stamp_path) as f:
+                fresh = version is None or json.load(f) == stamp
+        except (OSError, ValueError):
+            fresh = False
+        if fresh and os.path.exists(cache):
+            return cls.load(cache)
+        index = cls.from_annotation(url, format)
+        os.makedirs(path, exist_ok=True)
+        temp = key + '.tmp%d' % os.getpid()
+        index.save(temp + '.npz')
+        os.replace(temp + '.npz', cache)
+        with open(temp + '.json', 'w') as f:
+            json.dump(stamp, f)
+        os.replace(temp + '.json', stamp_path)
+        return index
+
+    @classmethod
+    def from_arrays(cls, keys, names, chr, start, end):
+        """Recreates a GeneIndex from its arrays (as returned by `arrays`)."""
+        index = cls.__new__(cls)
+        index.keys, index.names, index.chr, index.start, index.end = keys, names, chr, start, end
+        return index
+
+    def arrays(self):
+        return {'keys': self.keys, 'names': self.names, 'chr': self.chr, 'start': self.start, 'end': self.end}
+
+    def save(self, path):
+        """Saves the index to a .npz file."""
+        np.savez(path, **self.arrays())
+
+    @classmethod
+    def load(cls, path):
+        """Loads an index saved by `save`."""
+        with np.load(path, allow_pickle=False) as data:
+            return cls.from_arrays(**{name: data[name] for name in data.files})
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add_aliases(self, aliases):
+        """Adds aliases (e.g. previous symbols), given as a dict of alias -> indexed name."""
+        rows = self._rows(list(aliases.values()))
+        found = rows >= 0
+        alias = np.asarray(list(aliases), dtype=str)[found]
+        rows = rows[found]
+        keys = np.concatenate([self.keys, np.char.upper(alias)])
+        order = np.argsort(keys, kind='stable')
+        keep = order[np.concatenate([[True], keys[order][1:] != keys[order][:-1]])]
+        self.keys = keys[keep]
+        self.names = np.concatenate([self.names, self.names[rows]])[keep]
+        self.chr = np.concatenate([self.chr, self.chr[rows]])[keep]
+        self.start = np.concatenate([self.start, self.start[rows]])[keep]
+        self.end = np.concatenate([self.end, self.end[rows]])[keep]
+
+    def _rows(self, names):
+        # row of each name in the index, -1 if missing
+        keys = np.char.upper(np.asarray(names, dtype=str))
+        rows = np.searchsorted(self.keys, keys)
+        rows[rows == len(self.keys)] = 0
+        found = len(self.keys) > 0 and self.keys[rows] == keys
+        return np.where(found, rows, -1)
+
+    def _closest(self, name):
+        # same name without version suffix, else closest name of similar length
+        key = name.upper()
+        base = key.rsplit('.', 1)[0]
+        rows = self._rows([base])
+        if base != key and rows[0] >= 0:
+            return rows[0]
+        lo, hi = np.searchsorted(self.keys, [key[:1], key[:1] + '\uffff'])
+        candidates = {k: lo + i for i, k in enumerate(self.keys[lo:hi].tolist()) if abs(len(k) - len(key)) <= 2}
+        matches = difflib.get_close_matches(key, list(candidates), n=1, cutoff=0.8)
+        return candidates[matches[0]] if matches else -1
+
+    def locate(self, name):
+        """Returns the (chr, start, end, name) of a name, None if not found."""
+        row = self._rows([name])[0]
+        if row < 0:
+            row = self._closest(name)
+        if row < 0:
+            return None
+        return str(self.chr[row]), int(self.start[row]), int(self.end[row]), str(self.names[row])
+
+    def resolve_loci(self, names, flanking=0, fuzzy=True):
+        """
+        Returns the igv.js locus strings (chr:start-end, 1-based) of names,
+        with `flanking` bp on both sides: None for those not found. Locus
+        strings are returned as is.
+        """
+        names = [str(name).strip() for name in names]
+        if len(self) == 0:
+            return [name if LOCUS_RE.match(name) else None for name in names]
+        rows = self._rows(names)
+        if fuzzy:
+            for i in np.flatnonzero(rows < 0):
+                if not LOCUS_RE.match(names[i]):
+                    rows[i] = self._closest(names[i])
+        found = rows >= 0
+        starts = np.maximum(self.start[rows] - flanking, 0) + 1
+        ends = self.end[rows] + flanking
+        return [
+            '%s:%d-%d' % (self.chr[row], s, e) if ok else (name if LOCUS_RE.match(name) else None)
+            for name, row, ok, s, e in zip(names, rows, found, starts.tolist(), ends.tolist())
+        ]
+
+    def complete(self, prefix, limit=10):
+        """Returns up to `limit` indexed names starting with `prefix`, in order."""
+        key = prefix.upper()
+        lo, hi = np.searchsorted(self.keys, [key, key + '\uffff'])
+        return [str(name) for name in self.names[lo:min(hi, lo + limit)]]
+
+    def describe(self):
+        return {'length': len(self)}
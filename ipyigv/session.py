@@ -0,0 +1,211 @@
+import io
+import json
+import zipfile
+
+import numpy as np
+
+from ipywidgets import DOMWidget, Widget
+
+from . import options
+from .features import FeatureIndex, FeatureTable
+from .genotypes import GenotypeMatrix
+from .gwas import GwasPyramid
+from .interactions import InteractionPyramid
+from .search import GeneIndex
+from .specs import TrackSpec
+from .state import assigned_traits, is_default_value
+from .wig import SignalPyramid
+
+
+SESSION_VERSION = 1
+
+# bytes of array rows written at once to the archive
+CHUNK_BYTES = 64 * 2**20
+
+
+class _Encoder(object):
+    """
+    Encodes widgets (their non-default synced traits), track specs and
+    in-memory data as JSON, numpy arrays being stored apart.
+    """
+
+    # traits of the base widget classes (layout, dom classes...) are not
+    # saved, nor browser groups: a browser is restored unlinked
+    base_traits = set(DOMWidget.class_trait_names()) | {'group'}
+
+    def __init__(self):
+        self.arrays = []
+
+    def array(self, values):
+        # arrays supporting slicing (e.g. zarr or dask genotype matrices) are
+        # kept as is, written to the archive chunk by chunk
+        if not (hasattr(values, 'shape') and hasattr(values, 'dtype')):
+            values = np.asarray(values)
+        self.arrays.append(values)
+        return {'$array': len(self.arrays) - 1}
+
+    def values(self, widget):
+        values = {}
+        assigned = assigned_traits(widget)
+        for name, trait in widget.traits(sync=True).items():
+            if name.startswith('_') or name in self.base_traits or trait.read_only:
+                continue
+            value = getattr(widget, name)
+            if name in assigned or not is_default_value(trait, value):
+                values[name] = self.encode(value)
+        return values
+
+    def encode(self, value):
+        if isinstance(value, Widget):
+            return {'$widget': type(value).__name__, 'values': self.values(value)}
+        if isinstance(value, TrackSpec):
+            spec = value.to_dict()
+            del spec['_id']
+            return {'$spec': self.encode(spec)}
+        if isinstance(value, FeatureTable):
+            columns = {
+                'chr': self.array(value.chr_names[value.chr]),
+                'start': self.array(value.start),
+                'end': self.array(value.end),
+                'strand': self.array(value.strand),
+                'score': self.array(value.score),
+                'name': value.name,
+            }
+            if value.exon_offsets is not None:
+                columns['exon_offsets'] = self.array(value.exon_offsets)
+                columns['exon_starts'] = self.array(value.exon_starts)
+                columns['exon_ends'] = self.array(value.exon_ends)
+            return {'$features': columns}
+        if isinstance(value, FeatureIndex):
+            return {'$featureIndex': {
+                'table': self.encode(value.table),
+                'tile_size': value.tile_size,
+                'max_features': value.max_features,
+            }}
+        if isinstance(value, SignalPyramid):
+            return {'$signal': {
+                'data': {chr: self.array(levels[0]['mean']) for chr, levels in value.levels.items()},
+                'resolution': value.resolution,
+                'factor': value.factor,
+                'tile_bins': value.tile_bins,
+            }}
+        if isinstance(value, GenotypeMatrix):
+            chr = np.empty(len(value.pos), dtype=object)
+            for name, (lo, hi) in value.chromosomes.items():
+                chr[lo:hi] = name
+            return {'$genotypes': {
+                'genotypes': self.array(value.genotypes),
+                'chr': self.array(chr.astype(str)),
+                'pos': self.array(value.pos),
+                'samples': value.samples,
+                'ref': value.ref,
+                'alt': value.alt,
+                'page_size': value.page_size,
+                'max_variants': value.max_variants,
+            }}
+        if isinstance(value, GwasPyramid):
+            chr, pos, p = value.snp_table()
+            return {'$gwas': {
+                'chr': self.array(chr),
+                'pos': self.array(pos),
+                'p': self.array(p),
+                'names': value.names,
+                'resolution': value.resolution,
+                'factor': value.factor,
+                'tile_bins': value.tile_bins,
+            }}
+        if isinstance(value, InteractionPyramid):
+            columns = {name: self.array(values) for name, values in value.contacts().items()}
+            return {'$interactions': dict(columns, resolution=value.resolution, factor=value.factor,
+                                          max_bins=value.max_bins)}
+        if isinstance(value, GeneIndex):
+            return {'$geneIndex': {name: self.array(values) for name, values in value.arrays().items()}}
+        if isinstance(value, (list, tuple)):
+            return [self.encode(v) for v in value]
+        if isinstance(value, dict):
+            return {k: self.encode(v) for k, v in value.items()}
+        return value
+
+
+class _Decoder(object):
+
+    def __init__(self, archive, classes):
+        self.archive = archive
+        self.classes = classes
+
+    def decode(self, value):
+        if isinstance(value, list):
+            return [self.decode(v) for v in value]
+        if not isinstance(value, dict):
+            return value
+        if '$array' in value:
+            data = self.archive.read('arrays/%d.npy' % value['$array'])
+            return np.load(io.BytesIO(data), allow_pickle=False)
+        if '$widget' in value:
+            cls = self.classes.get(value['$widget'])
+            if cls is None:
+                raise ValueError('unknown widget class in session: %s' % value['$widget'])
+            return cls(**self.decode(value['values']))
+        if '$spec' in value:
+            return TrackSpec(**self.decode(value['$spec']))
+        if '$features' in value:
+            return FeatureTable(**self.decode(value['$features']))
+        if '$featureIndex' in value:
+            return FeatureIndex(**self.decode(value['$featureIndex']))
+        if '$signal' in value:
+            return SignalPyramid(**self.decode(value['$signal']))
+        if '$gwas' in value:
+            return GwasPyramid(**self.decode(value['$gwas']))
+        if '$interactions' in value:
+            return InteractionPyramid(**self.decode(value['$interactions']))
+        if '$geneIndex' in value:
+            return GeneIndex.from_arrays(**self.decode(value['$geneIndex']))
+        if '$genotypes' in value:
+            return GenotypeMatrix(**self.decode(value['$genotypes']))
+        return {k: self.decode(v) for k, v in value.items()}
+
+
+def _write_array(archive, name, values):
+    # writes a .npy member in chunks of rows, never loading the array whole
+    dtype = np.dtype(values.dtype)
+    shape = tuple(int(n) for n in values.shape)
+    with archive.open(name, 'w', force_zip64=True) as f:
+        np.lib.format.write_array_header_1_0(f, {
+            'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': shape})
+        if not shape:
+            f.write(np.asarray(values, dtype=dtype).tobytes())
+            return
+        row_bytes = dtype.itemsize * int(np.prod(shape[1:], dtype=np.int64))
+        rows = max(1, CHUNK_BYTES // max(row_bytes, 1))
+        for start in range(0, shape[0], rows):
+            f.write(np.ascontiguousarray(values[start:start + rows], dtype=dtype).tobytes())
+
+
+def save_session(browser, path):
+    """
+    Writes a browser with its genome, tracks and ROI to a zip archive holding
+    the non-default option values as JSON, and in-memory data as numpy arrays.
+    """
+    encoder = _Encoder()
+    session = {'version': SESSION_VERSION, 'browser': encoder.encode(browser)}
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('session.json', json.dumps(session, separators=(',', ':')))
+        for index, values in enumerate(encoder.arrays):
+            _write_array(archive, 'arrays/%d.npy' % index, values)
+
+
+def load_session(path, browser_class):
+    """
+    Recreates a browser saved by `save_session`. Widgets are recreated bottom
+    up, each opening its comm: the tracks, ROI and genome first, the browser
+    last, with its whole state in its comm open message.
+    """
+    classes = {name: cls for name, cls in vars(options).items()
+               if isinstance(cls, type) and issubclass(cls, Widget)}
+    classes[browser_class.__name__] = browser_class
+    with zipfile.ZipFile(path) as archive:
+        session = json.loads(archive.read('session.json'))
+        if session['version'] > SESSION_VERSION:
+            raise ValueError('session saved by a newer version of ipyigv (%s)' % session['version'])
+        # the browser is created last, with its whole state: no update follows
+        return _Decoder(archive, classes).decode(session['browser'])
@@ -0,0 +1,117 @@
+from itertools import count
+from weakref import WeakSet
+
+from traitlets import Instance, List, TraitError
+
+from .indexing import track_index
+from .options import infer_track_class
+
+
+_spec_ids = count()
+_spec_traits = {}
+_track_types = {}
+
+
+def spec_traits(cls):
+    """
+    Returns the options of a Track class usable in a TrackSpec: its synced
+    traits, except private and widget/object valued ones.
+    """
+    if cls not in _spec_traits:
+        traits = {}
+        for name, trait in cls.class_traits(sync=True).items():
+            if name.startswith('_') or name == 'type' or isinstance(trait, Instance):
+                continue
+            if isinstance(trait, List) and isinstance(trait._trait, Instance):
+                continue
+            traits[name] = trait
+        _spec_traits[cls] = traits
+    return _spec_traits[cls]
+
+
+class TrackSpec(object):
+    """
+    A lightweight track: a record of track options validated as for the
+    corresponding Track widget, but without a comm of its own. Track specs
+    added to a browser are serialized inline in its state, so that thousands
+    of them cost a single message.
+
+    Only explicitly set options are sent, the defaults being igv.js ones.
+    Options can be edited once the spec is added to a browser.
+    """
+
+    __slots__ = ('id', 'track_class', '_values', '_browsers', '__weakref__')
+
+    def __init__(self, **kwargs):
+        object.__setattr__(self, 'id', 'spec-%d' % next(_spec_ids))
+        object.__setattr__(self, 'track_class', infer_track_class(kwargs))
+        object.__setattr__(self, '_values', {})
+        object.__setattr__(self, '_browsers', WeakSet())
+        kwargs.pop('type', None)
+        for name, value in kwargs.items():
+            self._values[name] = self._validate(name, value)
+
+    def _validate(self, name, value):
+        trait = spec_traits(self.track_class).get(name)
+        if trait is None:
+            raise TraitError('%s is not a valid option of a %s spec' % (name, self.track_class.__name__))
+        if value is None and trait.allow_none:
+            return value
+        return trait.validate(None, value)
+
+    @property
+    def type(self):
+        cls = self.track_class
+        if cls not in _track_types:
+            trait = cls.class_traits().get('type')
+            _track_types[cls] = trait.default_value if trait is not None else None
+        return _track_types[cls]
+
+    def __getattr__(self, name):
+        values = object.__getattribute__(self, '_values')
+        if name in values:
+            return values[name]
+        trait = spec_traits(object.__getattribute__(self, 'track_class')).get(name)
+        if trait is None:
+            raise AttributeError(name)
+        return trait.default_value
+
+    def __setattr__(self, name, value):
+        if name in TrackSpec.__slots__:
+            raise AttributeError('%s is read-only' % name)
+        value = self._validate(name, value)
+        self._values[name] = value
+        for browser in list(self._browsers):
+            browser._spec_changed(self, name, value)
+
+    def index(self):
+        """Indexes the local file of the spec, as `Track.index`. Returns the spec."""
+        for name, value in track_index(self.url, self.indexURL).items():
+            setattr(self, name, value)
+        return self
+
+    def to_dict(self):
+        spec = dict(self._values, _id=self.id)
+        if self.type is not None:
+            spec['type'] = self.type
+        return spec
+
+    def __repr__(self):
+        options = ', '.join('%s=%r' % item for item in sorted(self._values.items()))
+        return '%s[%s](%s)' % (type(self).__name__, self.track_class.__name__, options)
+
+
+def specs_to_json(specs, widget):
+    return [spec.to_dict() for spec in specs]
+
+
+def specs_from_json(value, widget):
+    # the frontend only removes specs (tracks removed in the igv.js UI)
+    specs = {spec.id: spec for spec in widget.trackSpecs}
+    return [specs[spec['_id']] for spec in value if spec['_id'] in specs]
+
+
+spec_serialization = {
+    'to_json': specs_to_json,
+    'from_json': specs_from_json,
+}
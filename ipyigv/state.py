@@ -0,0 +1,182 @@
+from ipywidgets.widgets.trait_types import InstanceDict
+from traitlets import Container, Dict, HasTraits, Instance, Int, Undefined, default
+
+from ._version import STATE_SCHEMA_VERSION
+
+
+def static_default(trait):
+    """
+    Returns the default value of a trait, or Undefined when it has none or it
+    would be a new widget/object.
+    """
+    if isinstance(trait, InstanceDict):
+        if trait.allow_none and trait.default_args is None and trait.default_kwargs is None:
+            return None
+        return trait.default_value
+    if isinstance(trait, Instance) and not isinstance(trait, (Container, Dict)):
+        if trait.default_args is None and trait.default_kwargs is None:
+            return None
+        return trait.default_value
+    try:
+        return trait.default()
+    except Exception:
+        return Undefined
+
+
+def is_default_value(trait, value, default_value=None):
+    """Whether a trait value is its (static) default value."""
+    default_value = static_default(trait) if default_value is None else default_value
+    if default_value is Undefined:
+        return False
+    try:
+        return type(value) is type(default_value) and bool(value == default_value)
+    except Exception:
+        return False
+
+
+_json_defaults = {}
+
+
+def json_defaults(widget):
+    """
+    Returns the serialized default values of the synced traits of a widget
+    class (or of the class of a widget), except read-only ones (which
+    identify the widget, e.g. track types).
+    """
+    cls = widget if isinstance(widget, type) else type(widget)
+    if cls not in _json_defaults:
+        defaults = {}
+        for name, trait in cls.class_traits(sync=True).items():
+            default = static_default(trait)
+            if trait.read_only or default is Undefined:
+                continue
+            to_json = trait.metadata.get('to_json', cls._trait_to_json)
+            defaults[name] = to_json(default, widget)
+        _json_defaults[cls] = defaults
+    return _json_defaults[cls]
+
+
+def frontend_defaults():
+    """
+    Returns the defaults tables of the frontend models, for the current state
+    schema: per track type (the generic Track under 'track'), and for the
+    genome, ROI set and browser models. Private traits, always sent, are left
+    out. Written to js/src/defaults.json by `python -m ipyigv.state`.
+    """
+    from .ipyigv import IgvBrowser
+    from .options import ReferenceGenome, RoiSet, Track
+
+    def public(cls):
+        return {name: value for name, value in sorted(json_defaults(cls).items()) if not name.startswith('_')}
+
+    track_types = {}
+    classes = Track.__subclasses__()
+    while classes:
+        cls = classes.pop()
+        classes.extend(cls.__subclasses__())
+        if 'type' in cls.class_traits():
+            track_types[cls.class_traits()['type'].default_value] = public(cls)
+    return {
+        'schema': STATE_SCHEMA_VERSION,
+        'track': public(Track),
+        'tracks': dict(sorted(track_types.items())),
+        'genome': public(ReferenceGenome),
+        'roiSet': public(RoiSet),
+        'browser': public(IgvBrowser),
+    }
+
+
+def assigned_traits(widget):
+    """Names of the synced traits explicitly set on a widget (see SparseStateMixin)."""
+    return widget.__dict__.get('_assigned_traits', ())
+
+
+def drop_default_values(widget, state):
+    """
+    Removes from a serialized widget state the values equal to their default,
+    unless explicitly set.
+    """
+    defaults = json_defaults(widget)
+    assigned = assigned_traits(widget)
+    return {name: value for name, value in state.items()
+            if name not in defaults or name in assigned or not widget._compare(value, defaults[name])}
+
+
+_state_traits = {}
+
+
+def state_traits(cls):
+    """
+    Returns, for the synced traits of a widget class: their trait, whether
+    they are always sent, whether they are known to hold their default value
+    as long as they are unset (traitlets creates such defaults lazily, on
+    first access), and their static default.
+    """
+    if cls not in _state_traits:
+        traits = {}
+        for name, trait in cls.class_traits(sync=True).items():
+            default_value = static_default(trait)
+            always = name.startswith('_') or trait.read_only
+            lazy_default = (not isinstance(trait, InstanceDict) and name not in cls._trait_default_generators
+                            and default_value is not Undefined)
+            traits[name] = (trait, always, lazy_default, default_value)
+        _state_traits[cls] = traits
+    return _state_traits[cls]
+
+
+class SparseStateMixin(HasTraits):
+    """
+    Widgets whose state only holds non-default values: when opening their
+    comm (or on a state request from a new frontend), and in their exported
+    state (embedded in HTML pages, or returned by `Widget.get_manager_state`).
+    Default values are neither serialized nor sent: the frontend falls back
+    to its model defaults, or to igv.js defaults for track options, for the
+    state schema it declares (see `STATE_SCHEMA_VERSION`).
+
+    Values explicitly set are always sent, even when equal to the Python
+    default: igv.js defaults may differ. So are private traits (model/view
+    names, versions...) and read-only ones (which identify the widget, e.g.
+    track types).
+    """
+
+    def __setattr__(self, name, value):
+        if name in state_traits(type(self)):
+            self.__dict__.setdefault('_assigned_traits', set()).add(name)
+        super().__setattr__(name, value)
+
+    _state_schema = Int(STATE_SCHEMA_VERSION, read_only=True).tag(sync=True)
+
+    @default('keys')
+    def _default_keys(self):
+        return list(state_traits(type(self)))
+
+    def get_state(self, key=None, drop_defaults=False):
+        if key is not None:
+            return super().get_state(key=key)
+        traits = state_traits(type(self))
+        values = self._trait_values
+        assigned = assigned_traits(self)
+        keys = []
+        for name in self.keys:
+            trait, always, lazy_default, default_value = traits[name]
+            if always or name in assigned:
+                keys.append(name)
+            elif name in values:
+                if not is_default_value(trait, values[name], default_value):
+                    keys.append(name)
+            elif not lazy_default and not is_default_value(trait, getattr(self, name), default_value):
+                keys.append(name)
+        return super().get_state(key=keys)
+
+    def _get_embed_state(self, drop_defaults=False):
+        state = super()._get_embed_state(drop_defaults=False)
+        state['state'] = drop_default_values(self, state['state'])
+        return state
+
+
+if __name__ == '__main__':
+    import json
+    import sys
+
+    json.dump(frontend_defaults(), sys.stdout, indent=2)
+    sys.stdout.write('\n')
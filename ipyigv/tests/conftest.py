@@ -0,0 +1,30 @@
+import pytest
+
+from ipyigv import IgvBrowser
+
+
+@pytest.fixture
+def frontend_request():
+    """
+    Sends a request to a widget as the frontend would, returns the content
+    and buffers of its reply.
+    """
+    def frontend_request(widget, request, **content):
+        sent = []
+        widget.send = lambda content, buffers=None: sent.append((content, buffers))
+        try:
+            widget._handle_request(None, dict(content, request=request, id=1), [])
+        finally:
+            del widget.send
+        return sent[-1]
+    return frontend_request
+
+
+@pytest.fixture
+def session_copy(tmp_path):
+    """Saves a browser to a session file, returns the browser loaded from it."""
+    def session_copy(browser):
+        path = str(tmp_path / 'session.zip')
+        browser.save_session(path)
+        return IgvBrowser.load_session(path)
+    return session_copy
@@ -0,0 +1,200 @@
+import asyncio
+
+import pytest
+
+from traitlets import TraitError
+
+from ipyigv import messaging
+from ipyigv import BrowserGroup, BrowserPool, IgvBrowser, ReferenceGenome, Track, TrackSpec, AnnotationTrack
+
+
+def make_browser():
+    browser = IgvBrowser(genome=ReferenceGenome(id='hg19'))
+    messages = []
+    browser.comm.send = lambda *args, **kwargs: messages.append(kwargs.get('data'))
+    return browser, messages
+
+
+def test_batch_single_sync():
+    browser, messages = make_browser()
+    tracks = [Track(url='sample%d.bam' % i) for i in range(10)]
+    with browser.batch():
+        browser.add_tracks(tracks)
+        browser.remove_track(tracks[0])
+        browser.add_roi(AnnotationTrack(url='roi.bed'))
+        assert browser.tracks == []
+    assert browser.tracks == tracks[1:]
+    assert len(browser.roi) == 1
+    assert len(messages) == 1
+    ops = messages[0]['content']['ops']
+    assert [op['op'] for op in ops] == ['insert'] * 10 + ['remove', 'insert']
+    assert ops[0] == {'op': 'insert', 'trait': 'tracks', 'id': tracks[0].model_id,
+                      'value': 'IPY_MODEL_' + tracks[0].model_id}
+
+
+def test_patches():
+    browser, messages = make_browser()
+    tracks = [Track(url='sample%d.bam' % i) for i in range(1000)]
+    browser.add_tracks(tracks)
+    browser.move_track(tracks[-1], 0)
+    browser.remove_track(tracks[1])
+    assert browser.tracks == tracks[-1:] + tracks[:1] + tracks[2:-1]
+    with pytest.raises(ValueError):
+        browser.move_track(tracks[1], 0)
+    assert messages[1:] == [
+        {'method': 'custom', 'content': {'type': 'patch', 'ops': [
+            {'op': 'move', 'trait': 'tracks', 'id': tracks[-1].model_id, 'index': 0}]}},
+        {'method': 'custom', 'content': {'type': 'patch', 'ops': [
+            {'op': 'remove', 'trait': 'tracks', 'id': tracks[1].model_id}]}},
+    ]
+    roi = AnnotationTrack(url='roi.bed')
+    browser.add_roi(roi)
+    browser.remove_roi(roi)
+    assert browser.roi == []
+    assert messages[-1]['content']['ops'] == [{'op': 'remove', 'trait': 'roi', 'id': roi.model_id}]
+
+
+def test_remove_tracks():
+    browser, _ = make_browser()
+    tracks = [Track(url='sample%d.bam' % i) for i in range(4)]
+    browser.add_tracks(tracks)
+    browser.remove_tracks(tracks[1:3])
+    assert browser.tracks == [tracks[0], tracks[3]]
+
+
+def test_event_callbacks():
+    browser, _ = make_browser()
+    track = Track(url='sample.bam')
+    browser.add_track(track)
+    received = []
+    browser.on_locus_change(lambda b, locus: received.append(locus))
+    browser.on_track_click(lambda b, t, data: received.append((t, data)))
+    browser._handle_custom_msg({'event': 'events', 'events': [
+        {'type': 'locus', 'locus': 'chr1:1-100'},
+        {'type': 'track_click', 'track': track.model_id, 'name': 'sample', 'data': [{'name': 'pos'}]},
+    ]}, [])
+    assert received == ['chr1:1-100', (track, [{'name': 'pos'}])]
+
+
+def test_frontend_requests():
+    async def requests():
+        browser, messages = make_browser()
+        found = browser.search_async('BRCA1')
+        missing = browser.search('XYZ')
+        late = browser.get_browser_state(timeout=0.01)
+        broken = browser.search_async('TP53')
+        first, second = messages[-4]['content'], messages[-3]['content']
+        assert first['request'] == 'search' and first['symbol'] == 'BRCA1'
+        browser._handle_custom_msg({'response': second['id'], 'found': False, 'locus': ''}, [])
+        browser._handle_custom_msg({'response': first['id'], 'found': True, 'locus': 'chr17:1-2'}, [])
+        browser._handle_custom_msg({'response': messages[-1]['content']['id']}, [])
+        assert await found == 'chr17:1-2'
+        assert await missing is None
+        with pytest.raises(TimeoutError):
+            await late
+        with pytest.raises(KeyError):
+            await broken
+        assert browser._pending_requests == {}
+
+    asyncio.run(requests())
+
+
+def test_comm_messages_dispatched_while_awaiting(monkeypatch):
+    # kernels processing shell messages one at a time (ipykernel 6): replies are
+    # dispatched while awaited, the next cells stay queued
+    class Kernel:
+        _parent_ident = {'shell': b'cell'}
+
+        def __init__(self):
+            self.msg_queue = asyncio.Queue()
+            self.shell_stream = type('Stream', (), {'flush': lambda self: None})()
+            self.session = type('Session', (), {
+                'feed_identities': lambda self, msg, copy: ([], msg),
+                'deserialize': lambda self, msg, content, copy: {'header': {'msg_type': msg[0]}}})()
+            self.parent = 'cell'
+
+        def get_parent(self, channel):
+            return self.parent
+
+        def set_parent(self, ident, parent, channel):
+            self.parent = parent
+
+    kernel = Kernel()
+    monkeypatch.setattr(messaging, '_kernel', lambda: kernel)
+
+    async def requests():
+        browser, messages = make_browser()
+        state = browser.get_browser_state()
+
+        async def reply(msg):
+            kernel.parent = 'comm'
+            browser._handle_custom_msg({'response': messages[-1]['content']['id'], 'state': {}}, [])
+        kernel.msg_queue.put_nowait((0, None, (['execute_request'],)))
+        kernel.msg_queue.put_nowait((1, reply, (['comm_msg'],)))
+        assert await state == {}
+        assert kernel.msg_queue.get_nowait()[0] == 0 and kernel.msg_queue.empty()
+        assert kernel.parent == 'cell'
+
+    asyncio.run(requests())
+
+
+def test_track_specs():
+    browser, messages = make_browser()
+    specs = [TrackSpec(url='sample%d.bam' % i, name='sample%d' % i) for i in range(1000)]
+    with pytest.raises(TraitError):
+        TrackSpec(url='sample.bam', height='high')
+    browser.add_tracks(specs + [Track(url='other.bam')])
+    assert len(messages) == 1
+    assert messages[0]['content']['ops'][1] == {'op': 'insert', 'trait': 'trackSpecs', 'id': specs[0].id, 'value': {
+        'url': 'sample0.bam', 'name': 'sample0', '_id': specs[0].id, 'type': 'alignment'}}
+    specs[1].height = 100
+    assert messages[-1]['content']['ops'] == [
+        {'op': 'update', 'trait': 'trackSpecs', 'id': specs[1].id, 'name': 'height', 'value': 100}]
+    browser.remove_track(specs[1])
+    specs[1].height = 200
+    assert len(messages) == 3
+    # a track removed in the frontend
+    browser.set_state({'trackSpecs': [spec.to_dict() for spec in specs[2:]]})
+    assert browser.trackSpecs == specs[2:]
+
+
+def test_browser_group(session_copy):
+    group = BrowserGroup(genome=ReferenceGenome(id='hg19'), locus='chr1:1-100', columns=4)
+    browsers = [group.add_browser() for _ in range(12)]
+    assert all(b.genome is group.genome and b.group is group for b in browsers)
+    assert browsers[0].get_state('group')['group'] == 'IPY_MODEL_' + group.model_id
+    assert browsers[0].locus == 'chr1:1-100'
+    grid = group.grid()
+    assert grid.children == tuple(browsers)
+    assert grid.layout.grid_template_columns == 'repeat(4, minmax(0, 1fr))'
+    # saved browsers are restored unlinked
+    assert session_copy(browsers[0]).group is None
+
+
+def test_browser_pool():
+    pool = BrowserPool(max_idle=1)
+    genes = AnnotationTrack(url='genes.bed')
+    first = [Track(url='site1.bam'), genes]
+    browser = pool.acquire({'id': 'hg19'}, tracks=first, locus='chr1:100-200')
+    assert browser.tracks == first and browser.locus == 'chr1:100-200'
+    pool.release(browser)
+
+    messages = []
+    browser.comm.send = lambda *args, **kwargs: messages.append(kwargs.get('data'))
+    second = [genes, Track(url='site2.bam')]
+    assert pool.acquire({'id': 'hg19'}, tracks=second, locus='chr2:1-50') is browser
+    assert browser.tracks == second and browser.locus == 'chr2:1-50'
+    # tracks and locus swapped in a patch and a locus update; removed tracks closed
+    ops = messages[0]['content']['ops']
+    assert [op['op'] for op in ops] == ['remove', 'insert']
+    assert messages[1]['state'] == {'locus': 'chr2:1-50'}
+    assert first[0].comm is None and genes.comm is not None
+
+    other = pool.acquire({'id': 'hg38'})
+    assert other is not browser
+    pool.release(browser)
+    pool.release(other)
+    # beyond max_idle, browsers are closed with their tracks and genome
+    assert browser.comm is None and genes.comm is None and browser.genome.comm is None
+    pool.close()
+    assert other.comm is None
@@ -0,0 +1,78 @@
+import numpy as np
+
+from ipywidgets.widgets.widget import _remove_buffers
+
+from ipyigv import AnnotationTrack, FeatureTable, IgvBrowser, ReferenceGenome, RoiSet, Track
+from ipyigv.features import FeatureIndex
+from ipyigv.options import Exon, TrackFeature
+
+
+def test_feature_table_columns():
+    table = FeatureTable.from_dataframe({
+        'chr': ['chr2', 'chr1'], 'start': [20, 10], 'end': [25, 15],
+        'strand': ['-', '+'], 'name': ['b', 'a'],
+        'exons': [[(20, 22), (23, 25)], []],
+    })
+    assert list(table.chr_names) == ['chr1', 'chr2']
+    assert table.chr.tolist() == [1, 0]
+    assert table.strand.tolist() == [-1, 1]
+    assert np.isnan(table.score).all()
+    assert table.exon_offsets.tolist() == [0, 2, 2]
+    assert table.exon_ends.tolist() == [22, 25]
+
+    # assemblies with more contigs than 16-bit codes
+    contigs = ['contig%05d' % i for i in range(70000)]
+    table = FeatureTable(contigs, np.zeros(70000), np.ones(70000))
+    assert table.chr_names[table.chr[-1]] == 'contig69999'
+
+
+def test_features_sent_as_buffers():
+    feature = TrackFeature(chr='chr1', start=1, end=9, name='x', strand='+',
+                           exons=[Exon(start=1, end=3), Exon(start=5, end=9)])
+    track = Track(name='calls', features=FeatureTable.from_features([feature]))
+    assert isinstance(track, AnnotationTrack)
+    state, buffer_paths, buffers = _remove_buffers(track.get_state())
+    assert state['features'] == {'length': 1, 'chromosomes': ['chr1']}
+    assert ['features', 'start'] in buffer_paths
+    assert sum(len(bytes(b)) for b in buffers) < 64
+
+
+def test_roi_sets(tmp_path):
+    bed = tmp_path / 'calls.bed'
+    bed.write_text('track name=calls\nchr1\t10\t20\tdel\nchr2\t5\t8\tdup\n')
+    calls = RoiSet.from_bed(str(bed), color='red')
+    assert calls.name == 'calls.bed'
+    assert calls.intervals.name == ['del', 'dup']
+    assert calls.intervals.start.tolist() == [10, 5]
+    targets = RoiSet.from_arrays(['chr1'] * 100000, np.arange(100000) * 10, np.arange(100000) * 10 + 5, name='targets')
+    state, _, buffers = _remove_buffers(targets.get_state())
+    assert state['intervals'] == {'length': 100000, 'chromosomes': ['chr1']}
+    assert len(buffers) == 5
+
+    browser = IgvBrowser(genome=ReferenceGenome(id='hg19'))
+    browser.add_roi_set(calls)
+    browser.add_roi_set(targets)
+    browser.remove_roi_set('calls.bed')
+    assert browser.roiSets == [targets]
+
+
+def test_feature_index(frontend_request):
+    rng = np.random.default_rng(0)
+    n = 100000
+    start = rng.integers(0, 10**7, n)
+    end = start + rng.integers(1, 10**5, n)
+    chr = rng.choice(['chr1', 'chr2'], n)
+    table = FeatureTable(chr, start, end, name=['f%d' % i for i in range(n)])
+    index = FeatureIndex(table)
+    for lo, hi in [(0, 10), (5 * 10**6, 5 * 10**6 + 20000), (10**7, 2 * 10**7)]:
+        expected = np.flatnonzero((chr == 'chr2') & (start < hi) & (end > lo))
+        assert sorted(index.query('2', lo, hi)) == expected.tolist()
+
+    track = Track(name='models', featureIndex=index)
+    assert isinstance(track, AnnotationTrack)
+    assert track.get_state('featureIndex')['featureIndex']['tile_size'] == index.tile_size
+    content, buffers = frontend_request(track, 'features', chr='chr1', tiles=[0, 1])
+    assert content['response'] == 1 and content['tiles'] == [0, 1]
+    assert ['features', 0, 'ids'] in content['buffer_paths']
+    ids = np.frombuffer(buffers[content['buffer_paths'].index(['features', 0, 'ids'])], dtype=np.uint32)
+    assert sorted(ids) == sorted(index.query('chr1', 0, index.tile_size))
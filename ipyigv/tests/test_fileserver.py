@@ -0,0 +1,58 @@
+import os
+
+from ipyigv import IgvBrowser, ReferenceGenome, Track, TrackSpec, fileserver
+
+
+def test_read_range(tmp_path, monkeypatch):
+    monkeypatch.setattr(fileserver, 'BLOCK_SIZE', 16)
+    path = tmp_path / 'data.bed'
+    path.write_bytes(bytes(range(100)))
+    views = fileserver.read_range(str(path), 10, 30)
+    assert len(views) == 3
+    assert b''.join(views) == bytes(range(10, 40))
+    assert b''.join(fileserver.read_range(str(path), 90)) == bytes(range(90, 100))
+    hits = fileserver.BLOCK_CACHE.hits
+    fileserver.read_range(str(path), 10, 30)
+    assert fileserver.BLOCK_CACHE.hits == hits + 3
+    # blocks are views on the mapped file, not copies
+    mapped = fileserver._mapped(str(path))
+    assert mapped.block(0).obj is mapped.map
+
+    # replaced versions of a file are unmapped
+    del views
+    path.write_bytes(bytes(range(50)))
+    assert b''.join(fileserver.read_range(str(path), 40)) == bytes(range(40, 50))
+    assert mapped.map.closed and fileserver._mapped(str(path)) is not mapped
+
+
+def test_browser_serves_kernel_sources(tmp_path):
+    bam = tmp_path / 'reads.bam'
+    bam.write_bytes(b'BAM\1' * 10)
+    (tmp_path / 'reads.bam.bai').write_bytes(b'BAI\1')
+    (tmp_path / 'secret.txt').write_bytes(b'secret')
+    browser = IgvBrowser(genome=ReferenceGenome(id='hg19'))
+    browser.add_track(Track(url=str(bam), sourceType='kernel'))
+    replies = []
+    browser.comm.send = lambda *args, **kwargs: replies.append(kwargs)
+
+    browser._handle_request(None, {'request': 'read', 'id': 0, 'path': str(bam) + '.bai'}, [])
+    assert replies[-1]['data']['content'] == {'size': 4, 'response': 0}
+    assert b''.join(replies[-1]['buffers']) == b'BAI\1'
+
+    # neither other files nor siblings sharing the name of the source
+    (tmp_path / 'reads.bam.txt').write_bytes(b'secret')
+    for i, name in enumerate(['secret.txt', 'reads.bam.txt', 'reads.txt']):
+        browser._handle_request(None, {'request': 'read', 'id': i + 1, 'path': str(tmp_path / name)}, [])
+        assert 'error' in replies[-1]['data']['content']
+
+
+def test_browser_serves_kernel_track_specs(tmp_path):
+    bed = tmp_path / 'peaks.bed'
+    bed.write_bytes(b'chr1\t10\t20\n')
+    browser = IgvBrowser(genome=ReferenceGenome(id='hg19'))
+    browser.add_track(TrackSpec(url=str(bed), sourceType='kernel'))
+    assert browser._served_files() == [str(bed)]
+    replies = []
+    browser.comm.send = lambda *args, **kwargs: replies.append(kwargs)
+    browser._handle_request(None, {'request': 'read', 'id': 0, 'path': str(bed)}, [])
+    assert b''.join(replies[-1]['buffers']) == b'chr1\t10\t20\n'
@@ -0,0 +1,26 @@
+import json
+
+from ipyigv import PUBLIC_GENOMES, PUBLIC_GENOMES_FILE
+from ipyigv.genomes import GenomeRegistry
+
+
+def test_public_genomes():
+    with open(PUBLIC_GENOMES_FILE) as f:
+        expected = {genome['id']: genome for genome in json.load(f)}
+    assert dict(PUBLIC_GENOMES) == expected
+    assert PUBLIC_GENOMES.hg38 == expected['hg38']
+
+
+def test_lazy_and_merged(tmp_path):
+    registry = GenomeRegistry(PUBLIC_GENOMES_FILE)
+    assert registry._index is None
+    local = tmp_path / 'local.json'
+    local.write_text(json.dumps([
+        {'id': 'hg38', 'name': 'In-house hg38', 'tracks': [{'id': 'nested'}]},
+        {'id': 'custom', 'name': 'x "id": "fake" {', 'fastaURL': 'file.fa'},
+    ]))
+    registry.add_registry(str(local))
+    assert registry['hg38']['name'] == 'In-house hg38'
+    assert registry['custom']['fastaURL'] == 'file.fa'
+    assert 'nested' not in registry and 'fake' not in registry
+    assert 'hg19' in registry
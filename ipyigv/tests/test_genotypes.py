@@ -0,0 +1,49 @@
+import numpy as np
+
+from ipyigv import GenotypeMatrix, Track, VariantTrack
+
+
+def test_genotype_windows():
+    rng = np.random.default_rng(0)
+    n_variants, n_samples = 20000, 10000
+    pos = np.sort(rng.integers(1, 10**6, n_variants))
+    genotypes = rng.integers(-1, 3, (n_variants, n_samples), dtype=np.int8)
+    matrix = GenotypeMatrix(genotypes, ['chr1'] * n_variants, pos,
+                            ['s%d' % i for i in range(n_samples)], page_size=50)
+    assert matrix.pages == 200
+
+    lo, hi = matrix.rows('1', 1000, 5000)
+    packed = matrix.window('chr1', 1000, 5000, page=3)
+    assert packed['mode'] == 'calls' and packed['samples'][0] == 's150'
+    calls = np.frombuffer(packed['genotypes'], dtype=np.int8).reshape(hi - lo, 50)
+    assert (calls == genotypes[lo:hi, 150:200]).all()
+
+    # the whole chromosome: per-pixel aggregates, bounded by width x page size
+    packed = matrix.window('chr1', 0, 10**6, page=3, width=500)
+    assert packed['mode'] == 'bins' and packed['genotypes'].nbytes == 500 * 50
+    counts = np.frombuffer(packed['counts'], dtype=np.uint32).reshape(500, 4)
+    assert counts.sum() == n_variants * 50
+    assert (counts[:, 0].sum() == (genotypes[:, 150:200] < 0).sum())
+    severe = np.frombuffer(packed['genotypes'], dtype=np.int8).reshape(500, 50)
+    first_bin = pos - 1 < 2000
+    assert (severe[0] == genotypes[first_bin, 150:200].max(axis=0)).all()
+
+    # bins without variants are told apart from no calls
+    matrix = GenotypeMatrix(np.array([[-1], [1]]), ['chr1'] * 2, [10, 90], ['a'])
+    packed = matrix.window('chr1', 0, 100, width=10, squished=True)
+    assert np.frombuffer(packed['genotypes'], dtype=np.int8).tolist() == [-1] + [-2] * 7 + [1, -2]
+
+    # allele counts above 2 are shown as hom var in both modes
+    matrix = GenotypeMatrix(np.array([[3, 200]], dtype=np.uint8), ['chr1'], [10], ['a', 'b'])
+    for squished in (False, True):
+        packed = matrix.window('chr1', 0, 100, width=10, squished=squished)
+        assert np.frombuffer(packed['genotypes'], dtype=np.int8).max() == 2
+
+
+def test_genotypes_request(frontend_request):
+    matrix = GenotypeMatrix(np.array([[0, 1], [2, -1]]), ['chr1', 'chr2'], [10, 20], ['a', 'b'],
+                            ref=['A', 'C'], alt=['T', 'G'])
+    track = Track(name='cohort', genotypes=matrix, displayMode='SQUISHED')
+    assert isinstance(track, VariantTrack)
+    content, buffers = frontend_request(track, 'genotypes', chr='chr2', start=0, end=100, width=10)
+    assert content['genotypes']['mode'] == 'bins' and content['genotypes']['variants'] == 1
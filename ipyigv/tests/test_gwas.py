@@ -0,0 +1,37 @@
+import numpy as np
+
+from ipyigv import GwasPyramid, GwasTrack, IgvBrowser, Track
+
+
+def test_gwas_levels():
+    rng = np.random.default_rng(0)
+    n = 100000
+    chr = np.repeat(['chr2', 'chr1'], n // 2)
+    pos = rng.integers(1, 10**7, n)
+    p = rng.uniform(0, 1, n)
+    p[5] = np.nan
+    snps = GwasPyramid(chr, pos, p, resolution=1000, factor=4, tile_bins=512)
+    assert snps.bin_sizes == [1000, 4000, 16000, 64000]
+    assert sum(len(level['pos']) for level in (snps.levels['chr1'][0], snps.levels['chr2'][0])) == n - 1
+
+    # each bin keeps its most significant SNP and counts the SNPs it holds
+    level = snps.levels['chr1'][3]
+    tile = snps.tile('1', 3, 0)
+    assert tile['length'] == len(level['pos'])
+    assert np.frombuffer(tile['count'], dtype=np.uint32).sum() == n // 2
+    mask = (chr == 'chr1') & (pos <= 64000)
+    assert np.frombuffer(tile['value'], dtype=np.float32)[0] == np.float32(-np.log10(p[mask].min()))
+    assert snps.level_for(3000) == 1 and snps.level_for(10**6) == 3
+
+
+def test_gwas_track(frontend_request, session_copy):
+    snps = GwasPyramid.from_dataframe({'chr': ['chr1', 'chr1', 'chrX'], 'pos': [300, 100, 50],
+                                       'p': [1e-8, 0.5, 1e-300], 'name': ['rs3', 'rs1', 'rsX']})
+    track = Track(name='study', snps=snps)
+    assert isinstance(track, GwasTrack)
+    content, buffers = frontend_request(track, 'snps', chr='chr1', level=0, tiles=[0])
+    assert content['snps'][0]['length'] == 2 and len(buffers) == 6
+
+    copy = session_copy(IgvBrowser(tracks=[track])).tracks[-1]
+    assert copy.snps.names == ['rs1', 'rs3', 'rsX']
+    assert np.allclose(copy.snps.snp_table()[2], snps.snp_table()[2])
@@ -0,0 +1,91 @@
+import gzip
+import os
+import struct
+
+from ipyigv import IgvBrowser, ReferenceGenome, Track, TrackSpec
+from ipyigv import indexing
+
+
+def test_bgzip_tabix(tmp_path, monkeypatch):
+    monkeypatch.setattr(indexing, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(indexing, 'SORT_CHUNK_LINES', 2)
+    bed = tmp_path / 'calls.bed'
+    bed.write_text('track name=calls\nchr2\t5\t8\tb\nchr1\t30\t40\tc\nchr1\t10\t20\ta\n\n')
+
+    track = Track(url=str(bed))
+    assert track.url == str(bed) and track.sourceType == 'file'  # indexing is explicit
+    assert track.index() is track
+    assert track.url.startswith(str(tmp_path / 'cache')) and track.url.endswith('calls.bed.gz')
+    assert track.indexURL == track.url + '.tbi'
+    assert track.sourceType == 'kernel'
+    # sorted by the external sort, headers first
+    assert gzip.open(track.url).read() == b'track name=calls\nchr1\t10\t20\ta\nchr1\t30\t40\tc\nchr2\t5\t8\tb\n'
+    index = gzip.open(track.indexURL).read()
+    assert index[:4] == b'TBI\1'
+    n_ref, fmt, col_seq, col_beg, col_end, meta, skip, l_nm = struct.unpack('<8i', index[4:36])
+    assert (n_ref, fmt, col_beg, col_end, skip) == (2, indexing.TBX_UCSC, 2, 3, 1)
+    assert index[36:36 + l_nm] == b'chr1\0chr2\0'
+
+    # the index is reused until the file changes
+    mtime = os.path.getmtime(track.url)
+    assert Track(url=str(bed)).index().url == track.url
+    assert os.path.getmtime(track.url) == mtime
+    bed.write_text('chr3\t1\t2\n')
+    assert gzip.open(Track(url=str(bed)).index().url).read() == b'chr3\t1\t2\n'
+
+    # existing indexes are used as they are, the files read through the kernel
+    existing = Track(url=track.url).index()
+    assert (existing.url, existing.indexURL, existing.sourceType) == (track.url, track.indexURL, 'kernel')
+
+
+def test_tabix_headers(tmp_path, monkeypatch):
+    monkeypatch.setattr(indexing, 'CACHE_DIR', str(tmp_path / 'cache'))
+    bed = tmp_path / 'calls.bed'
+    bed.write_text('#comment\ntrack name=calls\nbrowser hide all\n#columns\nchr1\t10\t20\ta\nchr2\t5\t8\tb\n')
+    track = Track(url=str(bed)).index()
+    index = gzip.open(track.indexURL).read()
+    n_ref, fmt, col_seq, col_beg, col_end, meta, skip, l_nm = struct.unpack('<8i', index[4:36])
+    assert skip == 4
+    lines = gzip.open(track.url).read().split(b'\n')
+    assert lines[skip] == b'chr1\t10\t20\ta'
+
+    # records read back from the virtual offsets of the chunks of each reference
+    data = open(track.url, 'rb').read()
+    position = 36 + l_nm
+    for name in (b'chr1', b'chr2'):
+        n_bin, = struct.unpack('<i', index[position:position + 4])
+        position += 4
+        offsets = []
+        for _ in range(n_bin):
+            bin, n_chunk = struct.unpack('<Ii', index[position:position + 8])
+            offsets += struct.unpack('<%dQ' % (2 * n_chunk), index[position + 8:position + 8 + 16 * n_chunk])[::2]
+            position += 8 + 16 * n_chunk
+        n_intv, = struct.unpack('<i', index[position:position + 4])
+        position += 4 + 8 * n_intv
+        offset = min(offsets)
+        record = gzip.decompress(data[offset >> 16:])[offset & 0xffff:].split(b'\n')[0]
+        assert record.split(b'\t')[0] == name
+
+
+def test_fasta_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(indexing, 'CACHE_DIR', str(tmp_path / 'cache'))
+    fasta = tmp_path / 'genome.fa'
+    fasta.write_text('>chr1 first\n' + 'ACGT' * 15 + '\nACG\n>chr2\nAAAA\n')
+    genome = ReferenceGenome(fastaURL=str(fasta)).index()
+    assert genome.indexed and genome.sourceType == 'kernel'
+    with open(genome.indexURL) as f:
+        assert f.read() == 'chr1\t63\t12\t60\t61\nchr2\t4\t83\t4\t5\n'
+    (tmp_path / 'genome.fa.fai').write_text('chr1\t1\t6\t1\t2\n')
+    genome = ReferenceGenome(fastaURL=str(fasta)).index()
+    assert genome.indexURL == str(fasta) + '.fai' and genome.sourceType == 'kernel'
+
+
+def test_track_spec_indexing(tmp_path, monkeypatch):
+    monkeypatch.setattr(indexing, 'CACHE_DIR', str(tmp_path / 'cache'))
+    bed = tmp_path / 'calls.bed'
+    bed.write_text('chr1\t30\t40\tc\nchr1\t10\t20\ta\n')
+    spec = TrackSpec(url=str(bed))
+    browser = IgvBrowser(genome=ReferenceGenome(id='hg19'), trackSpecs=[spec])
+    assert spec.index() is spec
+    assert spec.sourceType == 'kernel' and spec.indexURL == spec.url + '.tbi'
+    assert browser._served_files() == [spec.url, spec.indexURL]
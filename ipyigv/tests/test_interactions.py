@@ -0,0 +1,46 @@
+import numpy as np
+
+from ipyigv import IgvBrowser, InteractionPyramid, InteractionTrack, Track
+
+
+def test_interaction_levels():
+    rng = np.random.default_rng(0)
+    n = 50000
+    chr1 = np.array(['chr1', 'chr2'])[rng.integers(0, 2, n)]
+    chr2 = np.where(rng.random(n) < 0.9, chr1, 'chr3')
+    start1 = rng.integers(0, 10**7, n)
+    start2 = rng.integers(0, 10**7, n)
+    score = rng.random(n)
+    contacts = InteractionPyramid(chr1, start1, start1 + 500, chr2, start2, start2 + 500, score)
+    assert contacts.bin_sizes == [1000, 4000, 16000]
+
+    # binned levels sum the scores of the contacts joining the same bins
+    for level in contacts.levels[1:]:
+        assert np.isclose(level['score'].sum(), score.sum(), rtol=1e-4) and level['count'].sum() == n
+
+    # arcs crossing the window, at the level of its resolution: inter-chromosomal
+    # contacts are found from their anchor on the chromosome in view
+    rows = contacts.query('3', 10**6, 2 * 10**6)
+    expected = (chr2 == 'chr3') & (start2 < 2 * 10**6) & (start2 + 500 > 10**6)
+    assert len(rows) == expected.sum()
+    packed = contacts.window('chr1', 0, 10**7, width=1000, max_arcs=100)
+    assert packed['level'] == 2 and packed['length'] == 100
+    top = np.frombuffer(packed['score'], dtype=np.float32)
+    assert top.min() >= np.sort(contacts.levels[2]['score'][contacts.query('chr1', 0, 10**7, 2)])[-100]
+
+
+def test_interaction_track(frontend_request, session_copy):
+    contacts = InteractionPyramid.from_dataframe({
+        'chr1': ['chr1', 'chr1'], 'start1': [5000, 100], 'end1': [6000, 200],
+        'chr2': ['chr1', 'chr1'], 'start2': [1000, 9000], 'end2': [2000, 9500], 'score': [3, 1]})
+    track = Track(name='loops', interactions=contacts, maxArcs=1)
+    assert isinstance(track, InteractionTrack)
+    assert isinstance(Track(url='loops.bedpe'), InteractionTrack)
+    content, buffers = frontend_request(track, 'interactions', chr='chr1', start=0, end=10000, width=1000)
+    # the single arc kept is the highest scoring one, with ordered anchors
+    assert content['interactions']['length'] == 1
+    start1 = buffers[content['buffer_paths'].index(['interactions', 'start1'])]
+    assert np.frombuffer(start1, dtype=np.uint32)[0] == 1000
+
+    copy = session_copy(IgvBrowser(tracks=[track])).tracks[-1]
+    assert copy.maxArcs == 1 and list(copy.interactions.levels[0]['score']) == [3, 1]
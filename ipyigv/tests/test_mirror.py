@@ -0,0 +1,89 @@
+import hashlib
+import os
+import threading
+
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+
+from ipyigv import GenomeMirror, IgvBrowser
+
+
+class RangeHandler(SimpleHTTPRequestHandler):
+    # a static file server supporting open-ended byte ranges, as S3 does
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get('Range')))
+        path = self.translate_path(self.path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        start = 0
+        if self.headers.get('Range'):
+            start = int(self.headers['Range'].split('=')[1].rstrip('-'))
+            if start >= len(data):
+                self.send_error(416)
+                return
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(data) - start))
+        self.end_headers()
+        self.wfile.write(data[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    remote = tmp_path / 'remote'
+    remote.mkdir()
+    (remote / 'ref.fa').write_bytes(b'>chr1\n' + b'ACGT' * 1000 + b'\n')
+    (remote / 'ref.fa.fai').write_bytes(b'chr1\t4000\t6\t4000\t4001\n')
+    (remote / 'cytoBand.txt').write_bytes(b'chr1\t0\t4000\tp1\tgneg\n')
+    (remote / 'copy.txt').write_bytes(b'chr1\t0\t4000\tp1\tgneg\n')
+    handler = lambda *args: RangeHandler(*args, directory=str(remote))
+    httpd = HTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:%d/' % httpd.server_port
+    httpd.shutdown()
+
+
+def test_mirror(tmp_path, server):
+    definition = {'id': 'ref', 'fastaURL': server + 'ref.fa', 'indexURL': server + 'ref.fa.fai',
+                  'cytobandURL': server + 'cytoBand.txt'}
+    mirror = GenomeMirror(str(tmp_path / 'mirror'), registry={'ref': definition})
+    # an interrupted download is resumed from where it stopped
+    os.makedirs(str(tmp_path / 'mirror' / 'partial'))
+    name = hashlib.sha1((server + 'ref.fa').encode()).hexdigest()
+    (tmp_path / 'mirror' / 'partial' / name).write_bytes(b'>chr1\n' + b'ACGT' * 10)
+    RangeHandler.requests = []
+    genome = mirror.genome('ref')
+    assert ('/ref.fa', 'bytes=46-') in RangeHandler.requests
+    assert genome.sourceType == 'kernel'
+    assert open(genome.fastaURL, 'rb').read() == b'>chr1\n' + b'ACGT' * 1000 + b'\n'
+    assert os.path.basename(genome.indexURL) == 'ref.fa.fai'
+
+    # assets are then read through the kernel, without network access
+    RangeHandler.requests = []
+    browser = IgvBrowser(genome=mirror.genome('ref', fetch=False))
+    assert RangeHandler.requests == []
+    replies = []
+    browser.comm.send = lambda *args, **kwargs: replies.append(kwargs)
+    browser._handle_request(None, {'request': 'read', 'id': 0, 'path': genome.fastaURL, 'start': 6, 'size': 8}, [])
+    assert b''.join(replies[-1]['buffers']) == b'ACGTACGT'
+    assert mirror.genome('ref', url_prefix='/files/mirror').cytobandURL.startswith('/files/mirror/blobs/')
+
+    # identical files are stored once; least recently used genomes are evicted
+    other = dict(definition, id='other', cytobandURL=server + 'copy.txt')
+    mirror.fetch(other)
+    assert mirror.size == 4007 + 22 + 20
+    mirror.max_size = 100
+    mirror.fetch(dict(other, id='third'))
+    assert set(mirror.manifests()) == {'third'}
+    with pytest.raises(KeyError):
+        mirror.genome('ref', fetch=False)
+    # files shared with the kept genome are not removed
+    assert os.path.exists(mirror.genome(dict(other, id='third'), fetch=False).fastaURL)
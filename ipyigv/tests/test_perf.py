@@ -0,0 +1,21 @@
+import json
+
+from ipyigv.perf import PerfLog
+
+
+def test_perf_log(tmp_path):
+    log = PerfLog(maxlen=10)
+    log.add([
+        {'kind': 'track', 'name': 'a', 'start': 1000.0, 'duration': 3.0, 'batch': 2},
+        {'kind': 'track', 'name': 'a', 'start': 900.0, 'duration': 150.0, 'batch': 2},
+        {'kind': 'fetch', 'name': 'a', 'start': 950.0, 'duration': 40.0, 'url': 'a.bam', 'bytes': 100, 'range': None},
+    ])
+    assert log.histograms()['a'].tolist()[:8] == [0, 0, 1, 0, 0, 0, 0, 1]
+    assert log.summary()[('track', 'a')]['max'] == 150.0
+    assert log.bytes_per_track() == {'a': 100}
+    assert [r['start'] for r in log.timeline()] == [900.0, 950.0, 1000.0]
+    log.export(str(tmp_path / 'trace.json'))
+    trace = json.loads((tmp_path / 'trace.json').read_text())
+    assert trace['traceEvents'][1]['args']['url'] == 'a.bam'
+    log.add([{'kind': 'redraw', 'name': 'redraw', 'start': 0, 'duration': 1}] * 20)
+    assert len(log) == 10
@@ -0,0 +1,52 @@
+import gzip
+import os
+
+from ipyigv import GeneIndex, IgvBrowser
+
+REFGENE = [
+    # bin, name, chrom, strand, txStart, txEnd, cdsStart, cdsEnd, exonCount, exonStarts, exonEnds, score, name2
+    '0\tNM_007294\tchr17\t-\t43044294\t43125483\t0\t0\t1\t0,\t0,\t0\tBRCA1',
+    '0\tNR_027676\tchr17\t-\t43044294\t43170245\t0\t0\t1\t0,\t0,\t0\tBRCA1',
+    '0\tNM_000546\tchr17\t-\t7668401\t7687538\t0\t0\t1\t0,\t0,\t0\tTP53',
+    '0\tNM_000546\tchr17_KI270857v1_alt\t-\t1000\t2000\t0\t0\t1\t0,\t0,\t0\tTP53',
+    '0\tNM_004333\tchr7\t-\t140719326\t140924929\t0\t0\t1\t0,\t0,\t0\tBRAF',
+]
+
+
+def test_gene_index(tmp_path):
+    path = str(tmp_path / 'refGene.txt.gz')
+    with gzip.open(path, 'wt') as f:
+        f.write('\n'.join(REFGENE) + '\n')
+    genome = {'id': 'test', 'tracks': [{'name': 'Refseq Genes', 'format': 'refgene', 'url': path}]}
+    index = GeneIndex.for_genome(genome, path=str(tmp_path / 'cache'))
+    assert sorted(os.path.splitext(name)[1] for name in os.listdir(str(tmp_path / 'cache'))) == ['.json', '.npz']
+    # the cached index is loaded on next use, and built again when the file changes
+    index = GeneIndex.for_genome(genome, path=str(tmp_path / 'cache'))
+    with gzip.open(path, 'wt') as f:
+        f.write(REFGENE[-1] + '\n')
+    assert GeneIndex.for_genome(genome, path=str(tmp_path / 'cache')).complete('') == ['BRAF', 'NM_004333']
+    with gzip.open(path, 'wt') as f:
+        f.write('\n'.join(REFGENE) + '\n')
+    index = GeneIndex.for_genome(genome, path=str(tmp_path / 'cache'))
+
+    # genes span their transcripts, alternate contigs come last
+    assert index.locate('brca1') == ('chr17', 43044294, 43170245, 'BRCA1')
+    assert index.locate('TP53')[0] == 'chr17'
+    assert index.resolve_loci(['NM_007294', 'NM_000546.6', 'BRCAA1', 'chr1:100-200', 'XYZ'], flanking=10) == [
+        'chr17:43044285-43125493', 'chr17:7668392-7687548', 'chr17:43044285-43170255', 'chr1:100-200', None]
+    assert index.complete('br') == ['BRAF', 'BRCA1']
+
+    index.add_aliases({'p53': 'TP53', 'unknown': 'NOPE'})
+    assert index.resolve_loci(['P53']) == ['chr17:7668402-7687538']
+
+
+def test_browser_search(frontend_request):
+    index = GeneIndex(['BRCA1', 'BRCA1'], ['chr17', 'chr17'], [43044294, 43044294], [43125483, 43170245])
+    browser = IgvBrowser(geneIndex=index, flanking=0)
+    sent = []
+    browser.send = lambda content, buffers=None: sent.append(content)
+    # resolved in the kernel, without a round trip
+    assert browser.search('BRCA1') == 'chr17:43044295-43170245'
+    assert browser.locus == 'chr17:43044295-43170245' and sent == []
+    content, _ = frontend_request(browser, 'locate', symbols=['brca1', 'XYZ'])
+    assert content['loci'] == ['chr17:43044295-43170245', None]
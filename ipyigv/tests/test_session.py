@@ -0,0 +1,97 @@
+import json
+import os
+import zipfile
+
+import numpy as np
+
+from ipywidgets import Widget
+
+from ipyigv import GenotypeMatrix, IgvBrowser, ReferenceGenome, RoiSet, Track, TrackSpec, WigTrack
+from ipyigv import session
+from ipyigv._version import STATE_SCHEMA_VERSION
+from ipyigv.state import frontend_defaults
+from ipyigv.features import FeatureTable
+from ipyigv.wig import SignalPyramid
+
+
+def test_session_roundtrip(tmp_path):
+    browser = IgvBrowser(genome=ReferenceGenome(id='hg19'), locus='chr1:1-100')
+    browser.add_tracks([
+        Track(url='sample.bam', height=80),
+        Track(name='calls', features=FeatureTable(['chr1', 'chr2'], [1, 5], [4, 9], name=['a', 'b'])),
+        Track(name='signal', signal=SignalPyramid({'chr1': np.arange(1000.)})),
+        TrackSpec(url='calls.vcf', name='calls'),
+    ])
+    browser.add_roi_set(RoiSet.from_arrays(['chr1'] * 3, [1, 2, 3], [4, 5, 6], name='targets'))
+    path = str(tmp_path / 'session.zip')
+    browser.save_session(path)
+    session = json.loads(zipfile.ZipFile(path).read('session.json'))
+    # only non-default values are saved
+    assert session['browser']['values']['tracks'][0] == {
+        '$widget': 'AlignmentTrack', 'values': {'height': 80, 'url': 'sample.bam'}}
+
+    restored = IgvBrowser.load_session(path)
+    assert restored.locus == 'chr1:1-100'
+    assert [type(t) for t in restored.tracks] == [type(t) for t in browser.tracks]
+    assert isinstance(restored.tracks[2], WigTrack)
+    assert list(restored.tracks[1].features.chr_names) == ['chr1', 'chr2']
+    assert restored.tracks[1].features.name == ['a', 'b']
+    assert restored.trackSpecs[0].to_dict()['type'] == 'variant'
+    assert restored.roiSets[0].intervals.end.tolist() == [4, 5, 6]
+
+
+def test_sparse_embed_state():
+    track = Track(url='sample.bam', height=80)
+    browser = IgvBrowser(genome=ReferenceGenome(id='hg19'), tracks=[track])
+    assert track._get_embed_state()['state'] == {
+        'height': 80, 'type': 'alignment', 'url': 'sample.bam', '_state_schema': STATE_SCHEMA_VERSION}
+    state = Widget.get_manager_state(widgets=[browser])['state'][browser.model_id]['state']
+    assert set(state) == {'genome', 'layout', 'tracks', '_state_schema'}
+
+
+def test_sparse_comm_state():
+    track = Track(url='sample.bam', height=80)
+    state = track.get_state()
+    assert {'_model_name', '_state_schema', 'type', 'height', 'url'} <= set(state)
+    assert 'roi' not in state and 'coverageColor' not in state
+    assert len(state) < len(track.keys) / 2
+    # explicitly requested values are always sent
+    assert track.get_state('roi') == {'roi': []}
+
+
+def test_explicit_default_values_are_sent(session_copy):
+    # igv.js defaults may differ from the Python ones
+    track = Track(url='sample.bam', height=50, indexed=False)
+    assert track.height == Track(url='sample.bam').height
+    assert {'height', 'indexed'} <= set(track.get_state())
+    assert {'height', 'indexed'} <= set(track._get_embed_state()['state'])
+    assert {'height', 'indexed'} <= set(session_copy(IgvBrowser(tracks=[track])).tracks[0].get_state())
+
+
+def test_frontend_defaults():
+    # the frontend fills in the values left out of sparse states from these tables
+    path = os.path.join(os.path.dirname(__file__), '..', '..', 'js', 'src', 'defaults.json')
+    with open(path) as f:
+        shipped = json.load(f)
+    assert shipped == frontend_defaults(), 'regenerate with python -m ipyigv.state > js/src/defaults.json'
+    assert shipped['schema'] == STATE_SCHEMA_VERSION
+    assert shipped['tracks']['alignment']['height'] == 50 and shipped['tracks']['alignment']['colorBy'] == 'none'
+
+
+def test_genotypes_saved_in_chunks(session_copy, monkeypatch):
+    class Chunked(object):
+        # an on-disk matrix (e.g. zarr): sliced, never converted whole
+        def __init__(self, values):
+            self.values, self.shape, self.dtype = values, values.shape, values.dtype
+
+        def __getitem__(self, key):
+            return self.values[key]
+
+        def __array__(self, *args, **kwargs):
+            raise AssertionError('matrix loaded whole')
+
+    monkeypatch.setattr(session, 'CHUNK_BYTES', 6)
+    genotypes = np.arange(-1, 29, dtype=np.int8).reshape(10, 3) % 3
+    matrix = GenotypeMatrix(Chunked(genotypes), ['chr1'] * 10, np.arange(1, 11), ['a', 'b', 'c'])
+    restored = session_copy(IgvBrowser(tracks=[Track(name='cohort', genotypes=matrix)])).tracks[0].genotypes
+    assert (restored.genotypes == genotypes).all() and restored.samples == ['a', 'b', 'c']
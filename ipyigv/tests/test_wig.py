@@ -0,0 +1,24 @@
+import numpy as np
+
+from ipyigv import SignalPyramid, Track, WigTrack
+
+
+def test_pyramid_levels():
+    values = np.arange(4096, dtype=np.float32)
+    values[:4] = np.nan
+    pyramid = SignalPyramid({'chr1': values, 'chr2': np.ones(10)}, resolution=10, tile_bins=256)
+    assert pyramid.bin_sizes == [10, 40, 160]
+    assert np.isnan(pyramid.tile('chr1', 1, 0)[0])
+    assert pyramid.tile('chr1', 1, 0, 'max')[1] == 7
+    assert pyramid.tile('1', 2, 0, 'min')[1] == 16
+    assert pyramid.tile('chr2', 2, 0).tolist() == [1]
+    assert pyramid.level_for(100) == 2
+    assert pyramid.level_for(1e6) == 2
+
+
+def test_tiles_request(frontend_request):
+    track = Track(name='coverage', signal=SignalPyramid({'chr1': np.ones(1000)}))
+    assert isinstance(track, WigTrack)
+    content, buffers = frontend_request(track, 'tiles', chr='chr1', level=0, tiles=[3])
+    assert content == {'tiles': [3], 'response': 1}
+    assert len(bytes(buffers[0])) == (1000 - 768) * 4
@@ -0,0 +1,42 @@
+"""
+Helpers shared by the in-memory data served to the frontend tile by tile
+(features, signal, genotypes, GWAS results, interactions and gene indexes).
+"""
+from .cache import LRUCache
+
+
+def tile_nbytes(tile):
+    """Size of a cached tile: an array, or a dict of packed buffers."""
+    if isinstance(tile, dict):
+        return sum(v.nbytes for v in tile.values() if isinstance(v, memoryview))
+    return tile.nbytes
+
+
+def tile_cache(cache_size):
+    """Returns an LRU cache of tiles holding up to `cache_size` bytes."""
+    return LRUCache(cache_size, getsizeof=tile_nbytes)
+
+
+class ZoomLevels(object):
+    """Base of the data with zoom levels, each binning `bin_sizes[level]` bp."""
+
+    bin_sizes = [1]
+
+    def level_for(self, bp_per_pixel):
+        """Returns the finest zoom level whose bins are at least one pixel wide."""
+        for level, bin_size in enumerate(self.bin_sizes):
+            if bin_size >= bp_per_pixel:
+                return level
+        return len(self.bin_sizes) - 1
+
+
+def describe_to_json(value, widget):
+    # the data stay in the kernel, the frontend only gets their layout
+    if value is None:
+        return None
+    return value.describe()
+
+
+describe_serialization = {
+    'to_json': describe_to_json,
+}
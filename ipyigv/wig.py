@@ -0,0 +1,78 @@
+import numpy as np
+
+from ._chromosomes import alias
+from .tiles import ZoomLevels, tile_cache
+
+
+WINDOW_FUNCTIONS = ('mean', 'min', 'max')
+
+
+class SignalPyramid(ZoomLevels):
+    """
+    Per-chromosome signal held in memory, with a mean/min/max zoom pyramid
+    (similar to bigWig zoom levels) served to the frontend tile by tile.
+
+    `data` maps chromosome names to 1D arrays, each value covering
+    `resolution` bp (NaN for missing data). Each zoom level aggregates
+    `factor` bins of the previous one, until a chromosome fits in a tile.
+    """
+
+    def __init__(self, data, resolution=1, factor=4, tile_bins=256, cache_size=64 * 2**20):
+        self.resolution = resolution
+        self.factor = factor
+        self.tile_bins = tile_bins
+        data = {chr: np.asarray(values, dtype=np.float32) for chr, values in data.items()}
+        self.lengths = {chr: len(values) * resolution for chr, values in data.items()}
+        # all chromosomes share the same levels, down to the longest one fitting in a tile
+        longest = max([len(values) for values in data.values()] + [1])
+        depth = 1
+        while -(-longest // factor**(depth - 1)) > tile_bins:
+            depth += 1
+        self.levels = {chr: self._build_levels(values, depth) for chr, values in data.items()}
+        self.bin_sizes = [resolution * factor**level for level in range(depth)]
+        self.cache = tile_cache(cache_size)
+
+    def _build_levels(self, values, depth):
+        missing = np.isnan(values)
+        levels = [{'mean': values, 'min': values, 'max': values}]
+        sums = np.where(missing, 0, values).astype(np.float64)
+        counts = (~missing).astype(np.int64)
+        mins = np.where(missing, np.inf, values)
+        maxs = np.where(missing, -np.inf, values)
+        for _ in range(depth - 1):
+            pad = -len(sums) % self.factor
+            sums = np.pad(sums, (0, pad)).reshape(-1, self.factor).sum(axis=1)
+            counts = np.pad(counts, (0, pad)).reshape(-1, self.factor).sum(axis=1)
+            mins = np.pad(mins, (0, pad), constant_values=np.inf).reshape(-1, self.factor).min(axis=1)
+            maxs = np.pad(maxs, (0, pad), constant_values=-np.inf).reshape(-1, self.factor).max(axis=1)
+            empty = counts == 0
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = (sums / counts).astype(np.float32)
+            levels.append({
+                'mean': mean,
+                'min': np.where(empty, np.nan, mins).astype(np.float32),
+                'max': np.where(empty, np.nan, maxs).astype(np.float32),
+            })
+        return levels
+
+    def tile(self, chr, level, index, window_function='mean'):
+        """Returns the values of a tile as a float32 array (empty if out of range)."""
+        if window_function not in WINDOW_FUNCTIONS:
+            raise ValueError('window function must be one of %s' % (WINDOW_FUNCTIONS,))
+        chr = alias(self.levels, chr)
+        if chr is None:
+            return np.empty(0, dtype=np.float32)
+
+        def compute():
+            values = self.levels[chr][level][window_function]
+            start = index * self.tile_bins
+            return np.ascontiguousarray(values[start:start + self.tile_bins])
+
+        return self.cache.get_or_compute((chr, level, index, window_function), compute)
+
+    def describe(self):
+        return {
+            'chromosomes': self.lengths,
+            'bin_sizes': self.bin_sizes,
+            'tile_bins': self.tile_bins,
+        }
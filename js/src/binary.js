@@ -0,0 +1,61 @@
+// Decoding of the packed binary buffers sent by the kernel.
+
+const STRANDS = { '1': '+', '-1': '-' };
+
+export function typed_array (view, type) {
+  // Buffers received over the comm are DataViews, which may not be aligned
+  // on the element size of the requested typed array.
+  if (view.byteOffset % type.BYTES_PER_ELEMENT === 0) {
+    return new type(view.buffer, view.byteOffset, view.byteLength / type.BYTES_PER_ELEMENT);
+  }
+  return new type(view.buffer.slice(view.byteOffset, view.byteOffset + view.byteLength));
+}
+
+export function decode_strings (bytes, offsets) {
+  var data = typed_array(bytes, Uint8Array);
+  var ends = typed_array(offsets, Uint32Array);
+  var decoder = new TextDecoder();
+  var strings = new Array(ends.length - 1);
+  for (var i = 0; i < strings.length; i++) {
+    strings[i] = decoder.decode(data.subarray(ends[i], ends[i + 1]));
+  }
+  return strings;
+}
+
+export function deserialize_features (packed) {
+  // Converts a packed FeatureTable into the feature objects expected by igv.js
+  if (!packed) {
+    return null;
+  }
+  var chr = typed_array(packed.chr, Uint32Array);
+  var start = typed_array(packed.start, Uint32Array);
+  var end = typed_array(packed.end, Uint32Array);
+  var strand = typed_array(packed.strand, Int8Array);
+  var score = typed_array(packed.score, Float32Array);
+  var names = packed.name ? decode_strings(packed.name, packed.name_offsets) : null;
+  var exon_offsets = packed.exon_offsets ? typed_array(packed.exon_offsets, Uint32Array) : null;
+  var exon_starts = packed.exon_starts ? typed_array(packed.exon_starts, Uint32Array) : null;
+  var exon_ends = packed.exon_ends ? typed_array(packed.exon_ends, Uint32Array) : null;
+
+  var features = new Array(packed.length);
+  for (var i = 0; i < packed.length; i++) {
+    var feature = { chr: packed.chromosomes[chr[i]], start: start[i], end: end[i] };
+    if (strand[i] !== 0) {
+      feature.strand = STRANDS[strand[i]];
+    }
+    if (!isNaN(score[i])) {
+      feature.score = score[i];
+    }
+    if (names) {
+      feature.name = names[i];
+    }
+    if (exon_offsets && exon_offsets[i + 1] > exon_offsets[i]) {
+      feature.exons = [];
+      for (var j = exon_offsets[i]; j < exon_offsets[i + 1]; j++) {
+        feature.exons.push({ start: exon_starts[j], end: exon_ends[j] });
+      }
+    }
+    features[i] = feature;
+  }
+  return features;
+}
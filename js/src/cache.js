@@ -0,0 +1,39 @@
+// A least-recently-used cache bounded by the number of entries.
+
+export class LRUCache {
+  constructor (maxsize) {
+    this.maxsize = maxsize;
+    this.map = new Map();
+  }
+
+  get (key) {
+    if (!this.map.has(key)) {
+      return undefined;
+    }
+    var value = this.map.get(key);
+    // re-insert to mark as most recently used
+    this.map.delete(key);
+    this.map.set(key, value);
+    return value;
+  }
+
+  set (key, value) {
+    this.map.delete(key);
+    this.map.set(key, value);
+    while (this.map.size > this.maxsize) {
+      this.map.delete(this.map.keys().next().value);
+    }
+  }
+
+  has (key) {
+    return this.map.has(key);
+  }
+
+  delete (key) {
+    return this.map.delete(key);
+  }
+
+  clear () {
+    this.map.clear();
+  }
+}
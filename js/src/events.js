@@ -0,0 +1,33 @@
+// Coalescing, rate-limited stream of browser events sent to the kernel.
+
+export class EventStream {
+  constructor (flush, get_window) {
+    // flush receives the list of events accumulated during a window of
+    // get_window() milliseconds: at most one flush happens per window.
+    this._flush = flush;
+    this.get_window = get_window;
+    this.pending = [];
+    this.timer = null;
+  }
+
+  push (event, coalesce) {
+    // With coalesce, the event replaces any pending event of the same type.
+    if (coalesce) {
+      this.pending = this.pending.filter(e => e.type !== event.type);
+    }
+    this.pending.push(event);
+    if (this.timer === null) {
+      this.timer = setTimeout(() => this.flush(), this.get_window());
+    }
+  }
+
+  flush () {
+    clearTimeout(this.timer);
+    this.timer = null;
+    var events = this.pending;
+    this.pending = [];
+    if (events.length > 0) {
+      this._flush(events);
+    }
+  }
+}
@@ -0,0 +1,61 @@
+// igv.js feature reader serving an AnnotationTrack from a kernel-side
+// FeatureIndex, tile by tile.
+
+import * as widgets from '@jupyter-widgets/base';
+
+import { LRUCache } from './cache';
+import { deserialize_features, typed_array } from './binary';
+
+export class FeatureReader {
+  constructor (model) {
+    this.model = model;
+    this.cache = new LRUCache(256);
+  }
+
+  readFeatures (chr, start, end) {
+    var index = this.model.get('featureIndex');
+    var tile_size = index.tile_size;
+    var first = Math.floor(Math.max(start, 0) / tile_size);
+    var last = Math.floor((end - 1) / tile_size);
+    var key = (tile) => chr + ':' + tile;
+    var missing = [];
+    for (var tile = first; tile <= last; tile++) {
+      if (!this.cache.has(key(tile))) {
+        missing.push(tile);
+      }
+    }
+
+    var fetched = Promise.resolve();
+    if (missing.length > 0) {
+      fetched = this.model.request({ request: 'features', chr: chr, tiles: missing })
+        .then((reply) => {
+          var content = reply.content;
+          widgets.put_buffers(content, content.buffer_paths, reply.buffers);
+          content.tiles.forEach((tile, i) => {
+            var packed = content.features[i];
+            var features = deserialize_features(packed);
+            var ids = typed_array(packed.ids, Uint32Array);
+            features.forEach((feature, j) => {
+              feature.chr = chr;
+              feature._id = ids[j];
+            });
+            this.cache.set(key(tile), features);
+          });
+        });
+    }
+    return fetched.then(() => {
+      // features spanning several tiles are kept once
+      var seen = new Set();
+      var features = [];
+      for (var tile = first; tile <= last; tile++) {
+        (this.cache.get(key(tile)) || []).forEach((feature) => {
+          if (!seen.has(feature._id)) {
+            seen.add(feature._id);
+            features.push(feature);
+          }
+        });
+      }
+      return features.sort((a, b) => a.start - b.start);
+    });
+  }
+}
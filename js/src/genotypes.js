@@ -0,0 +1,115 @@
+// igv.js variant reader serving a VariantTrack from a kernel-side
+// GenotypeMatrix: the variants in view, for the current page of samples.
+
+import * as widgets from '@jupyter-widgets/base';
+
+import { LRUCache } from './cache';
+import { decode_strings, typed_array } from './binary';
+
+// genotype codes sent by the kernel (-1 no call, 0 hom ref, 1 het, 2 hom var),
+// and -2 for the bins without any variant
+const EMPTY = -2;
+const CALLS = [
+  { genotype: ['.'], zygosity: 'NOCALL' },
+  { genotype: [0, 0], zygosity: 'HOMREF' },
+  { genotype: [0, 1], zygosity: 'HETVAR' },
+  { genotype: [1, 1], zygosity: 'HOMVAR' },
+];
+
+function make_calls (genotypes, row, samples) {
+  var calls = {};
+  var offset = row * samples.length;
+  samples.forEach((sample, j) => {
+    var call = CALLS[genotypes[offset + j] + 1];
+    calls[j] = { sample: sample, genotype: call.genotype, zygosity: call.zygosity };
+  });
+  return calls;
+}
+
+export class GenotypeReader {
+  constructor (model, get_frame) {
+    // get_frame returns the {bpPerPixel, width} of the current view
+    this.model = model;
+    this.get_frame = get_frame;
+    this.cache = new LRUCache(32);
+    this.samples = [];
+  }
+
+  readHeader () {
+    // igv.js lays out one row per sample of the page
+    return this.readFeatures().then(() => this.header());
+  }
+
+  header () {
+    var names = {};
+    this.samples.forEach((sample, j) => { names[sample] = j; });
+    return { sampleNameMap: names, callSets: this.samples.map((sample, j) => ({ id: j, name: sample })) };
+  }
+
+  readFeatures (chr, start, end) {
+    if (chr === undefined) {
+      return Promise.resolve([]);
+    }
+    var frame = this.get_frame();
+    var width = Math.ceil((end - start) / Math.max(frame.bpPerPixel, 1e-6));
+    var key = [chr, start, end, width, this.model.get('samplePage'), this.model.get('displayMode')].join(':');
+    var cached = this.cache.get(key);
+    if (cached) {
+      return Promise.resolve(cached);
+    }
+    var request = { request: 'genotypes', chr: chr, start: Math.max(start, 0), end: end, width: width };
+    return this.model.request(request).then((reply) => {
+      var content = reply.content;
+      widgets.put_buffers(content, content.buffer_paths, reply.buffers);
+      var variants = this._variants(chr, content.genotypes);
+      this.cache.set(key, variants);
+      return variants;
+    });
+  }
+
+  _variants (chr, packed) {
+    this.samples = packed.samples;
+    var genotypes = typed_array(packed.genotypes, Int8Array);
+    var variants = new Array(packed.length);
+    if (packed.mode === 'calls') {
+      var pos = typed_array(packed.pos, Uint32Array);
+      var ref = packed.ref ? decode_strings(packed.ref, packed.ref_offsets) : null;
+      var alt = packed.alt ? decode_strings(packed.alt, packed.alt_offsets) : null;
+      for (var i = 0; i < packed.length; i++) {
+        var reference = ref ? ref[i] : 'N';
+        variants[i] = {
+          chr: chr,
+          pos: pos[i],
+          start: pos[i] - 1,
+          end: pos[i] - 1 + Math.max(reference.length, 1),
+          referenceBases: reference,
+          alternateBases: alt ? alt[i] : '.',
+          calls: make_calls(genotypes, i, packed.samples),
+        };
+      }
+    } else {
+      // one pseudo-variant per pixel holding variants, with the most severe genotype per sample
+      var counts = typed_array(packed.counts, Uint32Array);
+      var samples = packed.samples.length;
+      variants = [];
+      for (var b = 0; b < packed.length; b++) {
+        if (samples > 0 ? genotypes[b * samples] === EMPTY
+          : counts[4 * b] + counts[4 * b + 1] + counts[4 * b + 2] + counts[4 * b + 3] === 0) {
+          continue;
+        }
+        var start = Math.floor(packed.start + b * packed.bin_size);
+        variants.push({
+          chr: chr,
+          pos: start + 1,
+          start: start,
+          end: Math.max(Math.floor(packed.start + (b + 1) * packed.bin_size), start + 1),
+          referenceBases: 'N',
+          alternateBases: '<AGGREGATE>',
+          counts: { noCall: counts[4 * b], homRef: counts[4 * b + 1], het: counts[4 * b + 2], homVar: counts[4 * b + 3] },
+          calls: make_calls(genotypes, b, packed.samples),
+        });
+      }
+    }
+    return variants;
+  }
+}
@@ -0,0 +1,100 @@
+// igv.js feature reader serving a GwasTrack from a kernel-side GwasPyramid:
+// tiles of the zoom level matching the view, each bin holding its most
+// significant SNP and the number of SNPs it covers.
+
+import * as widgets from '@jupyter-widgets/base';
+
+import { LRUCache } from './cache';
+import { decode_strings, typed_array } from './binary';
+
+export class GwasReader {
+  constructor (model, get_frame, get_genome) {
+    // get_frame returns the {bpPerPixel, width} of the current view,
+    // get_genome the igv.js genome (for whole genome views)
+    this.model = model;
+    this.get_frame = get_frame;
+    this.get_genome = get_genome;
+    this.cache = new LRUCache(512);
+  }
+
+  readFeatures (chr, start, end) {
+    var snps = this.model.get('snps');
+    if (chr.toLowerCase() === 'all') {
+      // whole genome view: the coarsest level of every chromosome
+      var genome = this.get_genome();
+      var level = snps.bin_sizes.length - 1;
+      var chromosomes = Object.keys(snps.chromosomes);
+      return Promise.all(chromosomes.map(name => this._points(name, level, 0, 0))).then((lists) => {
+        var features = [];
+        lists.forEach((points, i) => {
+          var name = genome.getChromosomeName ? genome.getChromosomeName(chromosomes[i]) : chromosomes[i];
+          points.forEach((point) => {
+            var position = genome.getGenomeCoordinate(name, point.start);
+            if (position !== undefined) {
+              features.push(Object.assign({}, point, { chr: 'all', start: position, end: position + 1 }));
+            }
+          });
+        });
+        return features;
+      });
+    }
+
+    var frame = this.get_frame();
+    var bin_sizes = snps.bin_sizes;
+    var level = bin_sizes.findIndex(size => size >= frame.bpPerPixel);
+    if (level < 0) {
+      level = bin_sizes.length - 1;
+    }
+    var tile_size = bin_sizes[level] * snps.tile_bins;
+    var first = Math.floor(Math.max(start, 0) / tile_size);
+    var last = Math.floor((end - 1) / tile_size);
+    return this._points(chr, level, first, last).then(points => points.map(point => Object.assign(point, { chr: chr })));
+  }
+
+  _points (chr, level, first, last) {
+    var key = (index) => [chr, level, index].join(':');
+    var missing = [];
+    for (var index = first; index <= last; index++) {
+      if (!this.cache.has(key(index))) {
+        missing.push(index);
+      }
+    }
+    var fetched = Promise.resolve();
+    if (missing.length > 0) {
+      fetched = this.model.request({ request: 'snps', chr: chr, level: level, tiles: missing })
+        .then((reply) => {
+          var content = reply.content;
+          widgets.put_buffers(content, content.buffer_paths, reply.buffers);
+          content.tiles.forEach((index, i) => {
+            this.cache.set(key(index), this._decode(content.snps[i]));
+          });
+        });
+    }
+    return fetched.then(() => {
+      var points = [];
+      for (var index = first; index <= last; index++) {
+        points.push(...(this.cache.get(key(index)) || []).map(point => Object.assign({}, point)));
+      }
+      return points;
+    });
+  }
+
+  _decode (packed) {
+    if (!packed.length) {
+      return [];
+    }
+    var pos = typed_array(packed.pos, Uint32Array);
+    var value = typed_array(packed.value, Float32Array);
+    var count = typed_array(packed.count, Uint32Array);
+    var names = packed.name ? decode_strings(packed.name, packed.name_offsets) : null;
+    var points = new Array(packed.length);
+    for (var i = 0; i < packed.length; i++) {
+      // igv.js plots -log10 of the p-value held in `value`
+      points[i] = { start: pos[i] - 1, end: pos[i], value: Math.pow(10, -value[i]), count: count[i] };
+      if (names) {
+        points[i].name = names[i];
+      }
+    }
+    return points;
+  }
+}
@@ -0,0 +1,67 @@
+// igv.js feature reader serving an InteractionTrack from a kernel-side
+// InteractionPyramid: the highest scoring arcs crossing the view, binned at
+// the resolution of the current zoom level.
+
+import * as widgets from '@jupyter-widgets/base';
+
+import { LRUCache } from './cache';
+import { typed_array } from './binary';
+
+export class InteractionReader {
+  constructor (model, get_frame) {
+    // get_frame returns the {bpPerPixel, width} of the current view
+    this.model = model;
+    this.get_frame = get_frame;
+    this.cache = new LRUCache(32);
+  }
+
+  readFeatures (chr, start, end) {
+    var frame = this.get_frame();
+    var width = Math.ceil((end - start) / Math.max(frame.bpPerPixel, 1e-6));
+    var key = [chr, start, end, width, this.model.get('maxArcs')].join(':');
+    var cached = this.cache.get(key);
+    if (cached) {
+      return Promise.resolve(cached);
+    }
+    var request = { request: 'interactions', chr: chr, start: Math.max(start, 0), end: end, width: width };
+    return this.model.request(request).then((reply) => {
+      var content = reply.content;
+      widgets.put_buffers(content, content.buffer_paths, reply.buffers);
+      var features = this._features(chr, content.interactions);
+      this.cache.set(key, features);
+      return features;
+    });
+  }
+
+  _features (chr, packed) {
+    var chr1 = typed_array(packed.chr1, Uint32Array);
+    var start1 = typed_array(packed.start1, Uint32Array);
+    var end1 = typed_array(packed.end1, Uint32Array);
+    var chr2 = typed_array(packed.chr2, Uint32Array);
+    var start2 = typed_array(packed.start2, Uint32Array);
+    var end2 = typed_array(packed.end2, Uint32Array);
+    var score = typed_array(packed.score, Float32Array);
+    var count = typed_array(packed.count, Uint32Array);
+    var features = new Array(packed.length);
+    for (var i = 0; i < packed.length; i++) {
+      var feature = {
+        chr1: packed.chromosomes[chr1[i]], start1: start1[i], end1: end1[i],
+        chr2: packed.chromosomes[chr2[i]], start2: start2[i], end2: end2[i],
+        score: score[i], value: score[i], count: count[i], chr: chr,
+      };
+      if (chr1[i] === chr2[i]) {
+        feature.start = start1[i];
+        feature.end = end2[i];
+      } else if (feature.chr2 === chr || feature.chr2 === 'chr' + chr || 'chr' + feature.chr2 === chr) {
+        // inter-chromosomal contacts are drawn from their anchor in view
+        feature.start = start2[i];
+        feature.end = end2[i];
+      } else {
+        feature.start = start1[i];
+        feature.end = end1[i];
+      }
+      features[i] = feature;
+    }
+    return features.sort((a, b) => a.start - b.start);
+  }
+}
@@ -0,0 +1,98 @@
+// Index of packed intervals (a FeatureTable sent by the kernel), answering
+// range queries without materializing the features out of the range.
+
+import { typed_array } from './binary';
+
+function alias (ranges, chr) {
+  // tolerates 'chr1' vs '1' naming differences between genome and data
+  if (chr in ranges) {
+    return chr;
+  }
+  return chr.startsWith('chr') ? chr.slice(3) : 'chr' + chr;
+}
+
+export class IntervalIndex {
+  constructor (packed) {
+    var chr = typed_array(packed.chr, Uint32Array);
+    this.start = typed_array(packed.start, Uint32Array);
+    this.end = typed_array(packed.end, Uint32Array);
+    this.length = packed.length;
+    // names are decoded on demand
+    this.name_bytes = packed.name ? typed_array(packed.name, Uint8Array) : null;
+    this.name_offsets = packed.name ? typed_array(packed.name_offsets, Uint32Array) : null;
+    this.decoder = new TextDecoder();
+
+    // intervals sorted by chromosome then start, with the running maximum
+    // of their ends per chromosome
+    var order = new Uint32Array(this.length);
+    for (var i = 0; i < this.length; i++) {
+      order[i] = i;
+    }
+    order.sort((a, b) => (chr[a] - chr[b]) || (this.start[a] - this.start[b]));
+    this.order = order;
+    this.sorted_start = new Uint32Array(this.length);
+    this.max_end = new Uint32Array(this.length);
+    this.ranges = {};
+    for (var j = 0; j < this.length; j++) {
+      var k = order[j];
+      var name = packed.chromosomes[chr[k]];
+      var first = j === 0 || chr[order[j - 1]] !== chr[k];
+      if (first) {
+        this.ranges[name] = [j, j];
+      }
+      this.ranges[name][1] = j + 1;
+      this.sorted_start[j] = this.start[k];
+      this.max_end[j] = first ? this.end[k] : Math.max(this.max_end[j - 1], this.end[k]);
+    }
+  }
+
+  name (i) {
+    if (!this.name_bytes) {
+      return undefined;
+    }
+    return this.decoder.decode(this.name_bytes.subarray(this.name_offsets[i], this.name_offsets[i + 1]));
+  }
+
+  query (chr, start, end) {
+    // features overlapping [start, end) on chr, sorted by start
+    var range = this.ranges[alias(this.ranges, chr)];
+    if (!range) {
+      return [];
+    }
+    start = start === undefined ? 0 : start;
+    end = end === undefined ? Infinity : end;
+    var lo = range[0];
+    var hi = range[1];
+    // first interval starting at or after end
+    while (lo < hi) {
+      var mid = (lo + hi) >>> 1;
+      if (this.sorted_start[mid] < end) {
+        lo = mid + 1;
+      }
+      else {
+        hi = mid;
+      }
+    }
+    var features = [];
+    for (var j = lo - 1; j >= range[0] && this.max_end[j] > start; j--) {
+      var i = this.order[j];
+      if (this.end[i] > start) {
+        var feature = { chr: chr, start: this.start[i], end: this.end[i] };
+        var name = this.name(i);
+        if (name) {
+          feature.name = name;
+        }
+        features.push(feature);
+      }
+    }
+    return features.reverse();
+  }
+
+  feature_source () {
+    // igv.js feature source of a ROI set
+    return {
+      getFeatures: ({ chr, start, end }) => Promise.resolve(this.query(chr, start, end)),
+      supportsWholeGenome: () => false,
+    };
+  }
+}
@@ -3,9 +3,23 @@ import * as _ from 'lodash';
 import igv from 'igv/dist/igv.js';
 import '../css/widget.css';
 
-import { MODULE_NAME, MODULE_VERSION } from './version';
-
-export class TrackModel extends widgets.WidgetModel {
+import { MODULE_NAME, MODULE_VERSION, MODEL_DEFAULTS, check_state_schema, track_defaults } from './version';
+import { deserialize_features } from './binary';
+import { SignalReader } from './signal';
+import { FeatureReader } from './features';
+import { GenotypeReader } from './genotypes';
+import { GwasReader } from './gwas';
+import { InteractionReader } from './interactions';
+import { RequestMixin } from './requests';
+import { kernel_config } from './kernelfs';
+import { EventStream } from './events';
+import { PerfRecorder } from './perf';
+import { apply_op } from './patch';
+import { IntervalIndex } from './intervals';
+import { share_urls } from './shared';
+import { browser_pool } from './pool';
+
+export class TrackModel extends RequestMixin(widgets.WidgetModel) {
   defaults () {
     return _.extend(super.defaults(),  {
       _model_name : 'TrackModel',
@@ -16,8 +30,83 @@ export class TrackModel extends widgets.WidgetModel {
       _view_module_version : MODULE_VERSION,
     });
   };
+
+  initialize (attributes, options) {
+    super.initialize(attributes, options);
+    check_state_schema(this);
+    // defaults of the kernel side depend on the track type, known from the
+    // state: values absent from sparse states are filled in from them
+    _.defaults(this.attributes, _.cloneDeep(track_defaults(this.get('type'))));
+  };
+};
+
+TrackModel.serializers = _.extend({
+  features: { deserialize: deserialize_features }
+  },
+  widgets.WidgetModel.serializers
+)
+
+export class RoiSetModel extends widgets.WidgetModel {
+  defaults () {
+    return _.extend(super.defaults(),  {
+      _model_name : 'RoiSetModel',
+      _view_name : 'RoiSetView',
+      _model_module : MODULE_NAME,
+      _view_module : MODULE_NAME,
+      _model_module_version : MODULE_VERSION,
+      _view_module_version : MODULE_VERSION,
+    }, _.cloneDeep(MODEL_DEFAULTS.roiSet));
+  };
+
+  initialize (attributes, options) {
+    super.initialize(attributes, options);
+    check_state_schema(this);
+  };
+};
+
+RoiSetModel.serializers = _.extend({
+  intervals: { deserialize: (packed) => packed ? new IntervalIndex(packed) : null }
+  },
+  widgets.WidgetModel.serializers
+)
+
+export class BrowserGroupModel extends widgets.WidgetModel {
+  // Links the browsers of a group: their views follow the locus changes
+  // broadcast on 'group:locus' by any of them, or set from the kernel.
+  defaults () {
+    return _.extend(super.defaults(),  {
+      _model_name : 'BrowserGroupModel',
+      _model_module : MODULE_NAME,
+      _model_module_version : MODULE_VERSION,
+      _view_name : null,
+      _view_module : null,
+      locus : '',
+      syncLocus : true,
+    });
+  };
+
+  initialize (attributes, options) {
+    super.initialize(attributes, options);
+    this.current_locus = this.get('locus');
+    this.on('change:locus', () => this.broadcast_locus(this.get('locus'), null));
+  };
+
+  broadcast_locus (locus, source) {
+    var key = Array.isArray(locus) ? locus.join(' ') : locus;
+    if (!this.get('syncLocus') || !key || key === this.current_locus) {
+      return;
+    }
+    this.current_locus = key;
+    this.trigger('group:locus', key, source);
+  };
 };
 
+BrowserGroupModel.serializers = _.extend({
+  genome: { deserialize: widgets.unpack_models }
+  },
+  widgets.WidgetModel.serializers
+)
+
 export class ReferenceGenomeModel extends widgets.WidgetModel {
   defaults () {
     return _.extend(super.defaults(),  {
@@ -27,7 +116,12 @@ export class ReferenceGenomeModel extends widgets.WidgetModel {
       _view_module : MODULE_NAME,
       _model_module_version : MODULE_VERSION,
       _view_module_version : MODULE_VERSION,
-    });
+    }, _.cloneDeep(MODEL_DEFAULTS.genome));
+  };
+
+  initialize (attributes, options) {
+    super.initialize(attributes, options);
+    check_state_schema(this);
   };
 };
 
@@ -38,7 +132,7 @@ ReferenceGenomeModel.serializers = _.extend({
   widgets.WidgetModel.serializers
 )
 
-export class IgvModel extends widgets.DOMWidgetModel {
+export class IgvModel extends RequestMixin(widgets.DOMWidgetModel) {
     defaults () {
       return _.extend(super.defaults(),  {
           _model_name : 'IgvModel',
@@ -47,11 +141,12 @@ export class IgvModel extends widgets.DOMWidgetModel {
           _view_module : MODULE_NAME,
           _model_module_version : MODULE_VERSION,
           _view_module_version : MODULE_VERSION,
-      });
+      }, _.cloneDeep(MODEL_DEFAULTS.browser));
     };
 
     initialize(attributes, options) {
       super.initialize(attributes, options);
+      check_state_schema(this);
       this.on("msg:custom", this.custom_message_handler);
     };
 
@@ -60,17 +155,45 @@ export class IgvModel extends widgets.DOMWidgetModel {
       if (msg.type === 'dump_json') {
         this.trigger('return_json');
       }
-      else if (msg.type === 'search') {
-        var symbol = msg.symbol
-        this.trigger('search', symbol);
+      else if (msg.type === 'patch') {
+        // patches apply in order, once the models they insert are resolved
+        this._patching = (this._patching || Promise.resolve()).then(() => this.apply_patch(msg.ops));
+      }
+      else if (msg.request !== undefined) {
+        this.trigger('kernel_request', msg);
       }
     };
+
+    apply_patch (ops) {
+      // Applies the operations to the lists without change events: the views
+      // apply them to igv.js one by one on 'patch'.
+      return Promise.all(ops.map((op) => {
+        if (op.op === 'insert' && op.trait !== 'trackSpecs') {
+          return widgets.unpack_models(op.value, this.widget_manager);
+        }
+        return op.value;
+      })).then((values) => {
+        var lists = {};
+        ops.forEach((op, i) => {
+          if (!lists[op.trait]) {
+            lists[op.trait] = (this.get(op.trait) || []).slice();
+          }
+          apply_op(lists[op.trait], op, values[i]);
+        });
+        this.set(lists, { silent: true });
+        // the kernel already has these values
+        Object.keys(lists).forEach((name) => { delete this._buffered_state_diff[name]; });
+        this.trigger('patch', ops, values);
+      });
+    };
 };
 
 IgvModel.serializers = _.extend({
     genome: { deserialize: widgets.unpack_models },
     tracks: { deserialize: widgets.unpack_models },
     roi: { deserialize: widgets.unpack_models },
+    roiSets: { deserialize: widgets.unpack_models },
+    group: { deserialize: widgets.unpack_models },
   },
   widgets.DOMWidgetModel.serializers
 )
@@ -89,11 +212,16 @@ export class TrackView extends widgets.WidgetView {
   }
 }
 
+export class RoiSetView extends widgets.WidgetView {
+}
+
 export class IgvBrowser extends widgets.DOMWidgetView {
     initialize(options) {
         super.initialize(options);
         this.tracks_initialized = true;
         this.browser = null;
+        this.perf = new PerfRecorder((records) => this.send({ event: 'perf', records: records }), 1000);
+        this.perf.enable(this.model.get('telemetry'));
         this.track_views = new widgets.ViewList(this.add_track_view, this.remove_track_view, this);
         console.log("configuring track_views");
         this.track_views.update(this.model.get('tracks'));
@@ -104,21 +232,26 @@ export class IgvBrowser extends widgets.DOMWidgetView {
         console.log("configuring roi_views");
         this.roi_views.update(this.model.get('roi'));
         console.log("Done configuring roi_views")
+        this.roi_set_views = new widgets.ViewList(this.add_roi_set_view, this.remove_roi_view, this);
+        this.roi_set_views.update(this.model.get('roiSets'));
+
+        // id -> {json, igvTrack} of the tracks loaded from the trackSpecs
+        this.spec_tracks = new Map();
+
+        this.events = new EventStream(this._send_events.bind(this), () => this.model.get('eventDebounce'));
     }
 
     render() {
       super.render();
 
       var referenceGenome = this.model.get('genome');
-      var tracks = this.model.get('tracks');
-      var roi = this.model.get('roi');
       var doubleClickDelay = this.model.get('doubleClickDelay');
       var flanking = this.model.get('flanking');
       var genomeList = this.model.get('genomeList');
       var locus = this.model.get('locus');
       var minimumBases = this.model.get('minimumBases');
       var queryParametersSupported = this.model.get('queryParametersSupported');
-      var search = this.model.get('search');
+      var search = this.model.get('searchService');
       var showAllChromosomes = this.model.get('showAllChromosomes');
       var showAllChromosomeWidget = this.model.get('showAllChromosomeWidget');
       var showNavigation = this.model.get('showNavigation');
@@ -129,10 +262,9 @@ export class IgvBrowser extends widgets.DOMWidgetView {
       var apiKey = this.model.get('apiKey');
       var clientId = this.model.get('clientId');
 
+      // tracks and roi are loaded by the track_views and roi_views
       var options =  {
-          reference: referenceGenome,
-          tracks: tracks,
-          roi: roi,
+          reference: this._genome_config(referenceGenome),
           doubleClickDelay: doubleClickDelay,
           flanking: flanking,
           genomeList: genomeList,
@@ -148,7 +280,8 @@ export class IgvBrowser extends widgets.DOMWidgetView {
         };
 
         if (search) {
-          options['search']=search
+          options['search'] = _.pick(search.attributes,
+            ['url', 'resultsField', 'coords', 'chromosomeField', 'startField', 'endField']);
         }
         if (oauthToken) {
           options['oauthToken']=oauthToken
@@ -161,30 +294,133 @@ export class IgvBrowser extends widgets.DOMWidgetView {
         }
 
       console.log("rendering browser", options);
-      this.browser = igv.createBrowser(this.el, options)
+      var genomeName = referenceGenome.get('name') || referenceGenome.get('id') || 'genome';
+      this.perf.label([options.reference.fastaURL, options.reference.indexURL, options.reference.cytobandURL], genomeName);
+      // a warm igv.js browser with the same reference and options is reused,
+      // with its tracks and ROI reset: no new browser, no reference reload
+      var key = JSON.stringify([_.omit(referenceGenome.attributes, 'tracks'), _.omit(options, 'reference', 'locus')]);
+      var entry = browser_pool.acquire(key);
+      var created;
+      if (entry) {
+        this.el.appendChild(entry.div);
+        created = this._reset_browser(entry.browser, options.reference, locus);
+      } else {
+        entry = { key: key, div: document.createElement('div'), view: null };
+        this.el.appendChild(entry.div);
+        created = igv.createBrowser(entry.div, options).then((browser) => {
+          console.log("Created IGV browser with options ", options);
+          entry.browser = browser;
+          this._bind_browser(entry);
+          return browser;
+        });
+      }
+      // held from now on, so that a view removed while its browser is created
+      // still returns it to the pool
+      this.pool_entry = entry;
+      this.browser = this.perf.time('genome', genomeName, created)
         .then((browser) => {
-            console.log("Created IGV browser with options ", options);
-            browser.on('trackremoved', this.track_removed);
-            browser.on('trackdragend', this.track_dragged);
-
-            browser.on('locuschange', this.locus_changed);
-            browser.on('trackclick', this.track_clicked);
+            entry.view = this;
+            this.igv_browser = browser;
             return browser;
           });
 
       this.listenTo(this.model, 'change:genome', this.update_genome);
       this.listenTo(this.model, 'change:tracks', this.update_tracks);
+      this.listenTo(this.model, 'change:trackSpecs', this.update_track_specs);
       this.listenTo(this.model, 'change:roi', this.update_roi);
+      this.listenTo(this.model, 'change:roiSets', this.update_roi);
+      this.listenTo(this.model, 'change:locus', this.update_locus);
+      this.listenTo(this.model, 'patch', this.apply_patch);
+      if (this.model.get('group')) {
+        this.listenTo(this.model.get('group'), 'group:locus', this.follow_locus);
+      }
       this.listenTo(this.model, "return_json", this._return_json);
-      this.listenTo(this.model, "search", this._search);
+      this.listenTo(this.model, "kernel_request", this._kernel_request);
+      this.listenTo(this.model, 'change:telemetry', () => this.perf.enable(this.model.get('telemetry')));
+      this.update_track_specs();
+
+    }
+
+    _bind_browser (entry) {
+      // igv.js events are forwarded to the view showing the browser, if any
+      var browser = entry.browser;
+      var forward = (method) => (...args) => entry.view ? entry.view[method](...args) : undefined;
+      browser.on('trackremoved', forward('track_removed'));
+      browser.on('trackdragend', forward('track_dragged'));
+      browser.on('locuschange', forward('locus_changed'));
+      browser.on('trackclick', forward('track_clicked'));
+
+      // Searches (search box, locus changes) are resolved by the kernel gene
+      // index first, if the model has one: locus strings are searched as is
+      var search = browser.search.bind(browser);
+      browser.search = (string, ...args) => {
+        var view = entry.view;
+        if (!view || !view.model.get('geneIndex') || typeof string !== 'string' || string.indexOf(':') >= 0) {
+          return search(string, ...args);
+        }
+        var symbols = string.trim().split(/\s+/);
+        return view.model.request({ request: 'locate', symbols: symbols }).then((reply) => {
+          var loci = reply.content.loci;
+          return search(loci.indexOf(null) < 0 ? loci.join(' ') : string, ...args);
+        }, () => search(string, ...args));
+      };
+
+      // Times the redraws of the browser views, e.g. on locus change
+      if (typeof browser.updateViews !== 'function') {
+        return;
+      }
+      var updateViews = browser.updateViews.bind(browser);
+      browser.updateViews = (...args) => {
+        var redraw = Promise.resolve(updateViews(...args));
+        return entry.view ? entry.view.perf.time('redraw', 'redraw', redraw) : redraw;
+      };
+    }
+
+    _reset_browser (browser, reference, locus) {
+      // Clears a pooled browser for this view: the tracks and ROI of the
+      // model are loaded by the track and ROI views
+      if (typeof browser.resize === 'function') {
+        // the browser may be moved to an element of another width
+        browser.resize();
+      }
+      return Promise.resolve(browser.removeAllTracks()).then(() => {
+        browser.clearROIs();
+        var tracks = reference.tracks || [];
+        return tracks.length > 0 ? browser.loadTrackList(tracks) : null;
+      }).then(() => {
+        return locus ? browser.search(Array.isArray(locus) ? locus.join(' ') : locus) : null;
+      }).then(() => browser);
+    }
 
+    remove () {
+      // the igv.js browser goes back to the pool, for the next view with the
+      // same reference and options
+      var entry = this.pool_entry;
+      this.pool_entry = null;
+      if (entry) {
+        // released once created, a browser failing to load is dropped
+        this.browser.then(() => browser_pool.release(entry), () => null);
+      }
+      return super.remove();
     }
 
     update_genome () {
       var genome = this.model.get('genome');
       console.log('Updating browser reference with ', genome);
       this.browser.then((b) => {
-        b.loadGenome(genome);
+        var config = this._genome_config(genome);
+        var name = genome.get('name') || genome.get('id') || 'genome';
+        this.perf.label([config.fastaURL, config.indexURL, config.cytobandURL], name);
+        this.perf.time('genome', name, b.loadGenome(config));
+      });
+    }
+
+    update_locus (model, locus, options) {
+      if (options && options.updated_view === this) {
+        return;
+      }
+      this.browser.then((b) => {
+        b.search(Array.isArray(locus) ? locus.join(' ') : locus);
       });
     }
 
@@ -193,24 +429,191 @@ export class IgvBrowser extends widgets.DOMWidgetView {
       if (this.tracks_initialized) {
         var tracks = this.model.get('tracks');
         console.log('Updating tracks_views with ', tracks);
-        this.track_views.update(tracks);
+        this.track_views.update(tracks).then((views) => {
+          // Notify the kernel once the whole set of tracks is loaded.
+          this.send({ event: 'tracks_loaded', tracks: views.map(v => v.model.get('name')) });
+        });
       }
       else {
         console.log ("Tracks not yet initialized - skipping");
       }
     }
 
+    update_track_specs () {
+      // Loads new or edited track specs, and removes the ones that are gone
+      var specs = this.model.get('trackSpecs') || [];
+      var ids = new Set();
+      var loads = [];
+      specs.forEach((spec) => {
+        var current = this.spec_tracks.get(spec._id);
+        ids.add(spec._id);
+        if (!current || current.json !== JSON.stringify(spec)) {
+          loads.push(this._load_spec(spec));
+        }
+      });
+      this.spec_tracks.forEach((entry, id) => {
+        if (!ids.has(id)) {
+          this._remove_spec(id);
+        }
+      });
+      this._tracks_loaded(loads);
+    }
+
+    apply_patch (ops, values) {
+      // Applies a patch of the track and ROI lists (already applied to the
+      // model) to igv.js, loading or removing only the elements it changes.
+      var loads = [];
+      var specs = new Map();
+      var reorder = false;
+      var reload_roi = false;
+      ops.forEach((op, i) => {
+        if (op.trait === 'trackSpecs') {
+          var entry = this.spec_tracks.get(op.id);
+          if (op.op === 'insert') {
+            specs.set(op.id, values[i]);
+          }
+          else if (op.op === 'update' && (specs.has(op.id) || entry)) {
+            var spec = specs.has(op.id) ? specs.get(op.id) : entry.spec;
+            specs.set(op.id, _.extend({}, spec, { [op.name]: op.value }));
+          }
+          else if (op.op === 'remove') {
+            specs.delete(op.id);
+            this._remove_spec(op.id);
+          }
+          reorder = reorder || op.op === 'move';
+        }
+        else if (op.trait === 'tracks') {
+          var view = this._patch_views(this.track_views, op, values[i]);
+          if (view) {
+            loads.push(view.then(v => v.model.get('name')));
+          }
+          reorder = reorder || op.op === 'move';
+        }
+        else if (op.trait === 'roi' || op.trait === 'roiSets') {
+          this._patch_views(op.trait === 'roi' ? this.roi_views : this.roi_set_views, op, values[i]);
+          reload_roi = reload_roi || op.op === 'remove';
+        }
+      });
+      specs.forEach(spec => loads.push(this._load_spec(spec)));
+      this._tracks_loaded(loads);
+      if (reorder) {
+        Promise.all(loads).then(() => this._reorder_tracks());
+      }
+      if (reload_roi) {
+        Promise.all(this.roi_views.views.concat(this.roi_set_views.views)).then(() => this._reload_roi());
+      }
+    }
+
+    _patch_views (view_list, op, model) {
+      // Applies an operation to a ViewList, returns the view promise of an
+      // inserted model
+      var context = view_list._handler_context;
+      if (op.op === 'insert') {
+        var view = Promise.resolve(view_list._create_view.call(context, model, view_list._models.length));
+        view_list._models.push(model);
+        view_list.views.push(view);
+        return view;
+      }
+      var index = apply_op(view_list._models, op);
+      if (index < 0) {
+        return null;
+      }
+      var current = view_list.views.splice(index, 1)[0];
+      if (op.op === 'remove') {
+        current.then(v => view_list._remove_view.call(context, v));
+      }
+      else if (op.op === 'move') {
+        view_list.views.splice(op.index, 0, current);
+      }
+      return null;
+    }
+
+    _tracks_loaded (loads) {
+      // Notifies the kernel once a set of tracks is loaded
+      if (loads.length > 0) {
+        Promise.all(loads).then((names) => {
+          this.send({ event: 'tracks_loaded', tracks: names });
+        });
+      }
+    }
+
+    _load_spec (spec) {
+      // (Re)loads the igv.js track of a spec, resolves to its name
+      var current = this.spec_tracks.get(spec._id);
+      if (current) {
+        this._remove_spec_track(current);
+      }
+      var entry = { json: JSON.stringify(spec), spec: spec, igvTrack: null };
+      this.spec_tracks.set(spec._id, entry);
+      return this._queue_track_load(this._spec_config(spec)).then((newTrack) => {
+        entry.igvTrack = newTrack;
+        if (this.spec_tracks.get(spec._id) !== entry) {
+          // removed or reloaded while loading
+          this._remove_spec_track(entry);
+        }
+        return spec.name;
+      });
+    }
+
+    _remove_spec (id) {
+      var entry = this.spec_tracks.get(id);
+      if (entry) {
+        this._remove_spec_track(entry);
+        this.spec_tracks.delete(id);
+      }
+    }
+
+    _reorder_tracks () {
+      // igv.js sorts its tracks by their order property: tracks, then specs
+      var specs = this.model.get('trackSpecs') || [];
+      return Promise.all(this.track_views.views).then((views) => {
+        return this.browser.then((browser) => {
+          views.forEach((view, i) => {
+            if (view.igvTrack) {
+              view.igvTrack.order = i;
+            }
+          });
+          specs.forEach((spec, i) => {
+            var entry = this.spec_tracks.get(spec._id);
+            if (entry && entry.igvTrack) {
+              entry.igvTrack.order = views.length + i;
+            }
+          });
+          if (typeof browser.reorderTracks === 'function') {
+            browser.reorderTracks();
+          }
+        });
+      });
+    }
+
+    _spec_config (spec) {
+      var config = kernel_config(this.model, _.omit(spec, '_id'), ['url', 'indexURL']);
+      this.perf.label([config.url, config.indexURL], config.name);
+      return config;
+    }
+
+    _remove_spec_track (entry) {
+      if (entry.igvTrack) {
+        this.browser.then(b => b.removeTrack(entry.igvTrack));
+      }
+    }
+
     add_track_view (child_model) {
       return this.create_child_view(child_model, {}).then(view => {
           console.log('add_track_view with child :', child_model);
+          if (child_model.get('genotypes')) {
+            // another page of samples, or display mode, is another set of rows
+            view.listenTo(child_model, 'change:samplePage change:displayMode', () => this._reload_track(view));
+          }
+          if (child_model.get('interactions')) {
+            view.listenTo(child_model, 'change:maxArcs', () => this._reload_track(view));
+          }
           if (this.tracks_initialized) {
-              return this.browser.then((browser) => {
-                  return browser.loadTrack(child_model.attributes).then((newTrack) => {
-                      console.log("new track loaded in browser: " , newTrack);
-                      view.igvTrack = newTrack
-                      return view;
-                  });
-            });
+              return this._queue_track_load(this._track_config(child_model)).then((newTrack) => {
+                  console.log("new track loaded in browser: " , newTrack);
+                  view.igvTrack = newTrack
+                  return view;
+              });
           } else {
               console.log("track_view not yet initialized, skipping");
               return view;
@@ -218,8 +621,98 @@ export class IgvBrowser extends widgets.DOMWidgetView {
       });
     }
 
+    _track_config (child_model) {
+      // igv.js track configuration for a Track model
+      var config = kernel_config(this.model, _.clone(child_model.attributes), ['url', 'indexURL']);
+      this.perf.label([config.url, config.indexURL], config.name);
+      // kernel readers serving zoom levels disable the igv.js feature cache,
+      // keyed by range only: they cache their tiles per level themselves
+      if (config.signal) {
+        config.reader = new SignalReader(child_model, () => this._frame());
+        config.disableCache = true;
+        delete config.signal;
+      }
+      if (config.featureIndex) {
+        config.reader = new FeatureReader(child_model);
+        if (!config.visibilityWindow) {
+          config.visibilityWindow = config.featureIndex.visibility_window;
+        }
+        delete config.featureIndex;
+      }
+      if (config.genotypes) {
+        config.reader = new GenotypeReader(child_model, () => this._frame());
+        config.disableCache = true;
+        delete config.genotypes;
+      }
+      if (config.snps) {
+        config.reader = new GwasReader(child_model, () => this._frame(), () => this.igv_browser.genome);
+        config.disableCache = true;
+        if (!config.format) {
+          config.format = 'gwas';
+        }
+        delete config.snps;
+      }
+      if (config.interactions) {
+        config.reader = new InteractionReader(child_model, () => this._frame());
+        config.disableCache = true;
+        delete config.interactions;
+      }
+      return config;
+    }
+
+    _genome_config (genome_model) {
+      // igv.js reference configuration for a ReferenceGenome model
+      var config = kernel_config(this.model, _.clone(genome_model.attributes),
+        ['fastaURL', 'indexURL', 'cytobandURL', 'aliasURL']);
+      config.tracks = (config.tracks || []).map(track => this._track_config(track));
+      if (this.model.get('group')) {
+        // the browsers of a group load the reference files once
+        share_urls([config.fastaURL, config.indexURL, config.cytobandURL, config.aliasURL]);
+      }
+      return config;
+    }
+
+    _frame () {
+      var frame = this.igv_browser.referenceFrameList[0];
+      return { bpPerPixel: frame.bpPerPixel, width: this.el.clientWidth };
+    }
+
+    _queue_track_load (config) {
+      // Track loads requested in the same tick are started together once the
+      // browser is ready: they load concurrently, each timed on its own.
+      if (!this._pending_track_loads) {
+        this._pending_track_loads = [];
+        this.browser.then((browser) => {
+          var pending = this._pending_track_loads;
+          this._pending_track_loads = null;
+          return Promise.all(pending.map((p) => {
+            var load = this.perf.time('track', p.config.name, browser.loadTrack(p.config));
+            return load.then(p.resolve, p.reject);
+          }));
+        });
+      }
+      return new Promise((resolve, reject) => {
+        this._pending_track_loads.push({ config: config, resolve: resolve, reject: reject });
+      });
+    }
+
+    _reload_track (view) {
+      this.browser.then(b => {
+        if (view.igvTrack) {
+          b.removeTrack(view.igvTrack);
+        } else {
+          b.removeTrackByName(view.model.get('name'));
+        }
+        return this._queue_track_load(this._track_config(view.model));
+      }).then(newTrack => { view.igvTrack = newTrack; });
+    }
+
     remove_track_view (child_view) {
       console.log('removing Track from genome', child_view.igvTrack);
+      if (child_view.removed_from_browser) {
+        // already removed by the user in igv.js
+        return;
+      }
 
       if (!this.tracks_initialized) {
         console.log("track_view not yet initialized, skipping");
@@ -240,22 +733,25 @@ export class IgvBrowser extends widgets.DOMWidgetView {
     update_roi () {
       console.log("update_roi")
       var roi = this.model.get('roi');
+      var roi_sets = this.model.get('roiSets') || [];
       console.log('Updating roi_views with ', roi);
-      // the browser lets us only add ROI (one or several), or delete all ROI. (no unitary delete)
-      if (roi == []) {
-        console.log('removing Regions of Interest');
-        this.browser.then(b => { b.clearROIs(); });
-      }
-      else {
-        this.roi_views.update(roi);
-      }
+      // the browser lets us only add ROI, or delete all ROI (no unitary
+      // delete): the remaining ROI are reloaded after a removal
+      var removed = this.roi_views._models.some(m => !roi.includes(m)) ||
+        this.roi_set_views._models.some(m => !roi_sets.includes(m));
+      Promise.all([this.roi_views.update(roi), this.roi_set_views.update(roi_sets)]).then(() => {
+        if (removed) {
+          this._reload_roi();
+        }
+      });
     }
 
     add_roi_view (child_model) {
       return this.create_child_view(child_model, {}).then(view => {
           console.log('add_roi_view with child view :', view);
               return this.browser.then((browser) => {
-                  return browser.loadROI(view.model.attributes).then((newROI) => {
+                  var config = this._track_config(view.model);
+                  return this.perf.time('roi', config.name, browser.loadROI(config)).then((newROI) => {
                       console.log("new roi loaded in browser: " , newROI);
                       return view;
                   });
@@ -263,24 +759,123 @@ export class IgvBrowser extends widgets.DOMWidgetView {
       });
     }
 
-    remove_all_roi_view (child_view) {
-      console.log('Oops - removing one Region of Interest not supported - Ignoring');
+    add_roi_set_view (child_model) {
+      return this.create_child_view(child_model, {}).then(view => {
+        return this.browser.then((browser) => {
+          var name = child_model.get('name');
+          return this.perf.time('roi', name, browser.loadROI(this._roi_set_config(child_model))).then(() => view);
+        });
+      });
+    }
+
+    _roi_set_config (model) {
+      // igv.js draws the ROI of a set in view only, queried from its index
+      var config = { name: model.get('name'), featureSource: model.get('intervals').feature_source() };
+      if (model.get('color')) {
+        config.color = model.get('color');
+      }
+      return config;
+    }
+
+    remove_roi_view (child_view) {
+      // the ROI itself is removed from igv.js by _reload_roi
+      child_view.remove();
+    }
+
+    _reload_roi () {
+      var configs = this.roi_views._models.map(model => this._track_config(model))
+        .concat(this.roi_set_views._models.map(model => this._roi_set_config(model)));
+      return this.browser.then((browser) => {
+        browser.clearROIs();
+        if (configs.length > 0) {
+          return browser.loadROI(configs);
+        }
+      });
+    }
+
+    _track_view (igvTrack) {
+      // the TrackView, if any, of an igv.js track
+      return Promise.all(this.track_views.views).then((views) => {
+        return views.find(view => view.igvTrack === igvTrack);
+      });
     }
 
     track_removed (tracks) {
-      console.log('track removed', tracks);
+      // Keep the tracks of the model in sync with tracks removed from the igv.js UI
+      var removed_specs = [];
+      this.spec_tracks.forEach((entry, id) => {
+        if (tracks.includes(entry.igvTrack)) {
+          removed_specs.push(id);
+          this.spec_tracks.delete(id);
+        }
+      });
+      if (removed_specs.length > 0) {
+        this.model.set('trackSpecs', this.model.get('trackSpecs').filter(spec => !removed_specs.includes(spec._id)));
+        this.model.save_changes();
+      }
+      Promise.all(tracks.map(track => this._track_view(track))).then((views) => {
+        var removed = views.filter(view => view !== undefined);
+        if (removed.length === 0) {
+          return;
+        }
+        removed.forEach((view) => { view.removed_from_browser = true; });
+        var models = removed.map(view => view.model);
+        this.model.set('tracks', this.model.get('tracks').filter(m => !models.includes(m)));
+        this.model.save_changes();
+      });
     }
 
-    track_dragged (arg) {
-      console.log('track dragged', arg);
+    track_dragged () {
+      this.browser.then((browser) => {
+        var names = browser.trackViews.map(trackView => trackView.track.name);
+        this.events.push({ type: 'track_drag', tracks: names }, true);
+      });
     }
 
-    locus_changed (referenceFrame, label) {
-      console.log('locus changed', referenceFrame, label);
+    locus_changed (referenceFrames, label) {
+      var loci = typeof label === 'string' ? label.split(' ') : [];
+      var locus = loci.length === 1 ? loci[0] : loci;
+      this.events.push({ type: 'locus', locus: locus }, true);
+      var group = this.model.get('group');
+      if (this._following) {
+        // change applied from the group: not broadcast again
+        this._following = false;
+      }
+      else if (group) {
+        group.broadcast_locus(label, this);
+      }
+    }
+
+    follow_locus (locus, source) {
+      if (source === this) {
+        return;
+      }
+      this.browser.then((browser) => {
+        this._following = true;
+        return browser.search(locus);
+      });
     }
 
     track_clicked (track, popoverData) {
-      console.log('track clicked', track, popoverData);
+      this._track_view(track).then((view) => {
+        this.events.push({
+          type: 'track_click',
+          track: view ? view.model.model_id : null,
+          name: track.name,
+          data: popoverData,
+        }, false);
+      });
+      // undefined lets igv.js show its default popover
+      return undefined;
+    }
+
+    _send_events (events) {
+      var locus = events.find(event => event.type === 'locus');
+      if (locus) {
+        this.model.set('locus', locus.locus, { updated_view: this });
+        this.model.save_changes();
+      }
+      this.send({ event: 'events', events: events });
     }
 
     _return_json(event) {
@@ -292,11 +887,23 @@ export class IgvBrowser extends widgets.DOMWidgetView {
       });
     }
 
-    _search(symbol) {
-      console.log('view._search', symbol);
-      var symbol = symbol
+    _kernel_request (msg) {
+      // Answers a request sent by the kernel, with the same id as response
       this.browser.then((browser) => {
-        browser.search(symbol);
+        if (msg.request === 'search') {
+          return Promise.resolve(browser.search(msg.symbol)).then((result) => {
+            var loci = browser.referenceFrameList.map(frame => frame.getLocusString());
+            return { found: result !== false, locus: loci.length === 1 ? loci[0] : loci };
+          });
+        }
+        else if (msg.request === 'state') {
+          return { state: browser.toJSON() };
+        }
+        throw new Error('unknown request: ' + msg.request);
+      }).then((reply) => {
+        this.send(_.extend({ response: msg.id }, reply));
+      }, (error) => {
+        this.send({ response: msg.id, error: String(error) });
       });
     }
 }
@@ -0,0 +1,70 @@
+// Reads of local kernel files for tracks and genomes with sourceType 'kernel'.
+//
+// Their URLs are rewritten to the ipyigv-kernel:// scheme, and a hook of
+// igv.xhr.load (see xhr.js) reads these URLs by byte ranges through the comm
+// of the browser model.
+
+import { KERNEL_HOOK, add_load_hook } from './xhr';
+
+export const KERNEL_SCHEME = 'ipyigv-kernel://';
+
+const models = {};
+
+function concat (views) {
+  var size = views.reduce((total, view) => total + view.byteLength, 0);
+  var data = new Uint8Array(size);
+  var offset = 0;
+  views.forEach((view) => {
+    data.set(new Uint8Array(view.buffer, view.byteOffset, view.byteLength), offset);
+    offset += view.byteLength;
+  });
+  return data.buffer;
+}
+
+function read (url, options) {
+  var rest = url.slice(KERNEL_SCHEME.length);
+  var separator = rest.indexOf('/');
+  var model = models[rest.slice(0, separator)];
+  var range = options.range;
+  return model.request({
+    request: 'read',
+    path: rest.slice(separator + 1),
+    start: range ? range.start : 0,
+    size: range && range.size !== undefined ? range.size : null,
+  }).then((reply) => {
+    var data = concat(reply.buffers);
+    if (options.responseType === 'arraybuffer') {
+      return data;
+    }
+    return new TextDecoder().decode(data);
+  });
+}
+
+function kernel_load (url, options, load) {
+  if (typeof url === 'string' && url.startsWith(KERNEL_SCHEME)) {
+    return read(url, options || {});
+  }
+  return load(url, options);
+}
+
+export function kernel_url (model, path) {
+  if (!add_load_hook(KERNEL_HOOK, kernel_load)) {
+    console.error('igv.xhr not available - kernel sources are not supported');
+  }
+  models[model.model_id] = model;
+  return KERNEL_SCHEME + model.model_id + '/' + path;
+}
+
+export function kernel_config (model, config, fields) {
+  // Rewrites the given URL fields of a config with sourceType 'kernel'
+  if (config.sourceType !== 'kernel') {
+    return config;
+  }
+  fields.forEach((field) => {
+    if (config[field]) {
+      config[field] = kernel_url(model, config[field]);
+    }
+  });
+  config.sourceType = 'file';
+  return config;
+}
@@ -0,0 +1,29 @@
+// Operations of the patches sent by the kernel to edit the track and ROI
+// lists of a browser. Elements are identified by id: the model id of
+// widgets, the _id of track specs. Inserted elements are appended.
+
+export function element_id (element) {
+  return element._id !== undefined ? element._id : element.model_id;
+}
+
+export function apply_op (list, op, value) {
+  // Applies an operation to a list in place, returns the (former) index of
+  // the element, -1 if not found
+  var index = list.findIndex(element => element_id(element) === op.id);
+  if (op.op === 'insert') {
+    list.push(value);
+  }
+  else if (index < 0) {
+    return index;
+  }
+  else if (op.op === 'remove') {
+    list.splice(index, 1);
+  }
+  else if (op.op === 'move') {
+    list.splice(op.index, 0, list.splice(index, 1)[0]);
+  }
+  else if (op.op === 'update') {
+    list[index] = Object.assign({}, list[index], { [op.name]: op.value });
+  }
+  return index;
+}
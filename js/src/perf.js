@@ -0,0 +1,105 @@
+// Performance telemetry: timings of genome, track and ROI loads, redraws and
+// data fetches, sent to the kernel in batches.
+
+import { PERF_HOOK, add_load_hook } from './xhr';
+
+// url -> list of [recorder, track name], to attribute fetched bytes to tracks,
+// the least recently labelled urls being dropped past MAX_LABELS
+const labels = new Map();
+const MAX_LABELS = 1000;
+
+function payload_size (data) {
+  if (data === undefined || data === null) {
+    return 0;
+  }
+  return data.byteLength !== undefined ? data.byteLength : data.length || 0;
+}
+
+function timed_load (url, options, load) {
+  var start = performance.now();
+  return Promise.resolve(load(url, options)).then((data) => {
+    var recorders = typeof url === 'string' ? labels.get(url) : undefined;
+    if (recorders) {
+      var range = options && options.range;
+      recorders.forEach(([recorder, name]) => {
+        recorder.record('fetch', name, start, {
+          url: url,
+          bytes: payload_size(data),
+          range: range ? [range.start, range.size] : null,
+        });
+      });
+    }
+    return data;
+  });
+}
+
+export class PerfRecorder {
+  constructor (send, interval) {
+    this.send = send;
+    this.interval = interval;
+    this.enabled = false;
+    this.pending = [];
+    this.timer = null;
+  }
+
+  enable (enabled) {
+    this.enabled = enabled;
+    if (enabled) {
+      add_load_hook(PERF_HOOK, timed_load);
+    }
+  }
+
+  label (urls, name) {
+    // Attributes the fetches of the given URLs to the track `name`
+    urls.filter(url => typeof url === 'string' && url).forEach((url) => {
+      var recorders = (labels.get(url) || []).filter(([recorder]) => recorder !== this);
+      recorders.push([this, name]);
+      labels.delete(url);
+      labels.set(url, recorders);
+      if (labels.size > MAX_LABELS) {
+        labels.delete(labels.keys().next().value);
+      }
+    });
+  }
+
+  time (kind, name, promise) {
+    // Records the duration of a promise, returned unchanged
+    if (!this.enabled) {
+      return promise;
+    }
+    var start = performance.now();
+    return promise.then((result) => {
+      this.record(kind, name, start);
+      return result;
+    }, (error) => {
+      this.record(kind, name, start, { error: String(error) });
+      throw error;
+    });
+  }
+
+  record (kind, name, start, extra) {
+    if (!this.enabled) {
+      return;
+    }
+    var now = performance.now();
+    this.pending.push(Object.assign({
+      kind: kind,
+      name: name,
+      start: performance.timeOrigin + start,
+      duration: now - start,
+    }, extra));
+    if (this.timer === null) {
+      this.timer = setTimeout(() => this.flush(), this.interval);
+    }
+  }
+
+  flush () {
+    clearTimeout(this.timer);
+    this.timer = null;
+    var records = this.pending;
+    this.pending = [];
+    if (records.length > 0) {
+      this.send(records);
+    }
+  }
+}
@@ -0,0 +1,35 @@
+// Pool of warm igv.js browsers, keyed by reference genome and browser
+// options: a browser view that is removed (output cleared, widget closed)
+// leaves its igv.js instance here, and the next view with the same key
+// adopts it instead of creating a browser and loading the reference again.
+
+import igv from 'igv/dist/igv.js';
+
+export class BrowserPool {
+  constructor (max_idle) {
+    this.max_idle = max_idle;
+    this.idle = [];
+  }
+
+  acquire (key) {
+    var index = this.idle.findIndex(entry => entry.key === key);
+    if (index < 0) {
+      return null;
+    }
+    return this.idle.splice(index, 1)[0];
+  }
+
+  release (entry) {
+    // entry: {key, div, browser, view}, the view forwarding igv.js events
+    entry.view = null;
+    if (entry.div.parentNode) {
+      entry.div.parentNode.removeChild(entry.div);
+    }
+    this.idle.push(entry);
+    while (this.idle.length > this.max_idle) {
+      igv.removeBrowser(this.idle.shift().browser);
+    }
+  }
+}
+
+export const browser_pool = new BrowserPool(4);
@@ -0,0 +1,32 @@
+// Request/response messaging between a widget model and its kernel-side widget.
+
+export const RequestMixin = (Base) => class extends Base {
+  initialize (attributes, options) {
+    super.initialize(attributes, options);
+    this._requests = {};
+    this._next_request = 0;
+    this.on('msg:custom', this._handle_response, this);
+  };
+
+  request (content) {
+    // Sends a request to the kernel, resolved with the {content, buffers} of the reply.
+    var id = this._next_request++;
+    return new Promise((resolve, reject) => {
+      this._requests[id] = { resolve: resolve, reject: reject };
+      this.send(Object.assign({ id: id }, content));
+    });
+  };
+
+  _handle_response (msg, buffers) {
+    var pending = this._requests[msg.response];
+    if (msg.response === undefined || pending === undefined) {
+      return;
+    }
+    delete this._requests[msg.response];
+    if (msg.error) {
+      pending.reject(new Error(msg.error));
+    } else {
+      pending.resolve({ content: msg, buffers: buffers });
+    }
+  };
+};
@@ -0,0 +1,30 @@
+// Loads shared by the browsers of a group: identical requests for reference
+// files (same url, byte range and response type) made by several igv.js
+// browsers are fetched once, and the responses kept in an LRU cache.
+
+import { LRUCache } from './cache';
+import { SHARED_HOOK, add_load_hook } from './xhr';
+
+const shared_urls = new Set();
+const responses = new LRUCache(256);
+
+function shared_load (url, options, load) {
+  if (typeof url !== 'string' || !shared_urls.has(url)) {
+    return load(url, options);
+  }
+  options = options || {};
+  var key = JSON.stringify([url, options.range || null, options.responseType || null]);
+  if (!responses.has(key)) {
+    var response = Promise.resolve(load(url, options));
+    response.catch(() => responses.delete(key));
+    responses.set(key, response);
+  }
+  return responses.get(key);
+}
+
+export function share_urls (urls) {
+  if (!add_load_hook(SHARED_HOOK, shared_load)) {
+    console.error('igv.xhr not available - reference files are not shared');
+  }
+  urls.filter(url => typeof url === 'string').forEach(url => shared_urls.add(url));
+}
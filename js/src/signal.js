@@ -0,0 +1,71 @@
+// igv.js feature reader serving a WigTrack from a kernel-side SignalPyramid.
+
+import { LRUCache } from './cache';
+import { typed_array } from './binary';
+
+// bins served per pixel of the view, at most
+const MAX_SCREENS = 4;
+
+export class SignalReader {
+  constructor (model, get_frame) {
+    // get_frame returns the {bpPerPixel, width} of the current view
+    this.model = model;
+    this.get_frame = get_frame;
+    this.cache = new LRUCache(512);
+  }
+
+  readFeatures (chr, start, end) {
+    var signal = this.model.get('signal');
+    var frame = this.get_frame();
+    var bin_sizes = signal.bin_sizes;
+    var level = bin_sizes.findIndex(size => size >= frame.bpPerPixel);
+    if (level < 0) {
+      level = bin_sizes.length - 1;
+    }
+    // igv.js queries a range wider than the view, and caches the features as
+    // covering all of it: the whole range is served, a coarser level bounding
+    // the payload to MAX_SCREENS screens of bins.
+    var max_bins = MAX_SCREENS * Math.max(frame.width, 1);
+    while (level < bin_sizes.length - 1 && (end - start) / bin_sizes[level] > max_bins) {
+      level++;
+    }
+    var bin_size = bin_sizes[level];
+    var tile_size = bin_size * signal.tile_bins;
+    start = Math.max(0, start);
+
+    var window_function = this.model.get('windowFunction');
+    var first = Math.floor(start / tile_size);
+    var last = Math.floor((end - 1) / tile_size);
+    var key = (index) => [chr, level, index, window_function].join(':');
+    var missing = [];
+    for (var index = first; index <= last; index++) {
+      if (!this.cache.has(key(index))) {
+        missing.push(index);
+      }
+    }
+
+    var fetched = Promise.resolve();
+    if (missing.length > 0) {
+      fetched = this.model.request({ request: 'tiles', chr: chr, level: level, tiles: missing })
+        .then((reply) => {
+          reply.content.tiles.forEach((index, i) => {
+            this.cache.set(key(index), typed_array(reply.buffers[i], Float32Array));
+          });
+        });
+    }
+    return fetched.then(() => {
+      var features = [];
+      for (var index = first; index <= last; index++) {
+        var values = this.cache.get(key(index)) || [];
+        var offset = index * tile_size;
+        for (var i = 0; i < values.length; i++) {
+          if (!isNaN(values[i])) {
+            var bin_start = offset + i * bin_size;
+            features.push({ chr: chr, start: bin_start, end: bin_start + bin_size, value: values[i] });
+          }
+        }
+      }
+      return features;
+    });
+  }
+}
@@ -5,6 +5,7 @@
 // The full license is in the file LICENSE, distributed with this software.
 
 const data = require('../package.json');
+const defaults = require('./defaults.json');
 
 /**
  * The _model_module_version/_view_module_version this package implements.
@@ -19,3 +20,26 @@ export const MODULE_VERSION = data.version;
  */
 export const MODULE_NAME = data.name;
 
+
+/*
+ * Version of the sparse widget state schema: values left out of the state
+ * sent by the kernel are taken from the defaults tables of defaults.json,
+ * generated from the Python defaults for this schema (STATE_SCHEMA_VERSION
+ * in ipyigv/_version.py) by `python -m ipyigv.state > js/src/defaults.json`.
+ */
+export const STATE_SCHEMA = defaults.schema;
+
+export const MODEL_DEFAULTS = defaults;
+
+export function track_defaults (type) {
+  // defaults of a track type, of the generic Track for unknown types
+  return MODEL_DEFAULTS.tracks[type] || MODEL_DEFAULTS.track;
+}
+
+export function check_state_schema (model) {
+  var schema = model.get('_state_schema');
+  if (schema !== undefined && schema !== STATE_SCHEMA) {
+    console.warn('ipyigv: kernel state schema ' + schema + ' differs from the frontend schema ' +
+      STATE_SCHEMA + ', default values of ' + model.get('_model_name') + ' may not match');
+  }
+}
@@ -0,0 +1,40 @@
+// The single wrapper of igv.xhr.load, shared by the modules intercepting the
+// loads of igv.js. Each registers a hook called with the url, the options and
+// the next loader of the chain, returning (a promise of) the data.
+
+import igv from 'igv/dist/igv.js';
+
+// Hook positions, outermost first: telemetry times every load, shared
+// responses are looked up before reading kernel files.
+export const PERF_HOOK = 0;
+export const SHARED_HOOK = 1;
+export const KERNEL_HOOK = 2;
+
+const hooks = [];
+var installed = false;
+
+function install () {
+  if (!installed && igv.xhr && igv.xhr.load) {
+    var load = igv.xhr.load;
+    igv.xhr.load = function (url, options) {
+      var next = (i) => (url, options) => (i < hooks.length
+        ? hooks[i].hook(url, options, next(i + 1))
+        : load.call(this, url, options));
+      return next(0)(url, options);
+    };
+    installed = true;
+  }
+  return installed;
+}
+
+export function add_load_hook (position, hook) {
+  // Registers `hook` at `position` (once), returns false if igv.xhr is not available
+  if (!install()) {
+    return false;
+  }
+  if (!hooks.some(entry => entry.hook === hook)) {
+    hooks.push({ position: position, hook: hook });
+    hooks.sort((a, b) => a.position - b.position);
+  }
+  return true;
+}
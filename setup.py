@@ -51,7 +51,8 @@ setup_args = dict(
     long_description=LONG_DESCRIPTION,
     include_package_data=True,
     install_requires=[
-        'ipywidgets>=7.6.0,<8'
+        'ipywidgets>=7.6.0,<8',
+        'numpy',
     ],
     extras_require={
         "test": ["pytest>4.6"]